@@ -1,15 +1,30 @@
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import os
-import pandas as pd
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
 from dotenv import load_dotenv
 
-from algo1 import build_description_clean_one
-from ubcf import recommender_ubcf_direct
-from ibcf import recommender_ibcf_from_ratings
-from cb import ContentBasedRecommender  # ⚡️ version adaptée pour MongoDB
+from algo1 import (
+    build_description_clean_many, build_description_clean_one, description_cache, get_corpus_idf, warm_up_nlp,
+)
+from ubcf import UBCFEngine
+from ibcf import ItemNeighborModel
+from cb import ANN_MIN_ROWS, ContentBasedRecommender  # ⚡️ version adaptée pour MongoDB
+from hybride import fuse_hybrid_scores, hybrid_recommend_many, contributing_sources
+from precomputed import PrecomputedStore, model_version, ratings_fingerprint
+from result_cache import ResultCache, request_key
+from compute_pool import ComputePool, PoolSaturated, parse_limits
+from model_snapshot import LeaderLock, ModelSnapshot, current_generation, load_models, save_models
+from ratings_store import RatingsStore, RATES_SYNC_MARKER
+from movies_store import MoviesStore, MOVIE_FIELDS, MOVIES_SYNC_MARKER
+from sync import CollectionSync
 
 # =========================
 # Initialiser FastAPI
@@ -27,52 +42,475 @@ client = AsyncIOMotorClient(MONGO_URI)
 db = client["RecommendIT"]
 movies_collection = db["movies"]
 rates_collection = db["rates"]
+favorites_collection = db["favorites"]
 
-# cb_reco et cache des films
+# cb_reco et caches en mémoire
 cb_reco: Optional[ContentBasedRecommender] = None
-movies_map: Dict[int, Dict[str, Any]] = {}
-_movies_count_cache: int = 0  # compteur local du nombre de films préchargés
+
+# Films et notes : chargés une fois au démarrage, puis maintenus à jour en
+# tâche de fond (change streams, ou polling sur un mongod standalone)
+movies_store = MoviesStore()
+ratings_store = RatingsStore()
+syncs: List[CollectionSync] = []
+
+SYNC_MODE = os.getenv("SYNC_MODE", "auto")  # auto | watch | poll
+# Coût d'un tour de polling : aucune des deux collections n'a de champ de date
+# de mise à jour, chaque tour lit _id + un marqueur (MOVIES_SYNC_MARKER,
+# RATES_SYNC_MARKER) puis seulement les documents dont le marqueur a changé.
+# Une modification invisible au marqueur est vue au tour complet, un tour sur
+# SYNC_FULL_SCAN_EVERY (0 = jamais).
+SYNC_POLL_INTERVAL = float(os.getenv("SYNC_POLL_INTERVAL", "30"))
+SYNC_FULL_SCAN_EVERY = int(os.getenv("SYNC_FULL_SCAN_EVERY", "20"))
+
+# Refit du Content-Based en tâche de fond quand le vocabulaire a trop dérivé
+CB_REFIT_INTERVAL = float(os.getenv("CB_REFIT_INTERVAL", "300"))
+CB_DRIFT_THRESHOLD = float(os.getenv("CB_DRIFT_THRESHOLD", "0.2"))
+# Nombre de voisins précalculés par film (0 = ligne de similarité complète à chaque favori)
+CB_NEIGHBORS_K = int(os.getenv("CB_NEIGHBORS_K", "0"))
+# Index approché pour les grands catalogues ("lsh"), vide = calcul exact
+CB_ANN = os.getenv("CB_ANN", "") or None
+# ...ignoré sous ce nombre de films, où le calcul exact est plus rapide (cb.ANN_MIN_ROWS)
+CB_ANN_MIN_ROWS = int(os.getenv("CB_ANN_MIN_ROWS", str(ANN_MIN_ROWS)))
+# Réduction SVD (LSA) du TF-IDF en embeddings denses (0 = similarités sur le TF-IDF creux)
+CB_SVD_COMPONENTS = int(os.getenv("CB_SVD_COMPONENTS", "0"))
+_cb_pending: Optional[List[tuple]] = None  # changements reçus pendant un refit
+_cb_refit_task: Optional[asyncio.Task] = None
+# changements de films en attente, appliqués dans un thread sur une copie du modèle,
+# publiée ensuite par une seule affectation de cb_reco : un calcul en cours garde
+# la référence qu'il a prise, sans verrou
+_cb_queue: deque = deque()
+_cb_apply_task: Optional[asyncio.Task] = None
+
+# Moteur UBCF (CSR) reconstruit en tâche de fond quand les notes ou les films ont
+# changé, au même rythme que l'IBCF : une requête ne paie jamais sa construction
+_ubcf_engine: Optional[tuple] = None
+
+# Modèle IBCF (voisins précalculés), reconstruit en tâche de fond puis échangé ;
+# IBCF_REBUILD_INTERVAL rythme aussi la reconstruction du moteur UBCF
+IBCF_MODEL_K = int(os.getenv("IBCF_MODEL_K", "50"))
+IBCF_REBUILD_INTERVAL = float(os.getenv("IBCF_REBUILD_INTERVAL", "60"))
+_ibcf_model: Optional[tuple] = None
+_ibcf_rebuild_task: Optional[asyncio.Task] = None
+
+# Snapshots de modèles partagés entre workers (memmap) : le leader reconstruit
+# et publie des générations, les autres workers les mappent en lecture seule
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+SNAPSHOT_POLL_INTERVAL = float(os.getenv("SNAPSHOT_POLL_INTERVAL", "5"))
+_leader_lock: Optional[LeaderLock] = LeaderLock(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+is_leader = True
+_shared_generation: Optional[int] = None
+_shared_ubcf: Optional[UBCFEngine] = None
+_shared_ubcf_version = 0  # version du store local de notes à l'adoption du snapshot
+_snapshot_task: Optional[asyncio.Task] = None
+
+# Table des recommandations hybrides précalculées (job precompute.py)
+PRECOMPUTED_DB = os.getenv("PRECOMPUTED_DB", "recommendations.db")
+_precomputed: Optional[PrecomputedStore] = None
+_precomputed_version: Optional[tuple] = None  # ((version notes, version films), model_version)
+_precomputed_version_task: Optional[asyncio.Task] = None
+
+# Pool de calcul : thread (NumPy / BLAS relâchent le GIL) ou process (fork),
+# file bornée (503 au-delà) et limite de concurrence par endpoint
+compute_pool = ComputePool(
+    mode=os.getenv("COMPUTE_MODE", "thread"),
+    max_workers=int(os.getenv("COMPUTE_WORKERS", "0")) or None,
+    max_queue=int(os.getenv("COMPUTE_MAX_QUEUE", "32")),
+    limits=parse_limits(os.getenv("COMPUTE_LIMITS", "batch=1")),
+)
+
+# Délai par source dans /hybrid (secondes) : au-delà, la fusion se fait sans elle
+HYBRID_SOURCE_TIMEOUT = float(os.getenv("HYBRID_SOURCE_TIMEOUT", "2"))
+HYBRID_TIMEOUTS = parse_limits(os.getenv("HYBRID_TIMEOUTS", ""), cast=float)
+hybrid_source_stats = {name: {"ok": 0, "timeouts": 0, "errors": 0} for name in ("ubcf", "ibcf", "cb")}
+
+# Modèle spaCy chargé au démarrage (1) ou à la première requête /description_clean (0)
+SPACY_WARMUP = os.getenv("SPACY_WARMUP", "0") == "1"
+# Durée de chaque étape du démarrage (secondes), pour /cache-status
+startup_timings: Dict[str, float] = {}
+
+# Cache LRU + TTL des réponses /ubcf, /ibcf, /cb et /hybrid
+result_cache = ResultCache(
+    maxsize=int(os.getenv("RESULT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "300")),
+)
 
 # =========================
 # Helpers cache / refresh
 # =========================
-async def load_movies_cache():
+def load_ratings(docs):
+    """
+    Remplace le store des notes par une lecture complète de `rates`.
+    """
+    ratings_store.load(docs)
+    result_cache.clear()
+
+def put_user_result(key, response, user_id: str, user_version):
+    """
+    Met en cache la réponse d'un utilisateur, sauf si ses notes ont changé
+    pendant le calcul : l'invalidation est déjà passée, la réponse serait
+    périmée pour toute la durée du TTL.
+    """
+    if ratings_store.user_version(user_id) == user_version:
+        result_cache.put(key, response, user_id=user_id)
+
+def on_rating_upsert(doc):
+    ratings_store.upsert_doc(doc)
+    result_cache.invalidate_user(str(doc.get("userId")))
+
+def on_rating_delete(doc_id):
+    user_id = ratings_store.remove_doc(doc_id)
+    if user_id is not None:
+        result_cache.invalidate_user(user_id)
+
+def build_syncs(start_at_operation_time=None):
+    """
+    Crée les synchronisations movies / rates. Leur load() fait le chargement
+    initial des caches, start() lance ensuite le suivi incrémental.
+    """
+    # après une perte du change stream, le Content-Based est reconstruit sur le nouveau catalogue
+    syncs.append(CollectionSync(
+        "movies", movies_collection,
+        on_upsert=on_movie_upsert,
+        on_delete=on_movie_delete,
+        on_load=movies_store.load,
+        on_reload=refit_cb_recommender,
+        projection={f: 1 for f in MOVIE_FIELDS},
+        mode=SYNC_MODE,
+        poll_interval=SYNC_POLL_INTERVAL,
+        marker=MOVIES_SYNC_MARKER,
+        full_scan_every=SYNC_FULL_SCAN_EVERY,
+        start_at_operation_time=start_at_operation_time,
+    ))
+    syncs.append(CollectionSync(
+        "rates", rates_collection,
+        on_upsert=on_rating_upsert,
+        on_delete=on_rating_delete,
+        on_load=load_ratings,
+        projection={"userId": 1, "ratings": 1},
+        mode=SYNC_MODE,
+        poll_interval=SYNC_POLL_INTERVAL,
+        marker=RATES_SYNC_MARKER,
+        full_scan_every=SYNC_FULL_SCAN_EVERY,
+        start_at_operation_time=start_at_operation_time,
+    ))
+    return syncs
+
+def get_ubcf_engine(snap) -> UBCFEngine:
     """
-    Recharge entièrement le cache movies_map depuis MongoDB.
+    Dernier moteur UBCF construit (ou celui du snapshot partagé pour un worker
+    non leader). Il peut retarder d'un intervalle de reconstruction sur les notes.
     """
-    global movies_map, _movies_count_cache
-    movies_docs = await movies_collection.find({}, {
-        "movieId": 1, "title": 1, "year": 1,
-        "genres": 1, "description": 1, "backdrop": 1
-    }).to_list(None)
-    movies_map = {}
-    for m in movies_docs:
+    global _ubcf_engine
+    if _shared_ubcf is not None:
+        return _shared_ubcf
+    if _ubcf_engine is None:
+        # pas encore construit (démarrage) : construction synchrone, une seule fois
+        key = (ratings_store.version, snap.version)
+        _ubcf_engine = (key, UBCFEngine(ratings_store.matrix(snap.movies_map, snap.version)))
+    return _ubcf_engine[1]
+
+def ubcf_current_for(user_id: str) -> bool:
+    """
+    Vrai si le moteur UBCF courant a été construit après la dernière
+    modification des notes de l'utilisateur. Sinon ses résultats UBCF (et
+    hybrides) sont périmés : ils ne sont pas mis en cache.
+    """
+    if _shared_ubcf is not None:
+        version = _shared_ubcf_version
+    elif _ubcf_engine is not None:
+        version = _ubcf_engine[0][0]
+    else:
+        return True  # construit à la première requête, sur les notes courantes
+    return not ratings_store.changed_since(user_id, version)
+
+async def rebuild_ubcf_engine() -> bool:
+    """
+    Reconstruit le moteur UBCF dans un thread si les notes ou les films ont changé,
+    puis remplace l'ancien d'un coup. Renvoie True s'il a été reconstruit.
+    """
+    global _ubcf_engine
+    snap = movies_store.snapshot()
+    key = (ratings_store.version, snap.version)
+    if _ubcf_engine is not None and _ubcf_engine[0] == key:
+        return False
+    ratings = ratings_store.matrix(snap.movies_map, snap.version)
+    engine = await asyncio.to_thread(UBCFEngine, ratings)
+    _ubcf_engine = (key, engine)
+    return True
+
+async def rebuild_ibcf_model():
+    """
+    Reconstruit le modèle IBCF dans un thread si les notes ou les films ont changé,
+    puis remplace l'ancien d'un coup (les requêtes en cours gardent l'ancien).
+    """
+    global _ibcf_model
+    snap = movies_store.snapshot()
+    key = (ratings_store.version, snap.version)
+    if _ibcf_model is not None and _ibcf_model[0] == key:
+        return
+    ratings = ratings_store.matrix(snap.movies_map, snap.version)
+    model = await asyncio.to_thread(ItemNeighborModel, ratings, IBCF_MODEL_K)
+    _ibcf_model = (key, model)
+    result_cache.clear()
+    compute_pool.refresh()
+    print(f"✅ Modèle IBCF reconstruit ({len(model.titles)} films, k={model.k})")
+    await publish_model_snapshot()
+
+async def ibcf_rebuild_loop():
+    while True:
+        await asyncio.sleep(IBCF_REBUILD_INTERVAL)
         try:
-            mid = int(m.get("movieId"))
-        except Exception:
-            # si movieId n'est pas convertible, on ignore l'entrée
+            # UBCF d'abord : la reconstruction IBCF (même clé) vide ensuite le
+            # cache de résultats et rafraîchit le pool pour les deux modèles
+            await rebuild_ubcf_engine()
+            await rebuild_ibcf_model()
+        except Exception as e:
+            print("❌ Reconstruction IBCF impossible:", e)
+
+def get_ibcf_model(k: int) -> ItemNeighborModel:
+    """
+    Modèle IBCF courant. Si k dépasse le nombre de voisins précalculés,
+    un modèle exact est construit pour cette requête.
+    """
+    if _ibcf_model is not None:
+        model = _ibcf_model[1]
+        if k <= model.k or model.k >= len(model.titles) - 1:
+            return model
+    snap = movies_store.snapshot()
+    return ItemNeighborModel(ratings_store.matrix(snap.movies_map, snap.version), k=k)
+
+def get_precomputed() -> Optional[PrecomputedStore]:
+    """
+    Table précalculée, ouverte en lecture seule dès que le job l'a produite.
+    """
+    global _precomputed
+    if _precomputed is None and PRECOMPUTED_DB and os.path.exists(PRECOMPUTED_DB):
+        try:
+            _precomputed = PrecomputedStore(PRECOMPUTED_DB, readonly=True)
+            print(f"✅ Recommandations précalculées: {PRECOMPUTED_DB}")
+        except Exception as e:
+            print("❌ Table précalculée illisible:", e)
+    return _precomputed
+
+async def _refresh_precomputed_version(key: tuple, ratings, movies_map):
+    global _precomputed_version, _precomputed_version_task
+    try:
+        version = await asyncio.to_thread(model_version, ratings, movies_map)
+        _precomputed_version = (key, version)
+    except Exception as e:
+        print("❌ Version des données pour la table précalculée:", e)
+    finally:
+        _precomputed_version_task = None
+
+def precomputed_version(snap) -> Optional[str]:
+    """
+    model_version() des stores courants, à comparer à celle des lignes
+    précalculées. None tant qu'elle n'est pas calculée pour les versions
+    courantes des notes et des films : le calcul est lancé en tâche de fond
+    et la requête passe par le calcul normal.
+    """
+    global _precomputed_version_task
+    key = (ratings_store.version, snap.version)
+    if _precomputed_version is not None and _precomputed_version[0] == key:
+        return _precomputed_version[1]
+    if _precomputed_version_task is None:
+        ratings = ratings_store.matrix(snap.movies_map, snap.version)
+        _precomputed_version_task = asyncio.create_task(
+            _refresh_precomputed_version(key, ratings, snap.movies_map)
+        )
+    return None
+
+# =========================
+# Content-Based : modèle unique, mis à jour en place
+# =========================
+def build_cb_recommender(snap) -> ContentBasedRecommender:
+    """
+    Construit le ContentBasedRecommender depuis un snapshot du catalogue (sans MongoDB).
+    """
+    return ContentBasedRecommender.from_movies_map(
+        snap.movies_map,
+        neighbors_k=CB_NEIGHBORS_K or None,
+        ann=CB_ANN,
+        ann_min_rows=CB_ANN_MIN_ROWS,
+        svd_components=CB_SVD_COMPONENTS or None,
+    )
+
+def _apply_cb_changes(reco: ContentBasedRecommender, changes: List[tuple]):
+    # exécuté dans un thread : les ajouts du lot sont concaténés en une fois
+    reco.apply_changes([
+        (op, mid, movie.get("title"), movie.get("description_clean")) if op == "upsert" else (op, mid, None, None)
+        for op, mid, movie in changes
+    ])
+
+def _cb_with_changes(reco: ContentBasedRecommender, changes: List[tuple]) -> ContentBasedRecommender:
+    # le modèle publié n'est jamais modifié : les changements portent sur une copie
+    new_reco = reco.copy()
+    _apply_cb_changes(new_reco, changes)
+    return new_reco
+
+async def _drain_cb_changes():
+    """
+    Applique les changements en file par lots, dans l'ordre, et publie chaque
+    nouveau modèle d'une seule affectation.
+    """
+    global cb_reco
+    while _cb_queue:
+        batch = list(_cb_queue)
+        _cb_queue.clear()
+        reco = cb_reco
+        if reco is None:
+            continue
+        try:
+            new_reco = await asyncio.to_thread(_cb_with_changes, reco, batch)
+        except Exception as e:
+            print("❌ Mise à jour Content-Based impossible:", e)
             continue
-        movies_map[mid] = m
-    _movies_count_cache = len(movies_map)
-    print(f"📊 Cache films rechargé: {_movies_count_cache} films")
+        if cb_reco is reco:
+            # sinon un refit a remplacé le modèle entre-temps et rejoue déjà ces changements
+            cb_reco = new_reco
+            compute_pool.refresh()
+
+def _cb_change(op: str, movie_id: int, movie=None):
+    # callback de synchro (boucle) : mise en file seulement
+    global _cb_apply_task
+    _cb_queue.append((op, movie_id, movie))
+    if _cb_pending is not None:
+        # un refit est en cours : le changement sera rejoué sur le nouveau modèle
+        _cb_pending.append((op, movie_id, movie))
+    if _cb_apply_task is None or _cb_apply_task.done():
+        _cb_apply_task = asyncio.get_running_loop().create_task(_drain_cb_changes())
+
+def on_movie_upsert(doc):
+    mid = movies_store.upsert_doc(doc)
+    if mid is not None:
+        _cb_change("upsert", mid, doc)
+
+def on_movie_delete(doc_id):
+    mid = movies_store.remove_doc(doc_id)
+    if mid is not None:
+        _cb_change("remove", mid)
+
+async def refit_cb_recommender():
+    """
+    Refit complet (nouveau vocabulaire TF-IDF) dans un thread, puis remplacement
+    atomique de cb_reco. Les changements arrivés pendant le refit sont rejoués.
+    """
+    global cb_reco, _cb_pending
+    if _cb_pending is not None:
+        return  # refit déjà en cours
+    _cb_pending = []
+    try:
+        snap = movies_store.snapshot()
+        new_reco = await asyncio.to_thread(build_cb_recommender, snap)
+        # rejeu dans un thread (le modèle n'est pas encore partagé) jusqu'à ce qu'aucun
+        # changement ne soit arrivé entre-temps, puis échange sans await intermédiaire
+        replayed = 0
+        while replayed < len(_cb_pending):
+            batch = _cb_pending[replayed:]
+            await asyncio.to_thread(_apply_cb_changes, new_reco, batch)
+            replayed += len(batch)
+        cb_reco = new_reco
+        result_cache.clear()
+        compute_pool.refresh()
+        print(f"✅ ContentBasedRecommender reconstruit ({len(new_reco.movies_df)} films)")
+    finally:
+        _cb_pending = None
+    await publish_model_snapshot()
+
+async def cb_refit_loop():
+    while True:
+        await asyncio.sleep(CB_REFIT_INTERVAL)
+        if cb_reco is not None and not cb_reco.needs_refit(CB_DRIFT_THRESHOLD):
+            continue
+        try:
+            await refit_cb_recommender()
+        except Exception as e:
+            print("❌ Refit Content-Based impossible:", e)
 
-async def refresh_movies_cache_if_needed():
+# =========================
+# Snapshots partagés (plusieurs workers sur un même nœud)
+# =========================
+async def publish_model_snapshot():
     """
-    Vérifie le nombre de documents dans la collection movies.
-    Si différent du cache local, recharge le cache.
+    Leader : écrit les modèles courants dans une nouvelle génération memmap.
     """
-    global _movies_count_cache
+    global _shared_generation
+    if not SNAPSHOT_DIR or not is_leader or cb_reco is None or _ibcf_model is None:
+        return
+    snap = movies_store.snapshot()
+    ratings = ratings_store.matrix(snap.movies_map, snap.version)
+    cb_state = _cb_state(cb_reco)
     try:
-        count = await movies_collection.count_documents({})
+        _shared_generation = await asyncio.to_thread(save_models, SNAPSHOT_DIR, ratings, _ibcf_model[1], cb_state)
+        print(f"📦 Snapshot des modèles publié (génération {_shared_generation})")
     except Exception as e:
-        print("❌ Impossible de compter les films dans MongoDB:", e)
-        return
-    if count != _movies_count_cache:
-        print(f"🔁 Changement détecté dans la collection movies (db={count} vs cache={_movies_count_cache}), rechargement du cache...")
-        await load_movies_cache()
-    else:
-        # pour debug léger
-        print(f"✅ Cache films à jour ({_movies_count_cache} films)")
+        print("❌ Publication du snapshot impossible:", e)
+
+def _cb_state(reco: ContentBasedRecommender) -> Dict[str, Any]:
+    # un modèle publié n'est plus modifié : ses tableaux sont lus tels quels
+    return {
+        "movies_df": reco.movies_df,
+        "tfidf_vect": reco.tfidf_vect,
+        "tfidf_matrix": reco.tfidf_matrix,
+        "active": reco.active,
+        "neighbor_idx": reco.neighbor_idx,
+        "neighbor_sim": reco.neighbor_sim,
+        "svd": reco.svd,
+        "embeddings": reco.embeddings,
+        "movieid_col": reco.movieid_col,
+        "title_col": reco.title_col,
+        "text_col": reco.text_col,
+    }
+
+async def adopt_model_snapshot() -> bool:
+    """
+    Worker non leader : remplace ses modèles par ceux de la génération courante.
+    """
+    global cb_reco, _ibcf_model, _shared_ubcf, _shared_ubcf_version, _shared_generation
+    generation = current_generation(SNAPSHOT_DIR)
+    if generation is None:
+        return False
+    ubcf_engine, ibcf_model, reco = await asyncio.to_thread(load_models, ModelSnapshot(SNAPSHOT_DIR, generation), ann=CB_ANN, ann_min_rows=CB_ANN_MIN_ROWS)
+    cb_reco = reco
+    _ibcf_model = (("snapshot", generation), ibcf_model)
+    _shared_ubcf = ubcf_engine
+    _shared_ubcf_version = ratings_store.version
+    _shared_generation = generation
+    result_cache.clear()
+    compute_pool.refresh()
+    print(f"📦 Modèles chargés depuis le snapshot (génération {generation})")
+    return True
+
+def start_model_loops():
+    """
+    Tâches de reconstruction des modèles (leader seulement).
+    """
+    global _cb_refit_task, _ibcf_rebuild_task
+    _cb_refit_task = asyncio.create_task(cb_refit_loop())
+    _ibcf_rebuild_task = asyncio.create_task(ibcf_rebuild_loop())
+
+async def snapshot_watch_loop():
+    """
+    Worker non leader : suit les nouvelles générations, et prend le relais
+    si le leader disparaît (verrou libéré).
+    """
+    global is_leader, _shared_ubcf
+    while True:
+        await asyncio.sleep(SNAPSHOT_POLL_INTERVAL)
+        try:
+            if _leader_lock.acquire():
+                is_leader = True
+                _shared_ubcf = None
+                print("👑 Ce worker devient leader des snapshots")
+                start_model_loops()
+                await rebuild_ubcf_engine()
+                await rebuild_ibcf_model()
+                return
+            generation = current_generation(SNAPSHOT_DIR)
+            if generation is not None and generation != _shared_generation:
+                await adopt_model_snapshot()
+        except Exception as e:
+            print("❌ Lecture du snapshot impossible:", e)
 
 # =========================
 # Route Keep-Alive (Anti-sommeil Render)
@@ -85,26 +523,114 @@ async def keep_alive():
     """
     print("🛰️ Ping reçu : Instance maintenue en éveil.")
     return {"status": "alive", "message": "RecommendIT backend is running"}
+
+@app.get("/cache-status")
+async def cache_status():
+    """
+    Versions des caches en mémoire et état des tâches de synchronisation.
+    """
+    corpus_idf = get_corpus_idf()
+    return {
+        "movies": {"version": movies_store.version, "count": len(movies_store)},
+        "ratings": {"version": ratings_store.version, "count": ratings_store.n_ratings},
+        "sync": {sync.name: sync.stats() for sync in syncs},
+        "cb": {
+            "movies": len(cb_reco.movies_df) if cb_reco is not None else 0,
+            "changes_since_fit": cb_reco.n_changes if cb_reco is not None else 0,
+            "vocabulary_drift": cb_reco.vocabulary_drift() if cb_reco is not None else 0.0,
+            "ann_queries": cb_reco.ann_queries if cb_reco is not None else 0,
+            "ann_fallbacks": cb_reco.ann_fallbacks if cb_reco is not None else 0,
+            "svd_components": cb_reco.embeddings.shape[1] if cb_reco is not None and cb_reco.embeddings is not None else 0,
+        },
+        "snapshot": {"enabled": bool(SNAPSHOT_DIR), "leader": is_leader, "generation": _shared_generation},
+        "result_cache": result_cache.stats(),
+        "compute_pool": compute_pool.stats(),
+        "hybrid_sources": hybrid_source_stats,
+        "precomputed": get_precomputed().stats() if get_precomputed() is not None else None,
+        "startup": startup_timings,
+        "description_cache": description_cache.stats(),
+        "corpus_idf": {"docs": corpus_idf.n_docs, "tokens": len(corpus_idf)} if corpus_idf is not None else None,
+    }
 # =========================
 # Startup: initialisation du cache et du CB recommender
 # =========================
+@contextmanager
+def startup_step(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - start
+
 @app.on_event("startup")
 async def startup_event():
-    global cb_reco
+    global is_leader, _snapshot_task
     try:
-        await client.admin.command("ping")
+        with startup_step("mongo"):
+            ping = await client.admin.command("ping")
         print("✅ Connecté à MongoDB Atlas")
 
-        # Charger le cache initial des films
-        await load_movies_cache()
-
-        # Initialiser le ContentBasedRecommender (il charge ses propres données depuis la collection)
-        cb_reco = await ContentBasedRecommender.create(movies_collection)
-        print("✅ ContentBasedRecommender initialisé")
+        # Charger les caches initiaux (films + notes en tableaux compacts) par
+        # la synchronisation : la même lecture sert d'état de référence au polling,
+        # et les change streams reprennent à l'instant du ping. Rien n'est perdu
+        # entre le chargement initial et le suivi incrémental.
+        movies_sync, rates_sync = build_syncs(ping.get("operationTime"))
+        with startup_step("movies"):
+            await movies_sync.load()
+        with startup_step("ratings"):
+            await rates_sync.load()
+        for sync in syncs:
+            sync.start()
+
+        # Plusieurs workers : un seul leader construit les modèles, les autres
+        # mappent le snapshot publié (construction locale s'il n'y en a pas encore)
+        if _leader_lock is not None:
+            is_leader = _leader_lock.acquire()
+        with startup_step("snapshot"):
+            adopted = not is_leader and await adopt_model_snapshot()
+        if not adopted:
+            # Initialiser le ContentBasedRecommender une seule fois, depuis le cache films
+            with startup_step("cb"):
+                await refit_cb_recommender()
+            print("✅ ContentBasedRecommender initialisé")
+
+            # Moteur UBCF et modèle IBCF initiaux, puis reconstructions périodiques en tâche de fond
+            with startup_step("ubcf"):
+                await rebuild_ubcf_engine()
+            with startup_step("ibcf"):
+                await rebuild_ibcf_model()
+        if is_leader:
+            start_model_loops()
+        else:
+            _snapshot_task = asyncio.create_task(snapshot_watch_loop())
+
+        if SPACY_WARMUP:
+            with startup_step("spacy"):
+                await asyncio.to_thread(warm_up_nlp)
+        print("⏱️ Démarrage: " + ", ".join(f"{name} {secs:.2f}s" for name, secs in startup_timings.items()))
     except Exception as e:
         print("❌ Erreur au démarrage:", str(e))
         raise e
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    for sync in syncs:
+        await sync.stop()
+    for task in (_cb_refit_task, _ibcf_rebuild_task, _snapshot_task, _cb_apply_task):
+        if task is not None:
+            task.cancel()
+    compute_pool.shutdown()
+    if _leader_lock is not None:
+        _leader_lock.release()
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    """
+    Pool de calcul saturé : 503, le client peut réessayer.
+    """
+    print(f"⚠️ {exc}")
+    return JSONResponse(status_code=503, content={"success": False, "error": str(exc)}, headers={"Retry-After": "1"})
+
 # =========================
 # Schémas
 # =========================
@@ -142,79 +668,154 @@ class HybridRequest(BaseModel):
     favorites: List[str] = []
     userRatings: List[RatingsEntry] = []
 
+class BatchRequest(BaseModel):
+    userIds: List[str]
+    top_n: int = 10
+    k: int = 20
+
+class HybridBatchRequest(BaseModel):
+    userIds: List[str]
+    top_n: int = 20
+    k: int = 20
+    favorites: Dict[str, List[str]] = {}
+
+class DescriptionCleanBatchRequest(BaseModel):
+    movies: List[Movie]
+    tfidf_top_k: int = 15
+
+# =========================
+# Calculs exécutés dans le pool (hors boucle asyncio)
+# =========================
+def enrich_hybrid(recs, snap) -> List[Dict[str, Any]]:
+    """
+    Ajoute les détails du film à chaque (movieId, score).
+    """
+    enriched = []
+    for mid, score in recs:
+        movie = snap.movies_map.get(mid)
+        if movie:
+            enriched.append({
+                "movieId": mid,
+                "title": snap.id_to_title.get(mid, ""),
+                "year": movie.get("year", ""),
+                "genres": movie.get("genres", []),
+                "description": movie.get("description", ""),
+                "backdrop": movie.get("backdrop", ""),
+                "score": float(score)
+            })
+    return enriched
+
+def seen_from_store(user_id: str, snap):
+    """
+    Titres et movieId déjà notés par l'utilisateur (store en mémoire).
+    """
+    seen_titles, seen_ids = set(), set()
+    for mid, _ in ratings_store.user_ratings(user_id):
+        movie = snap.movies_map.get(mid)
+        if movie:
+            seen_titles.add(movie.get("title"))
+            seen_ids.add(mid)
+    return seen_titles, seen_ids
+
+def content_recommendations(favorites: List[str], seen_titles) -> List[Dict[str, Any]]:
+    # Content-Based : modèle partagé, construit au démarrage
+    reco = cb_reco
+    if reco is None:
+        return []
+    return reco.recommend_with_details(
+        favorites=favorites,
+        top_n=100,
+        exclude_seen=list(seen_titles)
+    )
+
+def compute_ubcf(user_id: str, top_n: int, k: int, snap=None):
+    snap = snap or movies_store.snapshot()
+    return get_ubcf_engine(snap).recommend(user_id, top_n=top_n, k=k)
+
+def compute_ibcf(user_ratings: List[Dict[str, Any]], top_n: int, k: int):
+    return get_ibcf_model(k).recommend(user_ratings, top_n=top_n, k=k)
+
+def compute_cb(favorites: List[str], top_n: int, exclude_seen: List[str]):
+    reco = cb_reco
+    if reco is None:
+        raise RuntimeError("ContentBasedRecommender non initialisé")
+    return reco.recommend_from_titles(favorites=favorites, top_n=top_n, exclude_seen=exclude_seen)
+
+def compute_ubcf_many(user_ids: List[str], top_n: int, k: int):
+    snap = movies_store.snapshot()
+    return get_ubcf_engine(snap).recommend_many(user_ids, top_n=top_n, k=k)
+
+def compute_ibcf_many(user_ratings: Dict[str, List[Dict[str, Any]]], top_n: int, k: int):
+    return get_ibcf_model(k).recommend_many(user_ratings, top_n=top_n, k=k)
+
+def compute_hybrid_many(user_ids: List[str], top_n: int, k: int, favorites: Dict[str, List[str]],
+                        user_ratings: Dict[str, List[Dict[str, Any]]]):
+    snap = movies_store.snapshot()
+    # UBCF et IBCF pour tout le lot en produits matrice × matrice
+    results = hybrid_recommend_many(
+        user_ids, get_ubcf_engine(snap), get_ibcf_model(k), cb_reco, snap.title_to_id,
+        user_ratings, favorites, top_n=top_n, k=k
+    )
+    return {uid: enrich_hybrid(recs, snap) for uid, recs in results.items()}
+
 # =========================
 # UBCF
 # =========================
 @app.post("/ubcf")
 async def ubcf_recommend(req: UserRequest):
-    # S'assurer que le cache films est à jour
-    await refresh_movies_cache_if_needed()
-
-    df_list = []
-    async for rate in rates_collection.find():
-        for r in rate.get("ratings", []):
-            film_id = r.get("filmId")
-            if film_id is None:
-                continue
-            movie = movies_map.get(int(film_id))
-            if movie:
-                df_list.append({
-                    "userId": str(rate.get("userId")),
-                    "title": movie.get("title"),
-                    "rating": r.get("note", r.get("rating"))
-                })
-
-    df = pd.DataFrame(df_list)
-    recs = recommender_ubcf_direct(df=df, user_object_id=req.userId, top_n=req.top_n, k=req.k)
-    return {"recommendations": [{"title": t, "score": float(s)} for t, s in recs]}
+    # Snapshot en mémoire, tenu à jour par les tâches de synchronisation
+    snap = movies_store.snapshot()
+    user_version = ratings_store.user_version(req.userId)
+    key = request_key("ubcf", req.dict(), snap.version, user_version)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    fresh = ubcf_current_for(req.userId)
+    recs = await compute_pool.run("ubcf", compute_ubcf, req.userId, req.top_n, req.k)
+    response = {"recommendations": [{"title": t, "score": float(s)} for t, s in recs]}
+    if fresh:
+        # pas de mise en cache si le moteur est en retard sur les notes de l'utilisateur
+        put_user_result(key, response, req.userId, user_version)
+    return response
 
 # =========================
 # IBCF
 # =========================
 @app.post("/ibcf")
 async def ibcf_recommend(req: UserRequest):
-    # S'assurer que le cache films est à jour
-    await refresh_movies_cache_if_needed()
-
-    df_list = []
-    async for rate in rates_collection.find():
-        for r in rate.get("ratings", []):
-            film_id = r.get("filmId")
-            if film_id is None:
-                continue
-            movie = movies_map.get(int(film_id))
-            if movie:
-                df_list.append({
-                    "userId": str(rate.get("userId")),
-                    "title": movie.get("title"),
-                    "rating": r.get("note", r.get("rating"))
-                })
-
-    df = pd.DataFrame(df_list)
-    user_ratings = [d for d in df_list if d["userId"] == str(req.userId)]
-
-    recs = recommender_ibcf_from_ratings(df=df, user_ratings=user_ratings, top_n=req.top_n, k=req.k)
-    return {"recommendations": [{"title": t, "score": float(s)} for t, s in recs]}
+    # Snapshot en mémoire, tenu à jour par les tâches de synchronisation
+    snap = movies_store.snapshot()
+    user_version = ratings_store.user_version(req.userId)
+    key = request_key("ibcf", req.dict(), snap.version, user_version)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    user_ratings = ratings_store.user_title_ratings(req.userId, snap.movies_map)
+    recs = await compute_pool.run("ibcf", compute_ibcf, user_ratings, req.top_n, req.k)
+    response = {"recommendations": [{"title": t, "score": float(s)} for t, s in recs]}
+    put_user_result(key, response, req.userId, user_version)
+    return response
 
 # =========================
 # Content-Based
 # =========================
 @app.post("/cb")
 async def cb_recommend(req: FavoritesRequest):
-    # Vérifier et recharger le cache films si nécessaire
-    await refresh_movies_cache_if_needed()
-
     try:
-        # ⚡️ Recréer le ContentBasedRecommender à chaque requête
-        cb_reco = await ContentBasedRecommender.create(movies_collection)
+        key = request_key("cb", req.dict(), movies_store.version)
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
 
-        movie_ids = cb_reco.recommend_from_titles(
-            favorites=req.favorites,
-            top_n=req.top_n,
-            exclude_seen=req.exclude_seen
-        )
+        movie_ids = await compute_pool.run("cb", compute_cb, req.favorites, req.top_n, req.exclude_seen)
         print(f"🔎 Content-Based recs ({len(movie_ids)}):", movie_ids[:5])
-        return {"success": True, "recommendations": movie_ids}
+        response = {"success": True, "recommendations": movie_ids}
+        result_cache.put(key, response)
+        return response
+    except PoolSaturated:
+        raise
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -231,121 +832,187 @@ async def description_clean(
     description: str = Body(...)
 ):
     try:
-        desc_clean = build_description_clean_one(title=title, genres=genres, year=year, actors=actors, description=description)
+        # mêmes champs normalisés -> même résultat, sans repasser par spaCy ;
+        # clé (table d'IDF) et cache SQLite lus et écrits dans un thread
+        key, desc_clean = await asyncio.to_thread(description_cache.lookup, title, genres, year, actors, description)
+        if desc_clean is None:
+            desc_clean = await compute_pool.run(
+                "description_clean", build_description_clean_one,
+                title=title, genres=genres, year=year, actors=actors, description=description
+            )
+            await asyncio.to_thread(description_cache.put, key, desc_clean)
         return {"success": True, "description_clean": desc_clean}
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def compute_description_clean_many(movies: List[Dict[str, Any]], tfidf_top_k: int):
+    return [desc for _, desc in build_description_clean_many(movies, tfidf_top_k=tfidf_top_k)]
+
+@app.post("/description_clean/batch")
+async def description_clean_batch(req: DescriptionCleanBatchRequest):
+    """
+    description_clean de plusieurs films (imports en masse), dans l'ordre reçu.
+    """
+    try:
+        movies = [m.dict() for m in req.movies]
+        results = await compute_pool.run("batch", compute_description_clean_many, movies, req.tfidf_top_k)
+        return {"success": True, "descriptions_clean": results}
+    except PoolSaturated:
+        raise
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+async def run_hybrid_source(name: str, fn, *args):
+    """
+    Calcule une source de /hybrid dans le pool, avec son délai.
+    Renvoie (résultat, statut) ; le résultat vaut None si la source a échoué.
+    """
+    try:
+        result = await asyncio.wait_for(
+            compute_pool.run(f"hybrid:{name}", fn, *args),
+            HYBRID_TIMEOUTS.get(name, HYBRID_SOURCE_TIMEOUT),
+        )
+    except asyncio.TimeoutError:
+        print(f"⏱️ Source {name} trop lente, ignorée")
+        hybrid_source_stats[name]["timeouts"] += 1
+        return None, "timeout"
+    except PoolSaturated:
+        print(f"⚠️ Source {name}: pool saturé, ignorée")
+        return None, "saturated"
+    except Exception as e:
+        print(f"❌ Source {name} en erreur:", e)
+        hybrid_source_stats[name]["errors"] += 1
+        return None, "error"
+    hybrid_source_stats[name]["ok"] += 1
+    return result, "ok"
+
 @app.post("/hybrid")
 async def hybrid_recommend_api(req: HybridRequest):
     print("\n====================== HYBRID DEBUG ======================")
     print("📩 Payload reçu:", req.dict())
 
-    # Vérifier et recharger le cache films si nécessaire
-    await refresh_movies_cache_if_needed()
-
-    # Construire la liste de ratings
-    df_list = []
-    user_seen_titles_db = set()
-    user_seen_ids_db = set()
-
-    async for rate in rates_collection.find():
-        uid = str(rate.get("userId"))
-        for r in rate.get("ratings", []):
-            film_id = r.get("filmId")
-            if film_id is None:
-                continue
-            movie = movies_map.get(int(film_id))
-            if movie:
-                df_list.append({
-                    "userId": uid,
-                    "title": movie.get("title"),
-                    "rating": r.get("note", r.get("rating"))
-                })
-                if uid == str(req.userId):
-                    user_seen_titles_db.add(movie.get("title"))
-                    user_seen_ids_db.add(int(film_id))
-
-    # Films déjà vus
+    # Snapshot en mémoire, tenu à jour par les tâches de synchronisation
+    snap = movies_store.snapshot()
+    user_version = ratings_store.user_version(req.userId)
+    key = request_key("hybrid", req.dict(), snap.version, user_version)
+    cached = result_cache.get(key)
+    if cached is not None:
+        print("⚡ Réponse en cache")
+        return cached
+
+    user_ratings_list = [{"title": r.title, "rating": r.rating} for r in req.userRatings]
+
+    # Chemin rapide : résultat précalculé, tant que les notes et favoris
+    # (payload et store), les notes des autres et le catalogue n'ont pas
+    # changé depuis le précalcul
+    precomputed = get_precomputed()
+    version = precomputed_version(snap) if precomputed is not None else None
+    if version is not None:
+        fingerprint = ratings_fingerprint(user_ratings_list, req.favorites)
+        store_fingerprint = ratings_fingerprint(ratings_store.user_title_ratings(req.userId, snap.movies_map), req.favorites)
+        recs = None
+        if fingerprint == store_fingerprint:
+            recs = precomputed.lookup(req.userId, req.k, fingerprint, req.top_n, version)
+        if recs is not None:
+            enriched = enrich_hybrid(recs, snap)
+            print(f"⚡ Recommandations précalculées: {len(enriched)}")
+            print("====================== HYBRID END ======================\n")
+            response = {"success": True, "recommendations": enriched, "sources": ["precomputed"], "degraded": []}
+            put_user_result(key, response, req.userId, user_version)
+            return response
+
+    # Films déjà vus : notes du store + notes du payload
+    user_seen_titles_db, seen_ids = seen_from_store(req.userId, snap)
     user_seen_titles_payload = {r.title for r in req.userRatings}
     seen_titles = user_seen_titles_db | user_seen_titles_payload
-    title_to_id = {m["title"]: int(m["movieId"]) for m in movies_map.values() if "movieId" in m and "title" in m}
-    id_to_title = {int(m["movieId"]): m["title"] for m in movies_map.values() if "movieId" in m and "title" in m}
-
-    seen_ids = set(user_seen_ids_db)
     for t in user_seen_titles_payload:
-        mid = title_to_id.get(t)
+        mid = snap.title_to_id.get(t)
         if mid is not None:
             seen_ids.add(mid)
 
-    df = pd.DataFrame(df_list)
-
-    # UBCF
-    ubcf_recs = recommender_ubcf_direct(df=df, user_object_id=req.userId, top_n=100, k=req.k)
-
-    # IBCF
-    user_ratings_list = [{"title": r.title, "rating": r.rating} for r in req.userRatings]
-    ibcf_recs = recommender_ibcf_from_ratings(df=df, user_ratings=user_ratings_list, top_n=100, k=req.k)
-
-    # ⚡️ Recréer Content-Based à chaque appel
-    cb_reco = await ContentBasedRecommender.create(movies_collection)
-    content_recs = cb_reco.recommend_with_details(
-        favorites=req.favorites,
-        top_n=100,
-        exclude_seen=list(seen_titles)
+    # UBCF, IBCF et Content-Based en parallèle, chacun avec son délai
+    ubcf_fresh = ubcf_current_for(req.userId)
+    shared_snap = snap if compute_pool.mode == "thread" else None
+    (ubcf_recs, ubcf_status), (ibcf_recs, ibcf_status), (content_recs, cb_status) = await asyncio.gather(
+        run_hybrid_source("ubcf", compute_ubcf, req.userId, 100, req.k, shared_snap),
+        run_hybrid_source("ibcf", compute_ibcf, user_ratings_list, 100, req.k),
+        run_hybrid_source("cb", content_recommendations, req.favorites, list(seen_titles)),
     )
+    statuses = {"ubcf": ubcf_status, "ibcf": ibcf_status, "cb": cb_status}
+    if all(status == "saturated" for status in statuses.values()):
+        raise PoolSaturated("hybrid")
+    degraded = [name for name, status in statuses.items() if status != "ok"]
 
-    # Normalisation et conversion en movieId
-    ibcf_norm = {}
-    for film, score in ibcf_recs:
-        mid = title_to_id.get(film)
-        if mid:
-            ibcf_norm[mid] = score / 5.0
-
-    ubcf_norm = {}
-    for film, score in ubcf_recs:
-        mid = title_to_id.get(film)
-        if mid:
-            ubcf_norm[mid] = score / 5.0
-
-    content_norm = {rec["movieId"]: rec["score"] for rec in content_recs}
-
-    alpha = 0.75
-    beta = 0.5
-    candidate_films = set(ibcf_norm) | set(ubcf_norm) | set(content_norm)
-
-    def is_seen(mid):
-        return mid in seen_ids
-
-    candidate_films = {mid for mid in candidate_films if not is_seen(mid)}
-
-    # Fusion des scores par movieId
-    hybrid_scores = {}
-    for mid in candidate_films:
-        score_cb = content_norm.get(mid, 0.0)
-        score_cf = beta * ubcf_norm.get(mid, 0.0) + (1.0 - beta) * ibcf_norm.get(mid, 0.0)
-        score = alpha * score_cb + (1.0 - alpha) * score_cf
-        hybrid_scores[mid] = score
-
-    recs = sorted(hybrid_scores.items(), key=lambda x: x[1], reverse=True)[:req.top_n]
-
-    # Enrichissement
-    enriched = []
-    for mid, score in recs:
-        movie = movies_map.get(mid)
-        if movie:
-            enriched.append({
-                "movieId": mid,
-                "title": id_to_title.get(mid, ""),
-                "year": movie.get("year", ""),
-                "genres": movie.get("genres", []),
-                "description": movie.get("description", ""),
-                "backdrop": movie.get("backdrop", ""),
-                "score": float(score)
-            })
+    # Fusion par movieId (poids répartis sur les sources disponibles) puis enrichissement
+    recs = fuse_hybrid_scores(ubcf_recs, ibcf_recs, content_recs, snap.title_to_id, seen_ids, top_n=req.top_n)
+    enriched = enrich_hybrid(recs, snap)
+    sources = contributing_sources(ubcf_recs, ibcf_recs, content_recs)
 
     print(f"🎯 Nombre de recommandations enrichies: {len(enriched)}")
     print("📌 Premières recommandations enrichies:", enriched[:3])
+    print(f"🧩 Sources: {sources}" + (f" (indisponibles: {degraded})" if degraded else ""))
     print("====================== HYBRID END ======================\n")
 
-    return {"success": True, "recommendations": enriched}
+    response = {"success": True, "recommendations": enriched, "sources": sources, "degraded": degraded}
+    if not degraded and ubcf_fresh:
+        # une réponse dégradée, ou calculée sur un moteur UBCF antérieur aux
+        # dernières notes de l'utilisateur, n'est pas mise en cache
+        put_user_result(key, response, req.userId, user_version)
+    return response
+
+# =========================
+# BATCH (pré-chauffage, campagnes email)
+# =========================
+async def load_favorite_titles(user_ids: List[str], snap) -> Dict[str, List[str]]:
+    """
+    Favoris de plusieurs utilisateurs, en une seule requête sur la collection favorites.
+    """
+    object_ids = {}
+    for uid in user_ids:
+        try:
+            object_ids[ObjectId(uid)] = uid
+        except Exception:
+            continue
+    favorites: Dict[str, List[str]] = {uid: [] for uid in user_ids}
+    if not object_ids:
+        return favorites
+    async for fav in favorites_collection.find({"userId": {"$in": list(object_ids)}}, {"userId": 1, "movieId": 1}):
+        try:
+            title = snap.id_to_title.get(int(fav.get("movieId")))
+        except Exception:
+            continue
+        if title:
+            favorites[object_ids[fav["userId"]]].append(title)
+    return favorites
+
+@app.post("/ubcf/batch")
+async def ubcf_batch(req: BatchRequest):
+    results = await compute_pool.run("batch", compute_ubcf_many, req.userIds, req.top_n, req.k)
+    return {"results": {
+        uid: [{"title": t, "score": float(s)} for t, s in recs] for uid, recs in results.items()
+    }}
+
+@app.post("/ibcf/batch")
+async def ibcf_batch(req: BatchRequest):
+    snap = movies_store.snapshot()
+    user_ratings = {uid: ratings_store.user_title_ratings(uid, snap.movies_map) for uid in req.userIds}
+    results = await compute_pool.run("batch", compute_ibcf_many, user_ratings, req.top_n, req.k)
+    return {"results": {
+        uid: [{"title": t, "score": float(s)} for t, s in recs] for uid, recs in results.items()
+    }}
+
+@app.post("/hybrid/batch")
+async def hybrid_batch(req: HybridBatchRequest):
+    snap = movies_store.snapshot()
+
+    # favoris fournis dans le payload, sinon lus dans la collection favorites
+    favorites = dict(req.favorites)
+    missing = [uid for uid in req.userIds if uid not in favorites]
+    if missing:
+        favorites.update(await load_favorite_titles(missing, snap))
+
+    user_ratings = {uid: ratings_store.user_title_ratings(uid, snap.movies_map) for uid in req.userIds}
+    results = await compute_pool.run("batch", compute_hybrid_many, req.userIds, req.top_n, req.k, favorites, user_ratings)
+    return {"results": results}
@@ -1,9 +1,59 @@
-import re, ast, pandas as pd
-import spacy
-from sklearn.feature_extraction.text import TfidfVectorizer
+import os, re, ast, hashlib, json, sqlite3, threading, time, pandas as pd
+import numpy as np
+from collections import Counter, OrderedDict
 
-# Charger le modèle français de spaCy
-nlp = spacy.load("fr_core_news_sm")
+from corpus_idf import CorpusIdf, tokenize
+
+# Modèle français de spaCy, chargé au premier usage (get_nlp) : un worker qui
+# ne nettoie jamais de description ne paie ni l'import ni le chargement
+SPACY_MODEL = os.getenv("SPACY_MODEL", "fr_core_news_sm")
+# Composants inutiles pour la lemmatisation (analyse syntaxique, entités nommées) :
+# restent tokenizer, tok2vec, morphologizer, attribute_ruler, lemmatizer
+UNUSED_PIPES = ["parser", "senter", "ner"]
+_nlp = None
+_nlp_lock = threading.Lock()
+nlp_load_seconds = None
+
+def get_nlp():
+    """
+    Modèle spaCy partagé, chargé une seule fois sans les composants de UNUSED_PIPES.
+    """
+    global _nlp, nlp_load_seconds
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                start = time.perf_counter()
+                import spacy
+                nlp = spacy.load(SPACY_MODEL, exclude=UNUSED_PIPES)
+                nlp_load_seconds = time.perf_counter() - start
+                print(f"✅ Modèle spaCy {SPACY_MODEL} chargé en {nlp_load_seconds:.2f}s ({', '.join(nlp.pipe_names)})")
+                _nlp = nlp
+    return _nlp
+
+def warm_up_nlp():
+    """
+    Charge le modèle et traite une phrase, pour ne pas faire attendre la première requête.
+    """
+    get_nlp()("Un film de démonstration pour initialiser le modèle.")
+
+# Table d'IDF du catalogue (build_corpus_idf.py), relue quand le fichier change
+CORPUS_IDF_PATH = os.getenv("CORPUS_IDF_PATH", os.path.join(os.path.dirname(__file__), "corpus_idf.json"))
+_corpus_idf = None
+_corpus_idf_mtime = None
+
+def get_corpus_idf():
+    """
+    Table d'IDF du catalogue, chargée une fois par version du fichier ; None si absente.
+    """
+    global _corpus_idf, _corpus_idf_mtime
+    try:
+        mtime = os.stat(CORPUS_IDF_PATH).st_mtime_ns
+    except OSError:
+        return None
+    if mtime != _corpus_idf_mtime:
+        _corpus_idf = CorpusIdf.load(CORPUS_IDF_PATH)
+        _corpus_idf_mtime = mtime
+    return _corpus_idf
 
 # --- Helpers ---------------------------------------------------------------
 
@@ -71,11 +121,12 @@ def parse_actors(actors_str):
 def normalize_actors(actors_str):
     return " ".join(parse_actors(actors_str))
 
-def preprocess_description(desc):
+def clean_description_text(desc):
     desc = str(desc).lower()
     desc = re.sub(r"[^a-zàâäéèêëîïôöùûüç\s-]", " ", desc)
-    desc = re.sub(r"\s+", " ", desc).strip()
-    doc = nlp(desc)
+    return re.sub(r"\s+", " ", desc).strip()
+
+def lemmas_from_doc(doc):
     tokens = []
     for tok in doc:
         if tok.is_stop or len(tok.lemma_) < 3:
@@ -83,62 +134,207 @@ def preprocess_description(desc):
         tokens.append(tok.lemma_)
     return " ".join(tokens)
 
+def preprocess_description(desc):
+    return lemmas_from_doc(get_nlp()(clean_description_text(desc)))
+
+def top_tfidf_tokens(pre_desc, tfidf_top_k=15, corpus_idf=None):
+    """
+    Tokens de plus fort TF-IDF du document, avec l'IDF du catalogue
+    (corpus_idf, par défaut la table de CORPUS_IDF_PATH). Sans table, l'IDF
+    d'un document seul est constant : le classement est celui des fréquences,
+    à égalité l'ordre alphabétique (comme un TfidfVectorizer ajusté sur ce
+    seul document).
+    """
+    if corpus_idf is None:
+        corpus_idf = get_corpus_idf()
+    if corpus_idf is not None:
+        return corpus_idf.top_tokens(pre_desc, tfidf_top_k)
+    counts = Counter(tokenize(pre_desc))
+    ranked = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+    return [w for w, _ in ranked[:tfidf_top_k]]
+
+# Combinaisons de genres : (genre, genre, token ajouté), dans l'ordre de sortie
+GENRE_COMBINATIONS = [
+    ("drama", "romance", "dramaromance"),
+    ("comedy", "romance", "comedyromance"),
+    ("action", "scifi", "actionscifi"),
+    ("animation", "comedy", "animationcomedy"),
+    ("action", "comedy", "actioncomedy"),
+    ("thriller", "horror", "thrillerhorror"),
+    ("crime", "thriller", "crimethriller"),
+    ("fantasy", "adventure", "fantasyadventure"),
+    ("war", "drama", "wardrama"),
+    ("western", "crime", "westerncrime"),
+    ("mystery", "thriller", "mysterythriller"),
+    ("action", "adventure", "actionadventure"),
+    ("comedy", "drama", "comedydrama"),
+    ("scifi", "thriller", "scifithriller"),
+    ("fantasy", "romance", "fantasyromance"),
+]
+
 def add_special_combinations(genres_list):
-    combos = []
     gset = set(genres_list)
+    return " ".join(combo for a, b, combo in GENRE_COMBINATIONS if a in gset and b in gset)
+
+# --- Helpers en colonnes (traitement en masse) -------------------------------
+# Mêmes sorties, octet pour octet, que les helpers par ligne ci-dessus, mais sur
+# des pandas.Series entières : opérations .str vectorisées, calculées une seule
+# fois par valeur distincte (les CSV répètent chaque film sur chaque note).
+
+# Liste Python de chaînes sans échappement : le format des colonnes actors des CSV
+_ACTOR_ITEM = r"""(?:'[^'\\\n\r\x00]*'|"[^"\\\n\r\x00]*")"""
+_ACTOR_LIST = re.compile(rf"\[\s*(?:{_ACTOR_ITEM}\s*(?:,\s*{_ACTOR_ITEM}\s*)*,?\s*)?\]")
+_ACTOR_ITEM_GROUPS = re.compile(r"""'([^']*)'|"([^"]*)\"""")
+
+def _on_unique(values, fn):
+    """
+    fn (Series -> valeurs) appliquée une fois par valeur distincte de values,
+    puis redistribuée sur toutes les lignes. Les listes sont comparées comme
+    des tuples ; les valeurs manquantes sont passées telles quelles.
+    """
+    values = pd.Series(values)
+    raw = values.to_numpy(dtype=object)
+    if values.dtype == object:
+        raw = np.array([tuple(v) if isinstance(v, list) else v for v in raw] + [None], dtype=object)[:-1]
+    codes, uniques = pd.factorize(raw)
+    out = np.empty(len(values), dtype=object)
+    known = codes >= 0
+    if known.any():
+        out[known] = np.asarray(fn(pd.Series(uniques, dtype=object)), dtype=object)[codes[known]]
+    if not known.all():
+        out[~known] = np.asarray(fn(values[~known].reset_index(drop=True)), dtype=object)
+    return pd.Series(out, index=values.index, dtype=object)
+
+def _join_rows(rows, items, n, sep):
+    """
+    " ".join par ligne d'éléments triés par ligne (rows croissant) ; "" pour les lignes sans élément.
+    """
+    out = np.full(n, "", dtype=object)
+    if len(rows):
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        joined = np.add.reduceat(np.asarray([sep + x for x in items], dtype=object), starts)
+        out[rows[starts]] = [x[len(sep):] for x in joined]
+    return out
+
+def _clean_years(years):
+    out = pd.Series("", index=years.index, dtype=object)
+    present = years.notna()
+    y = years[present].map(str).str.strip()
+
+    # "2016" / "2016.0" -> int(float(y)) : en chaînes tant que le float est exact
+    digits = y.str.fullmatch(r"\d+(\.0+)?").astype(bool)
+    exact = digits & y.str.fullmatch(r"[0-9]{1,15}(\.0+)?").astype(bool)
+    y[exact] = y[exact].str.replace(r"\.0+$", "", regex=True).str.lstrip("0").replace("", "0")
+    other = digits & ~exact
+    y[other] = y[other].map(lambda v: str(int(float(v))))
+
+    found = y.str.extract(r"\b((?:19|20)\d{2})\b", expand=False)
+    out[present] = found.fillna(y)
+    return out
+
+def clean_year_series(years):
+    return _on_unique(years, _clean_years)
+
+def _normalize_genre_tokens(tokens):
+    return (
+        tokens.map(str)
+        .str.lower().str.strip()
+        .str.replace(r"[^a-z\s-]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True).str.strip()
+        .str.replace("sci fi", "scifi", regex=False)
+        .str.replace("science fiction", "scifi", regex=False)
+        .str.replace("romantic comedy", "romcom", regex=False)
+        .str.replace("-", "", regex=False)
+    )
+
+def _normalize_genres(genres, sep):
+    n = len(genres)
+    lists = genres.map(
+        lambda g: g.split(sep) if isinstance(g, str) else (g if isinstance(g, (list, tuple)) else [])
+    )
+    # peu de genres distincts : chaque token n'est normalisé qu'une fois
+    tokens = _on_unique(lists.explode().dropna(), _normalize_genre_tokens)
+    frame = pd.DataFrame({"row": tokens.index.to_numpy(), "genre": tokens.to_numpy(dtype=object)})
+    frame = frame[frame["genre"] != ""].drop_duplicates().sort_values(["row", "genre"], kind="stable")
+    rows, values = frame["row"].to_numpy(), frame["genre"].to_numpy(dtype=object)
+
+    # table des combinaisons : un masque par genre, puis un par règle
+    has = {}
+    for g in {g for a, b, _ in GENRE_COMBINATIONS for g in (a, b)}:
+        has[g] = np.zeros(n, dtype=bool)
+        has[g][rows[values == g]] = True
+    combos = np.full(n, "", dtype=object)
+    for a, b, combo in GENRE_COMBINATIONS:
+        mask = has[a] & has[b]
+        combos[mask] = combos[mask] + (" " + combo)
+
+    triples = zip(_join_rows(rows, values, n, " "), _join_rows(rows, values, n, ""), (c[1:] for c in combos))
+    return np.fromiter(triples, dtype=object, count=n)
+
+def normalize_genres_series(genres, sep="|"):
+    """
+    Genres de chaque ligne (liste, ou chaîne séparée par sep comme dans les CSV) :
+    DataFrame genres_sorted / genres_combined / special_combos.
+    """
+    result = _on_unique(genres, lambda u: _normalize_genres(u, sep))
+    return pd.DataFrame(
+        result.tolist() or None,
+        index=result.index,
+        columns=["genres_sorted", "genres_combined", "special_combos"],
+    )
+
+def _fast_actor_names(value):
+    """
+    Noms bruts d'une liste d'acteurs sans passer par ast.literal_eval ;
+    None si la valeur n'a pas la forme simple attendue (repli sur parse_actors).
+    """
+    if isinstance(value, str):
+        s = value.strip()
+        if _ACTOR_LIST.fullmatch(s):
+            return [a if a is not None else b for a, b in (m.groups() for m in _ACTOR_ITEM_GROUPS.finditer(s))]
+        return None
+    if isinstance(value, (list, tuple)) and all(isinstance(a, str) for a in value):
+        return list(value)
+    return None
+
+def _normalize_actors(actors):
+    names = actors.map(_fast_actor_names)
+    slow = names.isna().to_numpy()
+    out = np.full(len(actors), "", dtype=object)
+
+    norm = _on_unique(
+        names[~slow].explode().dropna(),
+        lambda u: u.map(str).str.strip().str.lower().str.replace(r"[^a-z0-9]", "", regex=True),
+    )
+    frame = pd.DataFrame({"row": norm.index.to_numpy(), "actor": norm.to_numpy(dtype=object)})
+    frame = frame[frame["actor"] != ""].drop_duplicates()  # garde la première occurrence, dans l'ordre
+    joined = _join_rows(frame["row"].to_numpy(), frame["actor"].to_numpy(dtype=object), len(actors), " ")
+    out[~slow] = joined[~slow]
+
+    out[slow] = [normalize_actors(v) for v in actors[slow]]
+    return out
 
-    if "drama" in gset and "romance" in gset:
-        combos.append("dramaromance")
-    if "comedy" in gset and "romance" in gset:
-        combos.append("comedyromance")
-    if "action" in gset and "scifi" in gset:
-        combos.append("actionscifi")
-    if "animation" in gset and "comedy" in gset:
-        combos.append("animationcomedy")
-    if "action" in gset and "comedy" in gset:
-        combos.append("actioncomedy")
-    if "thriller" in gset and "horror" in gset:
-        combos.append("thrillerhorror")
-    if "crime" in gset and "thriller" in gset:
-        combos.append("crimethriller")
-    if "fantasy" in gset and "adventure" in gset:
-        combos.append("fantasyadventure")
-    if "war" in gset and "drama" in gset:
-        combos.append("wardrama")
-    if "western" in gset and "crime" in gset:
-        combos.append("westerncrime")
-    if "mystery" in gset and "thriller" in gset:
-        combos.append("mysterythriller")
-    if "action" in gset and "adventure" in gset:
-        combos.append("actionadventure")
-    if "comedy" in gset and "drama" in gset:
-        combos.append("comedydrama")
-    if "scifi" in gset and "thriller" in gset:
-        combos.append("scifithriller")
-    if "fantasy" in gset and "romance" in gset:
-        combos.append("fantasyromance")
-
-    return " ".join(combos)
+def normalize_actors_series(actors):
+    return _on_unique(actors, _normalize_actors)
+
+def _clean_descriptions(descriptions):
+    return (
+        descriptions.map(str).str.lower()
+        .str.replace(r"[^a-zàâäéèêëîïôöùûüç\s-]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True).str.strip()
+    )
+
+def clean_description_series(descriptions):
+    return _on_unique(descriptions, _clean_descriptions)
 
 # --- Build description_clean pour un seul film -----------------------------
 
-def build_description_clean_one(title, genres, year, actors, description, tfidf_top_k=15):
+def assemble_description_clean(genres, year, actors, top_tokens):
     year_clean = clean_year(year)
     genres_sorted, genres_combined, genres_list = normalize_genres_sorted(genres)
     special_combos = add_special_combinations(genres_list)
     actors_clean = normalize_actors(actors)
 
-    pre_desc = preprocess_description(description)
-
-    # TF-IDF sur la description du film
-    vect = TfidfVectorizer(max_features=8000)
-    tfidf_matrix = vect.fit_transform([pre_desc])
-    feature_names = vect.get_feature_names_out()
-    row = tfidf_matrix[0].toarray().flatten()
-    nonzero = [(feature_names[idx], row[idx]) for idx in row.nonzero()[0]]
-    nonzero.sort(key=lambda x: x[1], reverse=True)
-    top_tokens = [w for w, _ in nonzero[:tfidf_top_k]]
-
     description_clean = (
         year_clean + " " +
         genres_sorted + " " +
@@ -149,3 +345,209 @@ def build_description_clean_one(title, genres, year, actors, description, tfidf_
     ).strip()
 
     return description_clean
+
+def build_description_clean_one(title, genres, year, actors, description, tfidf_top_k=15):
+    pre_desc = preprocess_description(description)
+    top_tokens = top_tfidf_tokens(pre_desc, tfidf_top_k)
+    return assemble_description_clean(genres, year, actors, top_tokens)
+
+# --- Build description_clean pour tout un catalogue -------------------------
+
+def build_description_clean_many(movies, tfidf_top_k=15, batch_size=256, n_process=1, corpus_idf=None):
+    """
+    Version en flux de build_description_clean_one : movies est un itérable de
+    dicts (title, genres, year, actors, description), consommé au fil de l'eau.
+    Les descriptions passent par nlp.pipe par lots de batch_size, sur n_process
+    processus. Produit (film, description_clean) dans
+    l'ordre d'entrée ; la mémoire reste bornée à quelques lots.
+    """
+    if corpus_idf is None:
+        corpus_idf = get_corpus_idf()
+    texts = ((clean_description_text(m.get("description") or ""), m) for m in movies)
+    docs = get_nlp().pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process)
+    for doc, movie in docs:
+        top_tokens = top_tfidf_tokens(lemmas_from_doc(doc), tfidf_top_k, corpus_idf)
+        yield movie, assemble_description_clean(
+            movie.get("genres") or [], movie.get("year"), movie.get("actors") or [], top_tokens
+        )
+
+# --- Table d'IDF du catalogue ------------------------------------------------
+
+def build_corpus_idf(movies, corpus_idf=None, batch_size=256, n_process=1):
+    """
+    Compte dans corpus_idf (nouvelle table si None) les descriptions
+    prétraitées des films, en flux par nlp.pipe. Les films dont le movieId
+    est déjà dans la table sont ignorés : une table existante se met à jour
+    avec les seuls nouveaux films.
+    """
+    if corpus_idf is None:
+        corpus_idf = CorpusIdf()
+    new_movies = (m for m in movies if m.get("movieId") not in corpus_idf)
+    texts = ((clean_description_text(m.get("description") or ""), m) for m in new_movies)
+    for doc, movie in get_nlp().pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process):
+        corpus_idf.add_document(lemmas_from_doc(doc), movie.get("movieId"))
+    return corpus_idf
+
+# --- Cache des description_clean -------------------------------------------------
+
+# À incrémenter quand les règles de nettoyage changent : les entrées du cache
+# disque calculées avec les anciennes règles ne sont plus jamais relues
+PREPROCESS_VERSION = 1
+
+def preprocess_version():
+    """
+    Version du prétraitement : règles, modèle spaCy et table d'IDF en vigueur.
+    """
+    get_corpus_idf()
+    return f"{PREPROCESS_VERSION}:{SPACY_MODEL}:{_corpus_idf_mtime or 0}"
+
+class DescriptionCleanCache:
+    """
+    Cache adressé par contenu des description_clean.
+
+    La clé est le hash des champs tels que le nettoyage les voit (description
+    en minuscules sans ponctuation, genres triés, année et acteurs normalisés)
+    et de la version du prétraitement : deux saisies qui ne diffèrent que par
+    la casse, la ponctuation ou l'ordre des genres partagent leur entrée.
+    LRU en mémoire (maxsize), plus une table SQLite optionnelle (path) qui
+    survit aux redémarrages et se partage entre workers.
+    """
+
+    def __init__(self, maxsize: int = 1024, path: str = None):
+        self.maxsize = maxsize
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+        # compteurs pour le monitoring
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(title, genres, year, actors, description, tfidf_top_k=15):
+        _, _, genres_list = normalize_genres_sorted(genres)
+        payload = json.dumps([
+            preprocess_version(),
+            str(title or "").strip(),
+            genres_list,
+            clean_year(year),
+            parse_actors(actors),
+            clean_description_text(description),
+            tfidf_top_k,
+        ], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _db(self):
+        # une connexion par processus (les workers forkés n'héritent pas de celle du parent)
+        if self.path and self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS description_clean (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._conn.commit()
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            db = self._db()
+            if db is not None:
+                row = db.execute("SELECT value FROM description_clean WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def lookup(self, title, genres, year, actors, description, tfidf_top_k=15):
+        """
+        key() puis get() : renvoie (clé, description_clean ou None). Bloquant
+        (stat et lecture de la table d'IDF, lecture SQLite) : l'API l'appelle
+        hors de la boucle asyncio, comme put().
+        """
+        key = self.key(title, genres, year, actors, description, tfidf_top_k)
+        return key, self.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            db = self._db()
+            if db is not None:
+                with db:
+                    db.execute("INSERT OR REPLACE INTO description_clean (key, value) VALUES (?, ?)", (key, value))
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "disk": self.path,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+description_cache = DescriptionCleanCache(
+    maxsize=int(os.getenv("DESCRIPTION_CACHE_SIZE", "1024")),
+    path=os.getenv("DESCRIPTION_CACHE_DB") or None,
+)
+
+def build_description_clean_cached(title, genres, year, actors, description, tfidf_top_k=15):
+    """
+    build_description_clean_one mémoïsé par description_cache.
+    """
+    key = description_cache.key(title, genres, year, actors, description, tfidf_top_k)
+    value = description_cache.get(key)
+    if value is None:
+        value = build_description_clean_one(title, genres, year, actors, description, tfidf_top_k)
+        description_cache.put(key, value)
+    return value
+
+def build_description_clean_frame(df, tfidf_top_k=15, batch_size=256, n_process=1, genres_sep="|", corpus_idf=None):
+    """
+    description_clean de chaque ligne d'un DataFrame au format des CSV enrichis
+    (genres, year, actors, description) : identique ligne à ligne à
+    build_description_clean_one, avec les helpers en colonnes. Chaque
+    description distincte ne passe qu'une fois par spaCy (les CSV répètent
+    le film sur chaque note).
+    """
+    if corpus_idf is None:
+        corpus_idf = get_corpus_idf()
+    texts = clean_description_series(df["description"])
+    unique_texts = pd.unique(texts.values)
+    docs = get_nlp().pipe(unique_texts, batch_size=batch_size, n_process=n_process)
+    keywords = {
+        text: " ".join(top_tfidf_tokens(lemmas_from_doc(doc), tfidf_top_k, corpus_idf))
+        for text, doc in zip(unique_texts, docs)
+    }
+
+    genres = normalize_genres_series(df["genres"], sep=genres_sep)
+    parts = [
+        clean_year_series(df["year"]).to_numpy(dtype=object),
+        genres["genres_sorted"].to_numpy(dtype=object),
+        genres["genres_combined"].to_numpy(dtype=object),
+        genres["special_combos"].to_numpy(dtype=object),
+        normalize_actors_series(df["actors"]).to_numpy(dtype=object),
+        texts.map(keywords).to_numpy(dtype=object),
+    ]
+    out = parts[0]
+    for part in parts[1:]:
+        out = out + " " + part
+    return pd.Series(out, index=df.index, dtype=object).str.strip()
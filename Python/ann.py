@@ -0,0 +1,78 @@
+from typing import Optional
+import numpy as np
+
+
+class RandomProjectionLSH:
+    """
+    Index approché (LSH par projections aléatoires) pour la similarité cosinus
+    sur des vecteurs L2-normalisés (TF-IDF CSR ou embeddings denses).
+
+    Chaque table hache un vecteur sur n_bits signes de projections gaussiennes :
+    deux vecteurs proches en angle tombent avec une forte probabilité dans le
+    même seau. Les codes de chaque table sont triés, une requête est donc un
+    searchsorted par seau sondé (seau exact + voisins à 1 bit si multi-probe)
+    au lieu d'un parcours de tout le catalogue. Les candidats sont ensuite
+    re-classés exactement par le recommender.
+    """
+
+    def __init__(self, vectors, n_tables: int = 16, n_bits: Optional[int] = None,
+                 bucket_size: int = 128, multi_probe: bool = True, seed: int = 0):
+        n, dim = vectors.shape
+        # assez de bits pour ~bucket_size lignes par seau
+        if n_bits is None:
+            n_bits = int(np.clip(np.round(np.log2(max(n, 1) / bucket_size)), 1, 62))
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.multi_probe = multi_probe
+
+        rng = np.random.default_rng(seed)
+        # toutes les tables en une seule matrice : un seul produit par hachage
+        self.planes = rng.standard_normal((dim, n_tables * n_bits)).astype(np.float32)
+        self._weights = (1 << np.arange(n_bits, dtype=np.int64))
+
+        codes = self._hash(vectors)  # n_tables × n
+        self.order = np.argsort(codes, axis=1, kind="stable").astype(np.int64)
+        self.sorted_codes = np.take_along_axis(codes, self.order, axis=1)
+
+    def _hash(self, vectors) -> np.ndarray:
+        bits = np.asarray(vectors @ self.planes) > 0
+        bits = bits.reshape(vectors.shape[0], self.n_tables, self.n_bits).astype(np.int64)
+        return (bits @ self._weights).T
+
+    def __len__(self):
+        return self.order.shape[1]
+
+    def add(self, vectors):
+        """
+        Ajoute des lignes (indices len(self), len(self)+1, ...) en gardant les codes triés.
+        """
+        start = len(self)
+        codes = self._hash(vectors)
+        new_rows = np.arange(start, start + vectors.shape[0], dtype=np.int64)
+        orders, sorted_codes = [], []
+        for t in range(self.n_tables):
+            pos = np.searchsorted(self.sorted_codes[t], codes[t], side="right")
+            sorted_codes.append(np.insert(self.sorted_codes[t], pos, codes[t]))
+            orders.append(np.insert(self.order[t], pos, new_rows))
+        self.sorted_codes = np.vstack(sorted_codes)
+        self.order = np.vstack(orders)
+
+    def query(self, vector) -> np.ndarray:
+        """
+        Lignes candidates (triées, sans doublon) partageant un seau avec le vecteur.
+        """
+        codes = self._hash(vector)[:, 0]
+        found = []
+        for t in range(self.n_tables):
+            probes = [codes[t]]
+            if self.multi_probe:
+                probes.extend((codes[t] ^ self._weights).tolist())
+            probes = np.asarray(probes, dtype=np.int64)
+            lo = np.searchsorted(self.sorted_codes[t], probes, side="left")
+            hi = np.searchsorted(self.sorted_codes[t], probes, side="right")
+            for a, b in zip(lo.tolist(), hi.tolist()):
+                if b > a:
+                    found.append(self.order[t, a:b])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
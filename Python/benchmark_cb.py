@@ -0,0 +1,92 @@
+"""
+Benchmark des options approchées du Content-Based (index LSH, réduction SVD) :
+rappel et latence de recommend_from_titles par rapport au calcul exact sur
+le TF-IDF complet.
+
+Usage : python benchmark_cb.py [csv_films] [nombre_essais]
+Le CSV doit contenir movieId, title et description_clean (ou description).
+
+L'index LSH est forcé (ann_min_rows=0) : en service, il n'est construit qu'à
+partir de cb.ANN_MIN_ROWS films, seuil sous lequel ce benchmark le mesure
+plus lent que le calcul exact.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from cb import ANN_MIN_ROWS, ContentBasedRecommender
+
+DEFAULT_CSV = os.path.join(os.path.dirname(__file__), "..", "backend", "movies_enriched2.csv")
+# paramètres passés à ContentBasedRecommender, comparés au TF-IDF exact
+CONFIGS = [
+    {"ann": "lsh", "ann_min_rows": 0},
+    {"ann": "lsh", "ann_min_rows": 0, "ann_params": {"n_tables": 8}},
+    {"ann": "lsh", "ann_min_rows": 0, "ann_params": {"n_tables": 32, "bucket_size": 256}},
+    {"ann": "lsh", "ann_min_rows": 0, "ann_params": {"multi_probe": False}},
+    {"svd_components": 128},
+    {"svd_components": 256},
+    {"svd_components": 256, "ann": "lsh", "ann_min_rows": 0},
+]
+
+
+def load_catalogue(csv_path: str) -> pd.DataFrame:
+    df = pd.read_csv(csv_path)
+    if "description_clean" not in df.columns:
+        text = df.get("description", pd.Series("", index=df.index)).fillna("").astype(str)
+        if "genres" in df.columns:
+            text = text + " " + df["genres"].fillna("").astype(str).str.replace("|", " ", regex=False)
+        df["description_clean"] = text
+    return df[["movieId", "title", "description_clean"]].drop_duplicates(subset="title")
+
+
+def run(reco: ContentBasedRecommender, queries, top_n: int):
+    results, start = [], time.perf_counter()
+    for favorites in queries:
+        results.append(reco.recommend_from_titles(favorites, top_n=top_n))
+    return results, (time.perf_counter() - start) / max(len(queries), 1)
+
+
+def main(csv_path: str = DEFAULT_CSV, n_queries: int = 200, top_n: int = 20):
+    df = load_catalogue(csv_path)
+    print(f"📊 Catalogue: {len(df)} films (index LSH en service à partir de {ANN_MIN_ROWS})")
+
+    start = time.perf_counter()
+    exact = ContentBasedRecommender(df)
+    print(f"⏱️ Construction exacte: {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(0)
+    titles = list(exact.title_to_index)
+    queries = [
+        list(rng.choice(titles, size=int(rng.integers(1, 10)), replace=False))
+        for _ in range(n_queries)
+    ]
+    reference, exact_latency = run(exact, queries, top_n)
+    print(f"⏱️ Exact: {exact_latency * 1000:.2f} ms / requête")
+
+    for params in CONFIGS:
+        start = time.perf_counter()
+        reco = ContentBasedRecommender(df, **params)
+        build = time.perf_counter() - start
+        approx, latency = run(reco, queries, top_n)
+        recall = np.mean([
+            len(set(a) & set(e)) / len(e) for a, e in zip(approx, reference) if e
+        ])
+        details = []
+        if reco.ann_index is not None:
+            fallback = reco.ann_fallbacks / max(reco.ann_queries, 1)
+            details.append(f"bits={reco.ann_index.n_bits}, repli {fallback:.1%}")
+        if reco.embeddings is not None:
+            details.append(f"embeddings {reco.embeddings.nbytes / 2**20:.1f} Mo")
+        print(
+            f"🔎 {params}: rappel@{top_n}={recall:.3f}, {latency * 1000:.2f} ms / requête, "
+            f"construction {build:.2f}s" + "".join(f", {d}" for d in details)
+        )
+
+
+if __name__ == "__main__":
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    main(csv_path, n_queries)
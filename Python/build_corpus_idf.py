@@ -0,0 +1,53 @@
+"""
+Job hors ligne : construit ou met à jour la table d'IDF du catalogue
+(descriptions prétraitées de la collection movies) lue par algo1.
+
+Usage : python build_corpus_idf.py [chemin_table] [taille_lot] [n_process] [full]
+Par défaut seuls les films absents de la table existante sont ajoutés ;
+"full" reconstruit la table depuis zéro.
+"""
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from algo1 import CORPUS_IDF_PATH, build_corpus_idf
+from corpus_idf import CorpusIdf
+
+
+def main(path: str = CORPUS_IDF_PATH, batch_size: int = 256, n_process: int = 1, full: bool = False):
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URI"))
+    movies = client["RecommendIT"]["movies"]
+
+    corpus_idf = None
+    if not full and os.path.exists(path):
+        corpus_idf = CorpusIdf.load(path)
+        print(f"📚 Table existante: {corpus_idf.n_docs} films, {len(corpus_idf)} tokens")
+    before = corpus_idf.n_docs if corpus_idf is not None else 0
+
+    start = time.perf_counter()
+    cursor = movies.find({}, {"movieId": 1, "description": 1}, batch_size=batch_size)
+    try:
+        corpus_idf = build_corpus_idf(cursor, corpus_idf, batch_size=batch_size, n_process=n_process)
+    finally:
+        cursor.close()
+        client.close()
+    corpus_idf.save(path)
+
+    added = corpus_idf.n_docs - before
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ {added} films ajoutés en {elapsed:.1f}s ({added / max(elapsed, 1e-9):.0f} docs/s) : "
+        f"{corpus_idf.n_docs} films, {len(corpus_idf)} tokens -> {path}"
+    )
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else CORPUS_IDF_PATH
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    n_process = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    full = len(sys.argv) > 4 and sys.argv[4] == "full"
+    main(path, batch_size, n_process, full)
@@ -1,17 +1,61 @@
+import copy
 from typing import List, Dict, Any, Optional
+import numpy as np
 import pandas as pd
+from scipy.sparse import vstack
+from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 import nltk
 from nltk.corpus import stopwords
 
+from ann import RandomProjectionLSH
+from topk import top_k, top_k_rows
+
 # nltk.download("stopwords")  # à lancer une fois si nécessaire
 
+# Voisins retenus par favori (per_fav par défaut des recommandations)
+DEFAULT_PER_FAV = 50
+
+# Taille de catalogue sous laquelle ann est ignoré (calcul exact). Mesuré
+# avec benchmark_cb.py (16 tables, multi-probe) : l'index LSH reste plus lent
+# que la ligne exacte jusqu'à ~500 000 films (9 737 films : 16,7 ms contre
+# 2,6 ms ; 487 000 : 262 ms contre 92 ms), les seaux sondés couvrant une
+# grande part du catalogue.
+ANN_MIN_ROWS = 500_000
+
+
+def _to_int_safe(x):
+    try:
+        return int(x)
+    except Exception:
+        return x
+
 
 class ContentBasedRecommender:
-    def __init__(self, df, text_col="description_clean", title_col="title", movieid_col="movieId", max_features=5000):
+    def __init__(self, df, text_col="description_clean", title_col="title", movieid_col="movieId", max_features=5000,
+                 neighbors_k: Optional[int] = None, block_size: int = 256,
+                 ann: Optional[str] = None, ann_params: Optional[Dict[str, Any]] = None,
+                 svd_components: Optional[int] = None, ann_min_rows: int = ANN_MIN_ROWS):
         """
         Initialise le recommender avec un DataFrame (déjà chargé depuis MongoDB).
+
+        neighbors_k : si fourni, précalcule les neighbors_k plus proches voisins de
+        chaque film (int32 / float32) au lieu de recalculer une ligne de similarité
+        complète par favori. Le calcul se fait par blocs de block_size lignes.
+        Porté au moins à DEFAULT_PER_FAV : avec moins de voisins que per_fav,
+        chaque favori retomberait sur la ligne complète.
+
+        ann : "lsh" pour un index approché (RandomProjectionLSH, paramètres dans
+        ann_params) : seuls les candidats de l'index sont comparés au favori,
+        au lieu du catalogue entier. Ignoré si neighbors_k est fourni, ou si
+        le catalogue a moins de ann_min_rows films (le calcul exact y est plus
+        rapide, voir ANN_MIN_ROWS).
+
+        svd_components : si fourni, projette le TF-IDF sur svd_components axes
+        (TruncatedSVD / LSA) : les similarités se calculent alors sur des
+        embeddings denses float32 L2-normalisés (un produit matriciel dense au
+        lieu d'un produit creux), voisins top-K et index ANN compris.
         """
         self.text_col = text_col
         self.title_col = title_col
@@ -32,27 +76,81 @@ class ContentBasedRecommender:
         custom_stopwords = {"film", "cinema", "histoire", "faire"}
         french_stopwords = list(nltk_stopwords.union(custom_stopwords))
 
-        # TF-IDF
+        # TF-IDF, lignes renormalisées comme dans cosine_similarity :
+        # le produit scalaire de deux lignes donne exactement la similarité cosinus
         self.tfidf_vect = TfidfVectorizer(stop_words=french_stopwords, max_features=max_features)
         texts = self.movies_df[self.text_col].fillna("").astype(str).values
-        self.tfidf_matrix = self.tfidf_vect.fit_transform(texts)
+        self.tfidf_matrix = normalize(self.tfidf_vect.fit_transform(texts)).tocsr()
+        self.svd: Optional[TruncatedSVD] = None
+        self.embeddings: Optional[np.ndarray] = None
+        if svd_components:
+            # au plus n_features - 1 axes (contrainte de TruncatedSVD)
+            n_components = max(1, min(svd_components, self.tfidf_matrix.shape[1] - 1))
+            self.svd = TruncatedSVD(n_components=n_components, random_state=0)
+            self.embeddings = self._embed(self.svd.fit_transform(self.tfidf_matrix))
+        self._init_state(np.ones(len(self.movies_df), dtype=bool))
 
-        # Matrice de similarité cosinus
-        self.cosine_sim = cosine_similarity(self.tfidf_matrix, self.tfidf_matrix)
+        if neighbors_k:
+            if neighbors_k < DEFAULT_PER_FAV:
+                print(f"⚠️ neighbors_k={neighbors_k} < per_fav={DEFAULT_PER_FAV} : porté à {DEFAULT_PER_FAV}")
+                neighbors_k = DEFAULT_PER_FAV
+            self.neighbor_idx, self.neighbor_sim = self._build_neighbors(neighbors_k, block_size)
+        self._build_ann(ann, ann_params, ann_min_rows)
 
-        # Index maps
-        self.title_to_index = {t: i for i, t in enumerate(self.movies_df[self.title_col].values)}
+    def _init_state(self, active: np.ndarray):
+        """
+        État dérivé de movies_df / tfidf_matrix : lignes actives, index
+        titre et movieId, compteurs de dérive.
+        """
+        self._analyzer = self.tfidf_vect.build_analyzer()
 
-        def _to_int_safe(x):
-            try:
-                return int(x)
-            except Exception:
-                return x
+        # Lignes actives (une ligne supprimée reste dans la matrice jusqu'au prochain refit)
+        self.active = active
+
+        # Suivi de la dérive depuis le fit : tokens hors vocabulaire et lignes modifiées
+        self.n_changes = 0
+        self._n_tokens = 0
+        self._n_oov_tokens = 0
+
+        # Index maps (lignes actives seulement)
+        rows = np.flatnonzero(active)
+        titles = self.movies_df[self.title_col].values
+        movie_ids = self.movies_df[self.movieid_col].values
+        self.title_to_index = {titles[i]: int(i) for i in rows}
+        self.movieid_to_index = {_to_int_safe(movie_ids[i]): int(i) for i in rows}
+
+        # (movieId par ligne, codes d'agrégation), calculés à la demande
+        self._id_cache: Optional[tuple] = None
+
+        # Index top-K (optionnel)
+        self.neighbor_idx: Optional[np.ndarray] = None
+        self.neighbor_sim: Optional[np.ndarray] = None
 
-        self.movieid_to_index = {
-            _to_int_safe(self.movies_df.iloc[i][self.movieid_col]): i
-            for i in range(len(self.movies_df))
-        }
+        # Index approché (optionnel) et compteurs : requêtes, repli sur la ligne complète
+        self.ann_index: Optional[RandomProjectionLSH] = None
+        self.ann_queries = 0
+        self.ann_fallbacks = 0
+
+    def _build_ann(self, ann: Optional[str], ann_params: Optional[Dict[str, Any]] = None,
+                   ann_min_rows: int = ANN_MIN_ROWS):
+        if not ann or self.neighbor_idx is not None:
+            return
+        if ann != "lsh":
+            raise ValueError(f"backend ANN inconnu: {ann}")
+        if len(self.movies_df) < ann_min_rows:
+            return
+        self.ann_index = RandomProjectionLSH(self._vectors, **(ann_params or {}))
+
+    @staticmethod
+    def _embed(reduced) -> np.ndarray:
+        return np.ascontiguousarray(normalize(reduced), dtype=np.float32)
+
+    @property
+    def _vectors(self):
+        """
+        Vecteurs servant aux similarités : embeddings SVD s'ils existent, sinon TF-IDF.
+        """
+        return self.embeddings if self.embeddings is not None else self.tfidf_matrix
 
     @classmethod
     async def create(cls, mongo_collection, **kwargs):
@@ -68,129 +166,447 @@ class ContentBasedRecommender:
         df = pd.DataFrame(docs)
         return cls(df, **kwargs)
 
-    def recommend_from_titles(
-        self,
-        favorites: List[str],
-        top_n: int = 20,
-        per_fav: int = 50,
-        exclude_seen: Optional[List[Any]] = None,
-        aggregate_by: str = "sum",
-    ) -> List[int]:
+    @classmethod
+    def from_movies_map(cls, movies_map: Dict[int, Dict[str, Any]], **kwargs):
         """
-        Prend une liste de titres favoris et renvoie une liste de movieId (top_n).
+        Construit le recommender depuis un cache de films {movieId: film} (sans MongoDB).
         """
-        exclude_seen_set = set()
-        if exclude_seen:
-            for x in exclude_seen:
-                try:
-                    exclude_seen_set.add(int(x))
-                except Exception:
-                    exclude_seen_set.add(x)
+        df = pd.DataFrame(
+            [
+                {"movieId": mid, "title": m.get("title"), "description_clean": m.get("description_clean")}
+                for mid, m in movies_map.items()
+            ],
+            columns=["movieId", "title", "description_clean"],
+        )
+        return cls(df, **kwargs)
 
-        candidates: Dict[Any, float] = {}
-        sources: Dict[Any, List[str]] = {}
+    @classmethod
+    def from_arrays(cls, movies_df: pd.DataFrame, tfidf_vect: TfidfVectorizer, tfidf_matrix,
+                    active: Optional[np.ndarray] = None, neighbor_idx: Optional[np.ndarray] = None,
+                    neighbor_sim: Optional[np.ndarray] = None,
+                    text_col="description_clean", title_col="title", movieid_col="movieId",
+                    ann: Optional[str] = None, ann_params: Optional[Dict[str, Any]] = None,
+                    svd: Optional[TruncatedSVD] = None, embeddings: Optional[np.ndarray] = None,
+                    ann_min_rows: int = ANN_MIN_ROWS):
+        """
+        Reconstruit un recommender déjà entraîné (snapshot partagé) sans refaire
+        le fit : tfidf_matrix, embeddings et voisins peuvent être des tableaux
+        memmap, ils ne sont copiés qu'à la première mise à jour en place.
+        """
+        reco = cls.__new__(cls)
+        reco.text_col = text_col
+        reco.title_col = title_col
+        reco.movieid_col = movieid_col
+        reco.movies_df = movies_df.reset_index(drop=True)
+        reco.tfidf_vect = tfidf_vect
+        reco.tfidf_matrix = tfidf_matrix
+        reco.svd = svd
+        reco.embeddings = embeddings if svd is not None else None
+        if active is None:
+            active = np.ones(len(reco.movies_df), dtype=bool)
+        reco._init_state(np.array(active, dtype=bool))
+        reco.neighbor_idx, reco.neighbor_sim = neighbor_idx, neighbor_sim
+        reco._build_ann(ann, ann_params, ann_min_rows)
+        return reco
 
-        for fav in favorites:
-            if fav not in self.title_to_index:
-                continue
-            idx = self.title_to_index[fav]
-            sim_scores = list(enumerate(self.cosine_sim[idx]))
-            sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
+    # --- Similarités ----------------------------------------------------------
 
-            count = 0
-            for i, score in sim_scores:
-                if i == idx:
-                    continue
-                movie_id_raw = self.movies_df.iloc[i][self.movieid_col]
-                try:
-                    movie_id = int(movie_id_raw)
-                except Exception:
-                    movie_id = movie_id_raw
-                if movie_id in exclude_seen_set:
+    def _similarity_row(self, idx: int) -> np.ndarray:
+        """
+        Similarité cosinus entre le film idx et tout le catalogue.
+        """
+        if self.embeddings is not None:
+            return (self.embeddings @ self.embeddings[idx]).astype(np.float64)
+        return (self.tfidf_matrix[idx] @ self.tfidf_matrix.T).toarray().ravel()
+
+    def _build_neighbors(self, k: int, block_size: int):
+        """
+        Top-K voisins de chaque film, calculés par blocs : la mémoire de travail
+        reste bornée à block_size × N au lieu de N × N.
+        """
+        vectors = self._vectors
+        n = vectors.shape[0]
+        k = min(k, n - 1)
+        neighbor_idx = np.empty((n, max(k, 0)), dtype=np.int32)
+        neighbor_sim = np.empty((n, max(k, 0)), dtype=np.float32)
+        if k <= 0:
+            return neighbor_idx, neighbor_sim
+
+        dense = self.embeddings is not None
+        matrix_t = vectors.T if dense else vectors.T.tocsc()
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            sims = vectors[start:stop] @ matrix_t
+            sims = sims.astype(np.float64) if dense else sims.toarray()
+            sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # pas soi-même
+            cols = top_k_rows(sims, k)
+            neighbor_idx[start:stop] = cols
+            neighbor_sim[start:stop] = np.take_along_axis(sims, cols, axis=1)
+        return neighbor_idx, neighbor_sim
+
+    def _add_to_neighbors(self, start: int, block_size: int = 256):
+        """
+        Ajoute les lignes start.. (nouveaux films) à l'index top-K, par blocs :
+        calcule leurs voisins et les insère dans les listes des anciens films
+        dont ils deviennent voisins. Les tableaux publiés ne sont pas modifiés.
+        """
+        k = self.neighbor_idx.shape[1]
+        vectors = self._vectors
+        n = vectors.shape[0]
+        old_idx = np.array(self.neighbor_idx[:start])
+        old_sim = np.array(self.neighbor_sim[:start])
+        new_idx = np.empty((n - start, k), dtype=np.int32)
+        new_sim = np.empty((n - start, k), dtype=np.float32)
+
+        if k:
+            dense = self.embeddings is not None
+            matrix_t = vectors.T if dense else vectors.T.tocsc()
+            for lo in range(start, n, block_size):
+                hi = min(lo + block_size, n)
+                sims = vectors[lo:hi] @ matrix_t
+                sims = sims.astype(np.float64) if dense else sims.toarray()
+                sims[:, ~self.active] = -np.inf
+                sims[np.arange(hi - lo), np.arange(lo, hi)] = -np.inf  # pas soi-même
+                cols = top_k_rows(sims, k)
+                new_idx[lo - start:hi - start] = cols
+                new_sim[lo - start:hi - start] = np.take_along_axis(sims, cols, axis=1)
+
+                # un nouveau film a un indice plus grand : il ne passe devant
+                # qu'à score strictement supérieur (listes existantes en tête)
+                cand = sims[:, :start].T.astype(np.float32)
+                rows = np.flatnonzero(cand.max(axis=1, initial=-np.inf) > old_sim[:, -1])
+                if len(rows):
+                    merged_sim = np.hstack([old_sim[rows], cand[rows]])
+                    merged_idx = np.hstack([
+                        old_idx[rows], np.broadcast_to(np.arange(lo, hi, dtype=np.int32), (len(rows), hi - lo))
+                    ])
+                    best = top_k_rows(merged_sim, k)
+                    old_idx[rows] = np.take_along_axis(merged_idx, best, axis=1)
+                    old_sim[rows] = np.take_along_axis(merged_sim, best, axis=1)
+        self.neighbor_idx = np.vstack([old_idx, new_idx])
+        self.neighbor_sim = np.vstack([old_sim, new_sim])
+
+    # --- Mises à jour incrémentales ------------------------------------------
+
+    def copy(self) -> "ContentBasedRecommender":
+        """
+        Copie à modifier pendant que l'original continue de servir : les matrices
+        (TF-IDF, embeddings, voisins) sont partagées, car les mises à jour les
+        remplacent au lieu de les modifier en place ; seul l'état modifié en
+        place (lignes actives, index titre / movieId, index ANN) est recopié.
+        """
+        reco = copy.copy(self)
+        reco.active = self.active.copy()
+        reco.title_to_index = dict(self.title_to_index)
+        reco.movieid_to_index = dict(self.movieid_to_index)
+        if self.ann_index is not None:
+            reco.ann_index = copy.copy(self.ann_index)
+        return reco
+
+    def add_movie(self, movie_id, title: str, description_clean: str) -> bool:
+        """
+        Ajoute un film en transformant sa description avec le vocabulaire déjà appris.
+        Renvoie False si le titre est déjà indexé pour un autre film
+        (même règle que drop_duplicates(subset=title) à la construction).
+        """
+        movie_id = _to_int_safe(movie_id)
+        if movie_id in self.movieid_to_index:
+            return self.update_movie(movie_id, title, description_clean)
+        if title in self.title_to_index:
+            return False
+
+        text = "" if description_clean is None else str(description_clean)
+        self._append_movies([(movie_id, title, text)])
+        return True
+
+    def _append_movies(self, movies: List[tuple]):
+        """
+        Ajoute des films (movieId, titre, texte) en fin de matrice, avec une
+        seule concaténation par structure : DataFrame, TF-IDF, embeddings,
+        voisins et index ANN.
+        """
+        if not movies:
+            return
+        vocab = self.tfidf_vect.vocabulary_
+        texts = [text for _, _, text in movies]
+        for text in texts:
+            tokens = self._analyzer(text)
+            self._n_tokens += len(tokens)
+            self._n_oov_tokens += sum(1 for t in tokens if t not in vocab)
+
+        start = len(self.movies_df)
+        rows = pd.DataFrame(
+            [{self.movieid_col: mid, self.title_col: title, self.text_col: text} for mid, title, text in movies]
+        )
+        self.movies_df = pd.concat([self.movies_df, rows], ignore_index=True)
+        new_rows = normalize(self.tfidf_vect.transform(texts))
+        self.tfidf_matrix = vstack([self.tfidf_matrix, new_rows], format="csr")
+        if self.embeddings is not None:
+            self.embeddings = np.vstack([self.embeddings, self._embed(self.svd.transform(new_rows))])
+        self.active = np.concatenate([self.active, np.ones(len(movies), dtype=bool)])
+        if self.neighbor_idx is not None:
+            self._add_to_neighbors(start)
+        if self.ann_index is not None:
+            self.ann_index.add(self._vectors[start:])
+        for idx, (mid, title, _) in enumerate(movies, start):
+            self.title_to_index[title] = idx
+            self.movieid_to_index[mid] = idx
+        self.n_changes += len(movies)
+
+    def remove_movie(self, movie_id) -> bool:
+        """
+        Retire un film des recommandations (la ligne est purgée au prochain refit).
+        """
+        movie_id = _to_int_safe(movie_id)
+        idx = self.movieid_to_index.pop(movie_id, None)
+        if idx is None:
+            return False
+        self.active[idx] = False
+        title = self.movies_df.iloc[idx][self.title_col]
+        if self.title_to_index.get(title) == idx:
+            del self.title_to_index[title]
+        self.n_changes += 1
+        return True
+
+    def update_movie(self, movie_id, title: str, description_clean: str) -> bool:
+        """
+        Met à jour un film (titre et/ou description_clean).
+        """
+        movie_id = _to_int_safe(movie_id)
+        idx = self.movieid_to_index.get(movie_id)
+        if idx is not None:
+            current = self.movies_df.iloc[idx]
+            if current[self.title_col] == title and current[self.text_col] == description_clean:
+                return False
+            self.remove_movie(movie_id)
+        return self.add_movie(movie_id, title, description_clean)
+
+    def apply_changes(self, changes: List[tuple]):
+        """
+        Applique dans l'ordre des changements ("upsert", movieId, titre,
+        description_clean) ou ("remove", movieId, None, None), avec le même
+        résultat que des appels successifs à update_movie / remove_movie, mais
+        les ajouts sont regroupés en fin de lot : une concaténation des matrices
+        pour tout le lot au lieu d'une par film.
+        """
+        pending: Dict[Any, tuple] = {}  # movieId -> (movieId, titre, texte), ordre d'arrivée
+        pending_titles = set()
+        for op, movie_id, title, description_clean in changes:
+            movie_id = _to_int_safe(movie_id)
+            queued = pending.get(movie_id)
+            text = "" if description_clean is None else str(description_clean)
+            if queued is not None:
+                if op != "remove" and queued[1] == title and queued[2] == text:
                     continue
+                # ajouté plus tôt dans le lot : retiré avant d'être écrit
+                del pending[movie_id]
+                pending_titles.discard(queued[1])
+            elif op == "remove":
+                self.remove_movie(movie_id)
+            else:
+                idx = self.movieid_to_index.get(movie_id)
+                if idx is not None:
+                    current = self.movies_df.iloc[idx]
+                    if current[self.title_col] == title and current[self.text_col] == description_clean:
+                        continue
+                    self.remove_movie(movie_id)
+            if op == "remove" or title in self.title_to_index or title in pending_titles:
+                continue
+            pending[movie_id] = (movie_id, title, text)
+            pending_titles.add(title)
+        self._append_movies(list(pending.values()))
 
-                if aggregate_by == "sum":
-                    candidates[movie_id] = candidates.get(movie_id, 0.0) + float(score)
-                else:
-                    candidates[movie_id] = max(candidates.get(movie_id, 0.0), float(score))
+    def vocabulary_drift(self) -> float:
+        """
+        Part des tokens hors vocabulaire dans les descriptions ajoutées depuis le fit.
+        """
+        return self._n_oov_tokens / self._n_tokens if self._n_tokens else 0.0
 
-                sources.setdefault(movie_id, []).append(fav)
+    def needs_refit(self, threshold: float = 0.2) -> bool:
+        """
+        Vrai si le vocabulaire a trop dérivé, ou si trop de lignes ont changé depuis le fit.
+        """
+        changed_ratio = self.n_changes / max(len(self.movies_df), 1)
+        return self.vocabulary_drift() > threshold or changed_ratio > threshold
 
-                count += 1
-                if count >= per_fav:
-                    break
+    # --- Scoring vectorisé ----------------------------------------------------
 
-        sorted_cands = sorted(candidates.items(), key=lambda x: x[1], reverse=True)
+    def _id_arrays(self):
+        """
+        movieId de chaque ligne (int64 si tous convertibles) et code d'agrégation
+        par movieId (deux lignes de même movieId partagent le même code).
+        """
+        # lu sans verrou par les calculs en cours : le couple est publié d'une seule affectation
+        cache = self._id_cache
+        if cache is None or len(cache[0]) != len(self.movies_df):
+            ids = [_to_int_safe(x) for x in self.movies_df[self.movieid_col].values]
+            if all(isinstance(x, int) for x in ids):
+                movie_ids = np.asarray(ids, dtype=np.int64)
+                _, movie_codes = np.unique(movie_ids, return_inverse=True)
+            else:
+                movie_ids = np.empty(len(ids), dtype=object)
+                movie_ids[:] = ids
+                codes: Dict[Any, int] = {}
+                movie_codes = np.asarray([codes.setdefault(x, len(codes)) for x in ids], dtype=np.int64)
+            cache = self._id_cache = (movie_ids, movie_codes)
+        return cache
 
-        result = []
-        for mid, _ in sorted_cands[:top_n]:
+    def _available_mask(self, exclude_seen: Optional[List[Any]]) -> np.ndarray:
+        """
+        Lignes candidates : actives et dont le movieId n'est pas dans exclude_seen.
+        """
+        available = self.active.copy()
+        if not exclude_seen:
+            return available
+        exclude_seen_set = set()
+        for x in exclude_seen:
             try:
-                result.append(int(mid))
+                exclude_seen_set.add(int(x))
             except Exception:
-                result.append(mid)
-        return result
+                exclude_seen_set.add(x)
+
+        movie_ids, _ = self._id_arrays()
+        if movie_ids.dtype == np.int64:
+            excluded = [x for x in exclude_seen_set if isinstance(x, int)]
+            available &= ~np.isin(movie_ids, np.asarray(excluded, dtype=np.int64))
+        else:
+            available &= np.fromiter((m not in exclude_seen_set for m in movie_ids), dtype=bool, count=len(movie_ids))
+        return available
+
+    def _top_available(self, scores: np.ndarray, available: np.ndarray, n: int) -> np.ndarray:
+        """
+        Les n meilleures lignes disponibles (score décroissant, puis indice croissant).
+        """
+        n = min(n, int(available.sum()))
+        if n <= 0:
+            return np.empty(0, dtype=np.int64)
+        masked = np.where(available, scores, -np.inf)
+        return top_k_rows(masked[None, :], n)[0]
+
+    def _candidates_for(self, idx: int, per_fav: int, available: np.ndarray):
+        """
+        Les per_fav voisins disponibles de idx et leurs scores : d'abord l'index
+        top-K s'il existe, complété par la ligne de similarité complète si besoin
+        (voisins vus ou retirés, per_fav supérieur à neighbors_k).
+        """
+        available = available.copy()
+        available[idx] = False
+        picked = np.empty(0, dtype=np.int64)
+        picked_scores = np.empty(0, dtype=np.float64)
+
+        if self.neighbor_idx is not None:
+            cols = self.neighbor_idx[idx]
+            ok = available[cols]
+            picked = cols[ok][:per_fav].astype(np.int64)
+            picked_scores = self.neighbor_sim[idx][ok][:per_fav].astype(np.float64)
+            if len(picked) >= per_fav or len(cols) >= len(self.movies_df) - 1:
+                # assez de voisins, ou la liste couvre déjà tout le catalogue
+                return picked, picked_scores
+            available[cols] = False
+
+        elif self.ann_index is not None:
+            # candidats de l'index approché, re-classés exactement
+            self.ann_queries += 1
+            vectors = self._vectors
+            candidates = self.ann_index.query(vectors[idx:idx + 1])
+            candidates = candidates[available[candidates]]
+            if len(candidates) >= per_fav:
+                if self.embeddings is not None:
+                    sims = (vectors[candidates] @ vectors[idx]).astype(np.float64)
+                else:
+                    sims = (vectors[candidates] @ vectors[idx].T).toarray().ravel()
+                best = top_k(sims, per_fav)
+                return candidates[best], sims[best]
+            # pas assez de candidats : ligne de similarité complète
+            self.ann_fallbacks += 1
+
+        row = self._similarity_row(idx)
+        rest = self._top_available(row, available, per_fav - len(picked))
+        return np.concatenate([picked, rest]), np.concatenate([picked_scores, row[rest]])
+
+    def _score(self, favorites: List[str], per_fav: int, exclude_seen: Optional[List[Any]], aggregate_by: str):
+        """
+        Agrège les voisins de chaque favori par movieId (somme ou max).
+        Renvoie (codes triés, scores, dernière ligne vue par code, sélections par favori).
+        """
+        _, codes = self._id_arrays()
+        n_codes = int(codes.max()) + 1 if len(codes) else 0
+        available = self._available_mask(exclude_seen)
+
+        acc = np.zeros(n_codes, dtype=np.float64)
+        # rang de première apparition : départage les égalités comme l'ordre
+        # d'insertion du dict de la version séquentielle
+        first_seen = np.full(n_codes, np.iinfo(np.int64).max, dtype=np.int64)
+        last_row = np.zeros(n_codes, dtype=np.int64)
+        selections = []
+
+        position = 0
+        for fav in favorites:
+            idx = self.title_to_index.get(fav)
+            if idx is None:
+                continue
+            rows, scores = self._candidates_for(idx, per_fav, available)
+            if not len(rows):
+                continue
+            sel = codes[rows]
+            if aggregate_by == "sum":
+                np.add.at(acc, sel, scores)
+            else:
+                np.maximum.at(acc, sel, scores)
+            np.minimum.at(first_seen, sel, position + np.arange(len(sel)))
+            last_row[sel] = rows
+            selections.append((fav, sel))
+            position += len(sel)
+
+        seen = np.flatnonzero(first_seen != np.iinfo(np.int64).max)
+        order = seen[np.lexsort((first_seen[seen], -acc[seen]))]
+        return order, acc, last_row, selections
+
+    def recommend_from_titles(
+        self,
+        favorites: List[str],
+        top_n: int = 20,
+        per_fav: int = DEFAULT_PER_FAV,
+        exclude_seen: Optional[List[Any]] = None,
+        aggregate_by: str = "sum",
+    ) -> List[int]:
+        """
+        Prend une liste de titres favoris et renvoie une liste de movieId (top_n).
+        """
+        order, _, last_row, _ = self._score(favorites, per_fav, exclude_seen, aggregate_by)
+        movie_ids, _ = self._id_arrays()
+        return [_to_int_safe(movie_ids[i]) for i in last_row[order[:top_n]]]
 
     def recommend_with_details(
         self,
         favorites: List[str],
         top_n: int = 20,
-        per_fav: int = 50,
+        per_fav: int = DEFAULT_PER_FAV,
         exclude_seen: Optional[List[Any]] = None,
         aggregate_by: str = "sum",
     ) -> List[Dict[str, Any]]:
         """
         Même chose que recommend_from_titles mais renvoie des objets détaillés.
         """
-        exclude_seen_set = set()
-        if exclude_seen:
-            for x in exclude_seen:
-                try:
-                    exclude_seen_set.add(int(x))
-                except Exception:
-                    exclude_seen_set.add(x)
-
-        candidates: Dict[Any, float] = {}
-        sources: Dict[Any, List[str]] = {}
-        titles_map: Dict[Any, str] = {}
-
-        for fav in favorites:
-            if fav not in self.title_to_index:
-                continue
-            idx = self.title_to_index[fav]
-            sim_scores = list(enumerate(self.cosine_sim[idx]))
-            sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-
-            count = 0
-            for i, score in sim_scores:
-                if i == idx:
-                    continue
-                movie_id_raw = self.movies_df.iloc[i][self.movieid_col]
-                try:
-                    movie_id = int(movie_id_raw)
-                except Exception:
-                    movie_id = movie_id_raw
-                if movie_id in exclude_seen_set:
-                    continue
-
-                if aggregate_by == "sum":
-                    candidates[movie_id] = candidates.get(movie_id, 0.0) + float(score)
-                else:
-                    candidates[movie_id] = max(candidates.get(movie_id, 0.0), float(score))
-
-                sources.setdefault(movie_id, []).append(fav)
-                titles_map[movie_id] = self.movies_df.iloc[i][self.title_col]
+        order, acc, last_row, selections = self._score(favorites, per_fav, exclude_seen, aggregate_by)
+        top = order[:top_n]
 
-                count += 1
-                if count >= per_fav:
-                    break
+        top_set = set(top.tolist())
+        sources: Dict[int, List[str]] = {c: [] for c in top_set}
+        for fav, sel in selections:
+            for c in sel[np.isin(sel, top)].tolist():
+                sources[c].append(fav)
 
-        sorted_cands = sorted(candidates.items(), key=lambda x: x[1], reverse=True)
+        movie_ids, _ = self._id_arrays()
+        titles = self.movies_df[self.title_col].values
         result = []
-        for mid, score in sorted_cands[:top_n]:
+        for c in top.tolist():
+            row = last_row[c]
+            mid = movie_ids[row]
             result.append({
-                "movieId": int(mid) if str(mid).isdigit() else mid,
-                "title": titles_map.get(mid, ""),
-                "score": float(score),
-                "sources": sources.get(mid, []),
+                "movieId": int(mid) if movie_ids.dtype == np.int64 or str(mid).isdigit() else mid,
+                "title": titles[row],
+                "score": float(acc[c]),
+                "sources": sources[c],
             })
         return result
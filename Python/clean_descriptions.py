@@ -0,0 +1,85 @@
+"""
+Job hors ligne : recalcule description_clean pour tout le catalogue (collection
+movies) en flux, avec nlp.pipe par lots, et réécrit les résultats par bulk_write.
+
+Usage : python clean_descriptions.py [taille_lot] [n_process] [missing]
+"missing" ne traite que les films sans description_clean.
+
+Sur un CSV au format movies_enriched2.csv (helpers en colonnes) :
+        python clean_descriptions.py fichier.csv [sortie.csv] [n_process]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from algo1 import build_description_clean_frame, build_description_clean_many, get_corpus_idf
+
+FIELDS = {"movieId": 1, "title": 1, "genres": 1, "year": 1, "actors": 1, "description": 1}
+
+
+def clean_descriptions(batch_size: int = 256, n_process: int = 1, only_missing: bool = False):
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URI"))
+    movies = client["RecommendIT"]["movies"]
+
+    query = {}
+    if only_missing:
+        query = {"$or": [{"description_clean": {"$exists": False}}, {"description_clean": ""}]}
+    # curseur lu au fil de l'eau : seuls quelques lots sont en mémoire
+    cursor = movies.find(query, FIELDS, batch_size=batch_size)
+
+    corpus_idf = get_corpus_idf()
+    if corpus_idf is not None:
+        print(f"📚 IDF du catalogue: {corpus_idf.n_docs} films, {len(corpus_idf)} tokens")
+    else:
+        print("⚠️ Pas de table d'IDF (build_corpus_idf.py) : mots-clés classés par fréquence")
+
+    start = time.perf_counter()
+    done, updates = 0, []
+    try:
+        for movie, description_clean in build_description_clean_many(
+            cursor, batch_size=batch_size, n_process=n_process, corpus_idf=corpus_idf
+        ):
+            updates.append(UpdateOne({"_id": movie["_id"]}, {"$set": {"description_clean": description_clean}}))
+            if len(updates) >= batch_size:
+                movies.bulk_write(updates, ordered=False)
+                done += len(updates)
+                updates = []
+                elapsed = time.perf_counter() - start
+                print(f"🧹 {done} films nettoyés ({done / elapsed:.0f} docs/s)")
+        if updates:
+            movies.bulk_write(updates, ordered=False)
+            done += len(updates)
+    finally:
+        cursor.close()
+        client.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {done} description_clean réécrites en {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f} docs/s)")
+
+
+def clean_csv(csv_path: str, out_path: str = None, n_process: int = 1):
+    """
+    Ajoute (ou remplace) la colonne description_clean d'un CSV enrichi.
+    """
+    df = pd.read_csv(csv_path)
+    start = time.perf_counter()
+    df["description_clean"] = build_description_clean_frame(df, n_process=n_process)
+    elapsed = time.perf_counter() - start
+    df.to_csv(out_path or csv_path, index=False)
+    print(f"✅ {len(df)} lignes nettoyées en {elapsed:.1f}s ({len(df) / max(elapsed, 1e-9):.0f} lignes/s) -> {out_path or csv_path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1].endswith(".csv"):
+        out_path = sys.argv[2] if len(sys.argv) > 2 else None
+        clean_csv(sys.argv[1], out_path, int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+        sys.exit(0)
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    n_process = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    only_missing = len(sys.argv) > 3 and sys.argv[3] == "missing"
+    clean_descriptions(batch_size, n_process, only_missing)
@@ -0,0 +1,145 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class PoolSaturated(Exception):
+    """
+    Levée quand la file d'attente du pool est pleine : l'API répond 503.
+    """
+
+    def __init__(self, endpoint: str):
+        super().__init__(f"pool de calcul saturé ({endpoint})")
+        self.endpoint = endpoint
+
+
+def parse_limits(spec: str, cast: Callable[[str], Any] = int) -> Dict[str, Any]:
+    """
+    "hybrid=2,ubcf=4" -> {"hybrid": 2, "ubcf": 4}
+    """
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            limits[name.strip()] = cast(value)
+    return limits
+
+
+class ComputePool:
+    """
+    Exécute les calculs de recommandation hors de la boucle asyncio.
+
+    - mode "thread" : ThreadPoolExecutor, pour le travail NumPy / SciPy / BLAS
+      qui relâche le GIL ; les modèles sont partagés directement ;
+    - mode "process" : ProcessPoolExecutor en fork, les workers héritent des
+      modèles en lecture seule (copie à l'écriture). refresh() recrée le pool
+      après chaque remplacement de modèle pour que les nouveaux workers le
+      voient. Les stores (notes, films) d'un worker restent ceux du fork :
+      les données propres à une requête (notes de l'utilisateur...) sont
+      passées en arguments, jamais relues dans le worker.
+
+    La profondeur de file est bornée (max_queue, tâches en cours + en attente) :
+    au-delà, run() lève PoolSaturated. Chaque endpoint a en plus sa propre
+    limite de concurrence (limits, par défaut max_workers).
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: Optional[int] = None,
+                 max_queue: int = 32, limits: Optional[Dict[str, int]] = None):
+        self.mode = mode
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.limits = dict(limits or {})
+        self._executor: Optional[Executor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # état et compteurs pour le monitoring
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.refreshes = 0
+
+    def _new_executor(self) -> Executor:
+        if self.mode == "process":
+            return ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("fork"))
+        return ThreadPoolExecutor(self.max_workers, thread_name_prefix="compute")
+
+    def start(self):
+        if self._executor is None:
+            self._executor = self._new_executor()
+
+    def refresh(self):
+        """
+        Mode process : remplace les workers par de nouveaux, forkés avec les
+        modèles courants. Les tâches en cours terminent sur l'ancien pool.
+        """
+        if self.mode != "process" or self._executor is None:
+            return
+        old, self._executor = self._executor, self._new_executor()
+        old.shutdown(wait=False)
+        self.refreshes += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(endpoint)
+        if sem is None:
+            sem = asyncio.Semaphore(self.limits.get(endpoint, self.max_workers))
+            self._semaphores[endpoint] = sem
+        return sem
+
+    async def run(self, endpoint: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Exécute fn(*args, **kwargs) dans le pool et attend son résultat.
+
+        Si l'appelant abandonne (timeout, client déconnecté), la tâche garde sa
+        place dans la file et dans la limite de l'endpoint jusqu'à ce qu'elle
+        se termine réellement : la contre-pression reste exacte.
+        """
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise PoolSaturated(endpoint)
+        self.start()
+        self.pending += 1
+        sem = self._semaphore(endpoint)
+        try:
+            await sem.acquire()
+        except BaseException:
+            self.pending -= 1
+            raise
+
+        loop = asyncio.get_running_loop()
+        self.running += 1
+
+        def release(_future=None):
+            self.running -= 1
+            self.pending -= 1
+            self.completed += 1
+            sem.release()
+
+        try:
+            future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            release()
+            raise
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(release, f))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "limits": self.limits,
+            "pending": self.pending,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "refreshes": self.refreshes,
+        }
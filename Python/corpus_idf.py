@@ -0,0 +1,84 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Même découpage que TfidfVectorizer (token_pattern par défaut)
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(pre_desc: str) -> List[str]:
+    return TOKEN_PATTERN.findall(str(pre_desc).lower())
+
+
+class CorpusIdf:
+    """
+    Table d'IDF du catalogue, calculée sur les descriptions prétraitées
+    (lemmes) de tous les films : nombre de documents et fréquence
+    documentaire de chaque token, avec l'IDF lissé de TfidfVectorizer
+    (log((1 + n) / (1 + df)) + 1).
+
+    Les films déjà comptés sont mémorisés (doc_ids) : un nouveau film
+    s'ajoute avec add_document sans recalculer toute la table.
+    """
+
+    def __init__(self, n_docs: int = 0, df: Optional[Dict[str, int]] = None,
+                 doc_ids: Optional[Iterable[Any]] = None):
+        self.n_docs = n_docs
+        self.df: Counter = Counter(df or {})
+        self.doc_ids: Set[Any] = set(doc_ids or ())
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self.doc_ids
+
+    def add_document(self, pre_desc: str, doc_id: Any = None) -> bool:
+        """
+        Compte un document ; renvoie False s'il l'était déjà (même doc_id).
+        """
+        if doc_id is not None:
+            if doc_id in self.doc_ids:
+                return False
+            self.doc_ids.add(doc_id)
+        self.n_docs += 1
+        self.df.update(set(tokenize(pre_desc)))
+        return True
+
+    def idf(self, token: str) -> float:
+        # un token jamais vu est traité comme apparaissant dans 0 document (IDF maximal)
+        return math.log((1 + self.n_docs) / (1 + self.df.get(token, 0))) + 1.0
+
+    def top_tokens(self, pre_desc: str, top_k: int = 15) -> List[str]:
+        """
+        Les top_k tokens de plus fort TF × IDF du document (à égalité, ordre
+        alphabétique) : un comptage et un tri, sans vectorizer.
+        """
+        counts = Counter(tokenize(pre_desc))
+        ranked = sorted(counts.items(), key=lambda x: (-x[1] * self.idf(x[0]), x[0]))
+        return [w for w, _ in ranked[:top_k]]
+
+    # --- Persistance ---------------------------------------------------------
+
+    def save(self, path: str):
+        """
+        Écrit la table en JSON (fichier temporaire puis os.replace : un lecteur
+        ne voit jamais de fichier partiel).
+        """
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "n_docs": self.n_docs,
+                "df": dict(self.df),
+                "doc_ids": sorted(self.doc_ids, key=str),
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusIdf":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("n_docs", 0), data.get("df"), data.get("doc_ids"))
@@ -68,3 +68,88 @@ def hybrid_recommender(df, user_id, cb_reco,
 
     # === Retourner Top N ===
     return sorted(hybrid_scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+
+def fuse_hybrid_scores(ubcf_recs, ibcf_recs, content_recs, title_to_id, seen_ids,
+                       top_n=20, alpha=0.75, beta=0.5):
+    """
+    Fusion par movieId utilisée par l'API :
+    - ubcf_recs / ibcf_recs : listes (title, score) sur 5, converties en movieId
+    - content_recs : sortie de recommend_with_details (score déjà normalisé)
+    - seen_ids : movieId déjà vus, exclus du résultat
+    Une source à None est indisponible (timeout, erreur) : les poids sont
+    répartis sur les sources restantes.
+    Retourne une liste (movieId, score) triée.
+    """
+    # Poids effectifs selon les sources disponibles
+    if ubcf_recs is None or ibcf_recs is None:
+        beta = 1.0 if ibcf_recs is None else 0.0
+    if content_recs is None:
+        alpha = 0.0
+    elif ubcf_recs is None and ibcf_recs is None:
+        alpha = 1.0
+    ubcf_recs, ibcf_recs, content_recs = ubcf_recs or [], ibcf_recs or [], content_recs or []
+
+    ibcf_norm = {}
+    for film, score in ibcf_recs:
+        mid = title_to_id.get(film)
+        if mid:
+            ibcf_norm[mid] = score / 5.0
+
+    ubcf_norm = {}
+    for film, score in ubcf_recs:
+        mid = title_to_id.get(film)
+        if mid:
+            ubcf_norm[mid] = score / 5.0
+
+    content_norm = {rec["movieId"]: rec["score"] for rec in content_recs}
+
+    candidate_films = set(ibcf_norm) | set(ubcf_norm) | set(content_norm)
+    candidate_films = {mid for mid in candidate_films if mid not in seen_ids}
+
+    # Fusion des scores par movieId
+    hybrid_scores = {}
+    for mid in candidate_films:
+        score_cb = content_norm.get(mid, 0.0)
+        score_cf = beta * ubcf_norm.get(mid, 0.0) + (1.0 - beta) * ibcf_norm.get(mid, 0.0)
+        hybrid_scores[mid] = alpha * score_cb + (1.0 - alpha) * score_cf
+
+    return sorted(hybrid_scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+
+def hybrid_recommend_many(user_ids, ubcf_engine, ibcf_model, cb_reco, title_to_id,
+                          user_ratings, favorites, top_n=20, k=20, alpha=0.75, beta=0.5):
+    """
+    Hybride pour un lot d'utilisateurs, avec les modèles déjà construits :
+    - user_ratings : {userId: [{"title", "rating"}]} (IBCF et films déjà vus)
+    - favorites : {userId: [titres]} (Content-Based)
+    UBCF et IBCF sont calculés pour tout le lot en une fois.
+    Retourne {userId: [(movieId, score)]}.
+    """
+    ubcf_all = ubcf_engine.recommend_many(user_ids, top_n=100, k=k)
+    ibcf_all = ibcf_model.recommend_many({uid: user_ratings.get(uid, []) for uid in user_ids}, top_n=100, k=k)
+
+    results = {}
+    for uid in user_ids:
+        seen_titles = {r["title"] for r in user_ratings.get(uid, [])}
+        seen_ids = {title_to_id[t] for t in seen_titles if t in title_to_id}
+        content_recs = []
+        if cb_reco is not None:
+            content_recs = cb_reco.recommend_with_details(
+                favorites=favorites.get(uid, []),
+                top_n=100,
+                exclude_seen=list(seen_titles)
+            )
+        results[uid] = fuse_hybrid_scores(
+            ubcf_all[uid], ibcf_all[uid], content_recs, title_to_id, seen_ids,
+            top_n=top_n, alpha=alpha, beta=beta
+        )
+    return results
+
+
+def contributing_sources(ubcf_recs, ibcf_recs, content_recs):
+    """
+    Sources ayant effectivement fourni des candidats à la fusion.
+    """
+    sources = {"ubcf": ubcf_recs, "ibcf": ibcf_recs, "cb": content_recs}
+    return [name for name, recs in sources.items() if recs]
@@ -1,6 +1,129 @@
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Any, Dict, List, Tuple
+import numpy as np
 from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+from ratings_store import RatingsMatrix
+from topk import top_k_rows
+
+
+class ItemNeighborModel:
+    """
+    Modèle IBCF précalculé : les k plus proches voisins de chaque film
+    (similarité cosinus sur les colonnes de notes), stockés en int32 / float32.
+
+    Construit une fois depuis la matrice de notes, puis réutilisé : une requête
+    n'est plus qu'un produit creux sur les films notés par l'utilisateur.
+    """
+
+    def __init__(self, ratings: RatingsMatrix, k: int = 50, block_size: int = 256):
+        self.titles = ratings.titles
+        self.title_to_col = ratings.title_to_col
+        n_items = len(self.titles)
+        self.k = max(min(k, n_items - 1), 0)
+
+        self.neighbor_idx = np.empty((n_items, self.k), dtype=np.int32)
+        self.neighbor_sim = np.empty((n_items, self.k), dtype=np.float32)
+        if self.k:
+            # items × users, lignes normalisées : le produit scalaire est la similarité cosinus
+            items = normalize(ratings.matrix.T.astype(np.float64).tocsr())
+            items_t = items.T.tocsc()
+            for start in range(0, n_items, block_size):
+                stop = min(start + block_size, n_items)
+                sims = (items[start:stop] @ items_t).toarray()
+                sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # pas soi-même
+                cols = top_k_rows(sims, self.k)
+                self.neighbor_idx[start:stop] = cols
+                self.neighbor_sim[start:stop] = np.take_along_axis(sims, cols, axis=1)
+
+        self._weights: Dict[int, csr_matrix] = {}
+
+    @classmethod
+    def from_arrays(cls, titles, neighbor_idx: np.ndarray, neighbor_sim: np.ndarray) -> "ItemNeighborModel":
+        """
+        Modèle déjà calculé (snapshot partagé) : les tableaux de voisins
+        peuvent être des memmap en lecture seule.
+        """
+        model = cls.__new__(cls)
+        model.titles = titles
+        model.title_to_col = {t: i for i, t in enumerate(titles)}
+        model.k = neighbor_idx.shape[1]
+        model.neighbor_idx = neighbor_idx
+        model.neighbor_sim = neighbor_sim
+        model._weights = {}
+        return model
+
+    def weights(self, k: int):
+        """
+        Matrice creuse films × films : W[i, j] = sim(i, j) si j est l'un des k
+        premiers voisins de i. Stockée en CSC pour sélectionner les films notés.
+        """
+        k = min(k, self.k)
+        if k not in self._weights:
+            n_items = len(self.titles)
+            rows = np.repeat(np.arange(n_items), k)
+            cols = self.neighbor_idx[:, :k].ravel()
+            data = self.neighbor_sim[:, :k].ravel().astype(np.float64)
+            self._weights[k] = csr_matrix((data, (rows, cols)), shape=(n_items, n_items)).tocsc()
+        return self._weights[k]
+
+    def user_vector(self, user_ratings) -> np.ndarray:
+        """
+        Vecteur title -> rating aligné sur les films du modèle.
+        """
+        vector = np.zeros(len(self.titles), dtype=np.float64)
+        for entry in user_ratings:
+            t = entry.get("title")
+            r = entry.get("rating")
+            col = self.title_to_col.get(t)
+            if col is not None and isinstance(r, (int, float)):
+                vector[col] = float(r)
+        return vector
+
+    def recommend_many(self, user_ratings_by_user: Dict[Any, List[Dict[str, Any]]], top_n=10, k=5,
+                       batch_size: int = 256) -> Dict[Any, List[Tuple[str, float]]]:
+        """
+        Recommandations pour plusieurs utilisateurs : les vecteurs de notes sont
+        empilés en une matrice creuse et multipliés par les poids en un seul produit.
+        """
+        results: Dict[Any, List[Tuple[str, float]]] = {}
+        users = list(user_ratings_by_user)
+        weights_t = self.weights(k).T.tocsr()
+        abs_weights_t = abs(weights_t)
+
+        for start in range(0, len(users), batch_size):
+            chunk = users[start:start + batch_size]
+            vectors = np.vstack([self.user_vector(user_ratings_by_user[u]) for u in chunk])
+            # seules les notes > 0 comptent comme voisins notés
+            positive = csr_matrix(np.where(vectors > 0, vectors, 0.0))
+            rated = positive.copy()
+            rated.data[:] = 1.0
+            num = (positive @ weights_t).toarray()
+            den = (rated @ abs_weights_t).toarray()
+
+            for i, uid in enumerate(chunk):
+                candidates = np.flatnonzero((vectors[i] == 0) & (den[i] > 0))
+                scores = num[i, candidates] / den[i, candidates]
+                order = np.lexsort((candidates, -scores))[:top_n]
+                results[uid] = [(self.titles[candidates[j]], float(scores[j])) for j in order]
+        return results
+
+    def recommend(self, user_ratings, top_n=10, k=5):
+        vector = self.user_vector(user_ratings)
+        rated = np.flatnonzero(vector > 0)
+        if not len(rated):
+            return []
+
+        # seules les colonnes des films notés interviennent
+        w = self.weights(k)[:, rated]
+        num = w @ vector[rated]
+        den = abs(w) @ np.ones(len(rated))
+
+        candidates = np.flatnonzero((vector == 0) & (den > 0))
+        scores = num[candidates] / den[candidates]
+        order = np.lexsort((candidates, -scores))[:top_n]
+        return [(self.titles[candidates[i]], float(scores[i])) for i in order]
+
 
 def recommender_ibcf_from_ratings(df, user_ratings, top_n=10, k=5):
     """
@@ -19,55 +142,8 @@ def recommender_ibcf_from_ratings(df, user_ratings, top_n=10, k=5):
     if df.empty:
         return []
 
-    # Construire matrice items × users
-    ratings_matrix = df.pivot_table(
-        index="title",
-        columns="userId",
-        values="rating",
-        fill_value=0
-    )
-
-    if ratings_matrix.empty:
+    ratings = RatingsMatrix.from_dataframe(df)
+    if ratings.matrix.shape[0] == 0 or ratings.matrix.shape[1] == 0:
         return []
 
-    # Convertir en float32 pour réduire la mémoire
-    ratings_matrix = ratings_matrix.astype("float32")
-
-    # Transformer en matrice creuse
-    sparse_matrix = csr_matrix(ratings_matrix.values)
-
-    # Similarité entre items (matrice creuse, dense_output=False évite de créer une énorme matrice dense)
-    item_sim_sparse = cosine_similarity(sparse_matrix, dense_output=False)
-
-    # Convertir en DataFrame pour garder la logique existante
-    item_sim_df = pd.DataFrame(
-        item_sim_sparse.toarray(),  # ⚠️ si tu veux rester en sparse, tu peux éviter toarray()
-        index=ratings_matrix.index,
-        columns=ratings_matrix.index
-    )
-
-    # Construire le vecteur utilisateur (title -> rating)
-    user_vector = pd.Series(0.0, index=ratings_matrix.index, dtype="float32")
-    for entry in user_ratings:
-        t = entry.get("title")
-        r = entry.get("rating")
-        if t in user_vector.index and isinstance(r, (int, float)):
-            user_vector[t] = float(r)
-
-    scores = {}
-
-    # Pour chaque film non noté par l'utilisateur
-    for film in ratings_matrix.index:
-        if user_vector[film] == 0:
-            # k voisins les plus proches
-            neighbors = item_sim_df[film].sort_values(ascending=False).drop(film).head(k)
-            num, den = 0.0, 0.0
-            for neighbor_film, sim in neighbors.items():
-                r = user_vector[neighbor_film]
-                if r > 0:
-                    num += sim * r
-                    den += abs(sim)
-            if den > 0:
-                scores[film] = num / den
-
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
+    return ItemNeighborModel(ratings, k=k).recommend(user_ratings, top_n=top_n, k=k)
@@ -0,0 +1,285 @@
+import json
+import os
+import pickle
+import shutil
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou, chaque worker se comporte en leader
+    fcntl = None
+
+CURRENT_FILE = "CURRENT"
+
+
+def _generation_dir(root: str, generation: int) -> str:
+    return os.path.join(root, f"gen-{generation:06d}")
+
+
+def current_generation(root: str) -> Optional[int]:
+    """
+    Génération publiée (contenu du fichier CURRENT), None si aucune.
+    """
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+class SnapshotWriter:
+    """
+    Écrit une génération de snapshot : tableaux NumPy (.npy), tables de
+    chaînes (octets UTF-8 + offsets, eux aussi mappables) et petits objets
+    picklés. publish() rend la génération visible en remplaçant CURRENT
+    atomiquement (os.replace) : les lecteurs voient l'ancienne ou la nouvelle,
+    jamais un état partiel.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        existing = [
+            int(name[4:]) for name in os.listdir(root)
+            if name.startswith("gen-") and name[4:].isdigit()
+        ]
+        self.generation = max(existing + [current_generation(root) or 0]) + 1
+        self.path = _generation_dir(root, self.generation) + ".tmp"
+        os.makedirs(self.path)
+        self.meta: Dict[str, Any] = {"arrays": [], "strings": [], "objects": []}
+
+    def add_array(self, name: str, array: np.ndarray):
+        np.save(os.path.join(self.path, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        self.meta["arrays"].append(name)
+
+    def add_csr(self, name: str, matrix: csr_matrix):
+        self.add_array(f"{name}.data", matrix.data)
+        self.add_array(f"{name}.indices", matrix.indices)
+        self.add_array(f"{name}.indptr", matrix.indptr)
+        self.meta[f"{name}.shape"] = list(matrix.shape)
+
+    def add_strings(self, name: str, values: Sequence[Any]):
+        encoded = [("" if v is None else str(v)).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        self.add_array(f"{name}.bytes", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self.add_array(f"{name}.offsets", offsets)
+        self.meta["strings"].append(name)
+
+    def add_object(self, name: str, obj: Any):
+        with open(os.path.join(self.path, f"{name}.pkl"), "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.meta["objects"].append(name)
+
+    def publish(self, keep: int = 2) -> int:
+        """
+        Finalise la génération, la rend courante et supprime les plus anciennes
+        (les workers qui les mappent encore gardent leurs pages jusqu'au swap).
+        """
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+        final = _generation_dir(self.root, self.generation)
+        os.rename(self.path, final)
+
+        tmp = os.path.join(self.root, CURRENT_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(str(self.generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.root, CURRENT_FILE))
+
+        for name in sorted(os.listdir(self.root)):
+            if name.startswith("gen-") and name[4:].isdigit() and int(name[4:]) <= self.generation - keep:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        return self.generation
+
+    def abort(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class ModelSnapshot:
+    """
+    Génération ouverte en lecture : les tableaux sont des numpy.memmap en
+    lecture seule, partagés par tous les workers du nœud via le cache de pages.
+    """
+
+    def __init__(self, root: str, generation: Optional[int] = None):
+        self.generation = current_generation(root) if generation is None else generation
+        if self.generation is None:
+            raise FileNotFoundError(f"aucun snapshot publié dans {root}")
+        self.path = _generation_dir(root, self.generation)
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+    def __contains__(self, name: str) -> bool:
+        return (
+            name in self.meta["arrays"] or name in self.meta["strings"]
+            or name in self.meta["objects"] or f"{name}.shape" in self.meta
+        )
+
+    def array(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def csr(self, name: str) -> csr_matrix:
+        return csr_matrix(
+            (self.array(f"{name}.data"), self.array(f"{name}.indices"), self.array(f"{name}.indptr")),
+            shape=tuple(self.meta[f"{name}.shape"]),
+            copy=False,
+        )
+
+    def strings(self, name: str) -> List[str]:
+        data = self.array(f"{name}.bytes")
+        offsets = self.array(f"{name}.offsets")
+        raw = data.tobytes()
+        return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def object(self, name: str) -> Any:
+        with open(os.path.join(self.path, f"{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+
+
+class LeaderLock:
+    """
+    Verrou fichier non bloquant : un seul worker du nœud (le leader) reconstruit
+    les modèles et publie les générations, les autres se contentent de les lire.
+    """
+
+    def __init__(self, root: str):
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, ".leader.lock")
+        self._file = None
+
+    def acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        if self._file is None:
+            self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def release(self):
+        if self._file is not None:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+# --- Modèles de l'API ------------------------------------------------------------
+
+def _all_integers(values: pd.Series) -> bool:
+    """
+    Vrai si toutes les valeurs sont des entiers (ou convertibles sans perte).
+    """
+    numeric = pd.to_numeric(values, errors="coerce")
+    return bool(numeric.notna().all() and (numeric == np.floor(numeric)).all())
+
+
+def save_models(root: str, ratings, ibcf_model, cb_state: Dict[str, Any], keep: int = 2) -> int:
+    """
+    Publie une génération avec la matrice de notes (CSR float64, indicatrice
+    "a noté" et normes des lignes : UBCFEngine s'y adosse sans rien copier),
+    les voisins IBCF et l'état du Content-Based (TF-IDF CSR, table des films,
+    vectorizer, embeddings SVD float32 s'il y en a). Renvoie le numéro de
+    génération.
+    """
+    from ubcf import UBCFEngine
+
+    writer = SnapshotWriter(root)
+    try:
+        ubcf_engine = UBCFEngine(ratings)
+        writer.add_csr("ratings", ubcf_engine.matrix)
+        writer.add_array("ratings.rated", ubcf_engine.rated.data)
+        writer.add_array("ratings.norms", ubcf_engine.norms)
+        writer.add_strings("ratings.user_ids", ratings.user_ids)
+        writer.add_strings("ratings.titles", ratings.titles)
+
+        writer.add_strings("ibcf.titles", ibcf_model.titles)
+        writer.add_array("ibcf.neighbor_idx", ibcf_model.neighbor_idx)
+        writer.add_array("ibcf.neighbor_sim", ibcf_model.neighbor_sim)
+
+        movies_df = cb_state["movies_df"]
+        writer.add_csr("cb.tfidf", cb_state["tfidf_matrix"].tocsr())
+        movie_ids = movies_df[cb_state["movieid_col"]]
+        if _all_integers(movie_ids):
+            writer.add_array("cb.movie_ids", movie_ids.astype(np.int64).values)
+        else:
+            # movieId non entiers : table de chaînes (reconvertis par _to_int_safe à la lecture)
+            writer.add_strings("cb.movie_ids", movie_ids.values)
+        writer.add_strings("cb.titles", movies_df[cb_state["title_col"]].values)
+        writer.add_strings("cb.texts", movies_df[cb_state["text_col"]].values)
+        writer.add_array("cb.active", cb_state["active"])
+        if cb_state.get("neighbor_idx") is not None:
+            writer.add_array("cb.neighbor_idx", cb_state["neighbor_idx"])
+            writer.add_array("cb.neighbor_sim", cb_state["neighbor_sim"])
+        if cb_state.get("svd") is not None:
+            writer.add_array("cb.embeddings", cb_state["embeddings"])
+            writer.add_object("cb.svd", cb_state["svd"])
+        writer.add_object("cb.vectorizer", cb_state["tfidf_vect"])
+        return writer.publish(keep=keep)
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def load_models(snapshot: ModelSnapshot, **cb_kwargs):
+    """
+    Ouvre les modèles d'une génération : (UBCFEngine, ItemNeighborModel,
+    ContentBasedRecommender), tous adossés aux tableaux memmap du snapshot.
+    cb_kwargs est transmis à ContentBasedRecommender.from_arrays (ann, ...).
+    """
+    from cb import ContentBasedRecommender
+    from ibcf import ItemNeighborModel
+    from ratings_store import RatingsMatrix
+    from ubcf import UBCFEngine
+
+    user_ids = np.asarray(snapshot.strings("ratings.user_ids"), dtype=object)
+    titles = np.asarray(snapshot.strings("ratings.titles"), dtype=object)
+    ratings = RatingsMatrix(
+        snapshot.csr("ratings"), user_ids, titles,
+        {u: i for i, u in enumerate(user_ids)},
+        {t: i for i, t in enumerate(titles)},
+    )
+    has_ubcf_arrays = "ratings.rated" in snapshot
+    ubcf_engine = UBCFEngine(
+        ratings,
+        rated_data=snapshot.array("ratings.rated") if has_ubcf_arrays else None,
+        norms=snapshot.array("ratings.norms") if has_ubcf_arrays else None,
+    )
+
+    ibcf_model = ItemNeighborModel.from_arrays(
+        np.asarray(snapshot.strings("ibcf.titles"), dtype=object),
+        snapshot.array("ibcf.neighbor_idx"),
+        snapshot.array("ibcf.neighbor_sim"),
+    )
+
+    if "cb.movie_ids" in snapshot.meta["strings"]:
+        movie_ids = np.asarray(snapshot.strings("cb.movie_ids"), dtype=object)
+    else:
+        movie_ids = np.asarray(snapshot.array("cb.movie_ids"))
+    movies_df = pd.DataFrame({
+        "movieId": movie_ids,
+        "title": snapshot.strings("cb.titles"),
+        "description_clean": snapshot.strings("cb.texts"),
+    })
+    has_neighbors = "cb.neighbor_idx" in snapshot
+    has_svd = "cb.svd" in snapshot
+    cb_reco = ContentBasedRecommender.from_arrays(
+        movies_df,
+        snapshot.object("cb.vectorizer"),
+        snapshot.csr("cb.tfidf"),
+        active=snapshot.array("cb.active"),
+        neighbor_idx=snapshot.array("cb.neighbor_idx") if has_neighbors else None,
+        neighbor_sim=snapshot.array("cb.neighbor_sim") if has_neighbors else None,
+        svd=snapshot.object("cb.svd") if has_svd else None,
+        embeddings=snapshot.array("cb.embeddings") if has_svd else None,
+        **cb_kwargs,
+    )
+    return ubcf_engine, ibcf_model, cb_reco
@@ -0,0 +1,123 @@
+from typing import Any, Dict, NamedTuple, Optional
+
+# Champs gardés en mémoire pour chaque film
+MOVIE_FIELDS = ("movieId", "title", "year", "genres", "description", "backdrop", "description_clean")
+
+
+def _word_count(field: str) -> Dict[str, Any]:
+    return {"$size": {"$split": [{"$ifNull": [f"${field}", ""]}, " "]}}
+
+
+# Marqueur de polling (expression d'agrégation) : les films n'ont pas de date de
+# mise à jour et Node ne fait que les insérer ; movieId, titre, année, createdAt
+# et nombre de mots des textes suffisent à repérer un ajout ou une modification
+MOVIES_SYNC_MARKER = {
+    "id": "$movieId",
+    "t": "$title",
+    "y": "$year",
+    "c": "$createdAt",
+    "g": {"$size": {"$ifNull": ["$genres", []]}},
+    "d": _word_count("description"),
+    "dc": _word_count("description_clean"),
+}
+
+
+class MoviesSnapshot(NamedTuple):
+    """
+    Vue figée du catalogue, lue par les endpoints sans accès à MongoDB.
+    """
+    version: int
+    movies_map: Dict[int, Dict[str, Any]]
+    title_to_id: Dict[str, int]
+    id_to_title: Dict[int, str]
+
+
+class MoviesStore:
+    """
+    Cache en mémoire de la collection `movies`, modifié en place document par
+    document (insert / update / delete) et publié sous forme de snapshots versionnés.
+    """
+
+    def __init__(self):
+        self._movies: Dict[int, Dict[str, Any]] = {}
+        # _id Mongo -> movieId, nécessaire pour appliquer les suppressions
+        self._doc_to_movie: Dict[Any, int] = {}
+        self.version = 0
+        self._snapshot: Optional[MoviesSnapshot] = None
+
+    @classmethod
+    async def create(cls, movies_collection):
+        """
+        Méthode async pour charger tous les films depuis MongoDB avec Motor.
+        """
+        store = cls()
+        await store.reload(movies_collection)
+        return store
+
+    async def reload(self, movies_collection):
+        """
+        Recharge entièrement le cache depuis MongoDB.
+        """
+        docs = await movies_collection.find({}, {f: 1 for f in MOVIE_FIELDS}).to_list(None)
+        self.load(docs)
+
+    def load(self, docs):
+        self._movies = {}
+        self._doc_to_movie = {}
+        for doc in docs:
+            self._put(doc)
+        self.version += 1
+        print(f"📊 Cache films rechargé: {len(self._movies)} films")
+
+    def _put(self, doc: Dict[str, Any]) -> Optional[int]:
+        try:
+            mid = int(doc.get("movieId"))
+        except Exception:
+            # si movieId n'est pas convertible, on ignore l'entrée
+            return None
+        movie = {f: doc[f] for f in MOVIE_FIELDS if f in doc}
+        if "_id" in doc:
+            movie["_id"] = doc["_id"]
+            previous = self._doc_to_movie.get(doc["_id"])
+            if previous is not None and previous != mid:
+                # le movieId du document a changé
+                self._movies.pop(previous, None)
+            self._doc_to_movie[doc["_id"]] = mid
+        self._movies[mid] = movie
+        return mid
+
+    # --- Mises à jour incrémentales ------------------------------------------
+
+    def upsert_doc(self, doc: Dict[str, Any]) -> Optional[int]:
+        """
+        Insère ou remplace un film. Renvoie son movieId (None si ignoré).
+        """
+        mid = self._put(doc)
+        if mid is not None:
+            self.version += 1
+        return mid
+
+    def remove_doc(self, doc_id) -> Optional[int]:
+        """
+        Supprime un film à partir de l'_id de son document. Renvoie son movieId.
+        """
+        mid = self._doc_to_movie.pop(doc_id, None)
+        if mid is not None and self._movies.pop(mid, None) is not None:
+            self.version += 1
+        return mid
+
+    # --- Lecture -------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._movies)
+
+    def snapshot(self) -> MoviesSnapshot:
+        """
+        Snapshot du catalogue, reconstruit seulement quand la version a changé.
+        """
+        if self._snapshot is None or self._snapshot.version != self.version:
+            movies_map = dict(self._movies)
+            title_to_id = {m["title"]: int(m["movieId"]) for m in movies_map.values() if "movieId" in m and "title" in m}
+            id_to_title = {int(m["movieId"]): m["title"] for m in movies_map.values() if "movieId" in m and "title" in m}
+            self._snapshot = MoviesSnapshot(self.version, movies_map, title_to_id, id_to_title)
+        return self._snapshot
@@ -0,0 +1,93 @@
+"""
+Job hors ligne : précalcule les recommandations hybrides de tous les utilisateurs
+et les écrit dans la table SQLite lue par l'API (PRECOMPUTED_DB).
+
+Le calcul passe par hybride.hybrid_recommend_many (la fusion par movieId de
+/hybrid) et non par hybrid_recommender : celui-ci reconstruit les deux modèles
+CF à chaque appel et renvoie des titres, pas ce que sert l'API.
+
+Chaque ligne porte la version des données (model_version : notes de tous les
+utilisateurs et catalogue) : l'API ne la sert que si ses propres modèles ont
+été construits sur les mêmes données.
+
+Usage : python precompute.py [chemin_db] [k] [top_n]
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from cb import ContentBasedRecommender
+from hybride import hybrid_recommend_many
+from ibcf import ItemNeighborModel
+from movies_store import MoviesStore
+from precomputed import PrecomputedStore, model_version, ratings_fingerprint
+from ratings_store import RatingsStore
+from ubcf import UBCFEngine
+
+BATCH_SIZE = 256
+
+
+async def load_favorites(favorites_collection, id_to_title):
+    """
+    Favoris de tous les utilisateurs : {userId (str): [titres]}.
+    """
+    favorites = defaultdict(list)
+    async for fav in favorites_collection.find({}, {"userId": 1, "movieId": 1}):
+        try:
+            title = id_to_title.get(int(fav.get("movieId")))
+        except Exception:
+            continue
+        if title:
+            favorites[str(fav.get("userId"))].append(title)
+    return favorites
+
+
+async def precompute(db_path: str, k: int = 41, top_n: int = 100):
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGO_URI"))
+    db = client["RecommendIT"]
+
+    start = time.time()
+    movies_store = await MoviesStore.create(db["movies"])
+    ratings_store = await RatingsStore.create(db["rates"])
+    snap = movies_store.snapshot()
+    favorites = await load_favorites(db["favorites"], snap.id_to_title)
+
+    # Modèles construits une seule fois pour tout le lot
+    ratings = ratings_store.matrix(snap.movies_map, snap.version)
+    ubcf_engine = UBCFEngine(ratings)
+    ibcf_model = ItemNeighborModel(ratings, k=k)
+    cb_reco = ContentBasedRecommender.from_movies_map(snap.movies_map)
+    print(f"✅ Modèles construits en {time.time() - start:.1f}s")
+
+    user_ids = sorted(set(ratings_store.user_ids) | set(favorites))
+    rows = []
+    for i in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[i:i + BATCH_SIZE]
+        user_ratings = {uid: ratings_store.user_title_ratings(uid, snap.movies_map) for uid in batch}
+        results = hybrid_recommend_many(
+            batch, ubcf_engine, ibcf_model, cb_reco, snap.title_to_id,
+            user_ratings, favorites, top_n=top_n, k=k
+        )
+        for uid in batch:
+            fp = ratings_fingerprint(user_ratings[uid], favorites.get(uid, []))
+            rows.append((uid, fp, results[uid]))
+        print(f"⏳ {min(i + BATCH_SIZE, len(user_ids))}/{len(user_ids)} utilisateurs")
+
+    store = PrecomputedStore(db_path)
+    store.write(k, top_n, rows, model_version(ratings, snap.movies_map))
+    store.close()
+    client.close()
+    print(f"✅ {len(rows)} recommandations écrites dans {db_path} ({time.time() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("PRECOMPUTED_DB", "recommendations.db")
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 41
+    top_n = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    asyncio.run(precompute(db_path, k, top_n))
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def ratings_fingerprint(user_ratings: Iterable[Dict[str, Any]], favorites: Iterable[str]) -> str:
+    """
+    Empreinte des entrées propres à un utilisateur (notes + favoris).
+    Si elle change, la recommandation précalculée n'est plus valable.
+    """
+    ratings = sorted((str(r.get("title")), round(float(r.get("rating") or 0.0), 4)) for r in user_ratings)
+    payload = json.dumps([ratings, sorted(set(favorites))], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def model_version(ratings, movies_map: Dict[int, Dict[str, Any]]) -> str:
+    """
+    Empreinte des données sur lesquelles reposent les modèles : matrice de
+    notes de tous les utilisateurs (RatingsMatrix) et catalogue (movieId,
+    titre, description_clean). La matrice est canonique (utilisateurs et
+    titres triés) : le job et l'API obtiennent la même empreinte quel que soit
+    l'ordre de chargement. Elle change dès qu'un autre utilisateur note ou
+    qu'un film change.
+    """
+    h = hashlib.sha1()
+    matrix = ratings.matrix
+    for array in (matrix.indptr, matrix.indices, matrix.data):
+        h.update(np.ascontiguousarray(array).tobytes())
+    h.update(json.dumps([list(map(str, ratings.user_ids)), list(map(str, ratings.titles))], ensure_ascii=False).encode("utf-8"))
+    movies = sorted(
+        (int(mid), str(m.get("title")), str(m.get("description_clean"))) for mid, m in movies_map.items()
+    )
+    h.update(json.dumps(movies, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+class PrecomputedStore:
+    """
+    Table SQLite des recommandations hybrides précalculées par utilisateur :
+    (userId, k) -> empreinte des entrées, version des modèles + liste
+    [(movieId, score)].
+
+    Écrite par le job hors ligne (precompute.py), lue par l'API : une
+    recommandation est servie telle quelle tant que l'empreinte de
+    l'utilisateur et la version des modèles (model_version) correspondent.
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            # WAL : les lecteurs voient l'ancienne table jusqu'au commit du job
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations ("
+                " user_id TEXT NOT NULL, k INTEGER NOT NULL, fingerprint TEXT NOT NULL,"
+                " recs TEXT NOT NULL, model_version TEXT NOT NULL DEFAULT '', PRIMARY KEY (user_id, k))"
+            )
+            if not self._has_model_version():
+                # table écrite par une version antérieure du job
+                self._conn.execute("ALTER TABLE recommendations ADD COLUMN model_version TEXT NOT NULL DEFAULT ''")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.commit()
+        # ancienne table en lecture seule : aucune ligne ne peut être validée
+        self._versioned = self._has_model_version()
+        self._lock = threading.Lock()
+
+        # compteurs pour le monitoring
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _has_model_version(self) -> bool:
+        columns = self._conn.execute("PRAGMA table_info(recommendations)").fetchall()
+        return any(col[1] == "model_version" for col in columns)
+
+    def close(self):
+        self._conn.close()
+
+    # --- Écriture (job hors ligne) -------------------------------------------
+
+    def write(self, k: int, top_n: int, rows: Iterable[Tuple[str, str, List[Tuple[int, float]]]], version: str):
+        """
+        Remplace toutes les recommandations pour ce k en une seule transaction.
+        rows : (userId, empreinte, [(movieId, score)]) ; version : model_version()
+        des données sur lesquelles le job a construit ses modèles.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM recommendations WHERE k = ?", (k,))
+            self._conn.executemany(
+                "INSERT INTO recommendations (user_id, k, fingerprint, recs, model_version) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (uid, k, fp, json.dumps([[int(mid), float(score)] for mid, score in recs]), version)
+                    for uid, fp, recs in rows
+                ),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(f"top_n:{k}", str(top_n)), ("built_at", str(time.time()))],
+            )
+
+    # --- Lecture (API) -------------------------------------------------------
+
+    def meta(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def lookup(self, user_id: str, k: int, fingerprint: str, top_n: int,
+               version: str) -> Optional[List[Tuple[int, float]]]:
+        """
+        Recommandation précalculée, ou None si absente, périmée (empreinte
+        différente, ou modèles construits sur d'autres données que `version`)
+        ou trop courte pour top_n.
+        """
+        if not self._versioned:
+            self.stale += 1
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, recs, model_version FROM recommendations WHERE user_id = ? AND k = ?",
+                (str(user_id), k),
+            ).fetchone()
+            stored_top_n = self._conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (f"top_n:{k}",)
+            ).fetchone()
+
+        if row is None or stored_top_n is None or int(stored_top_n[0]) < top_n:
+            self.misses += 1
+            return None
+        if row[0] != fingerprint or row[2] != version:
+            # les notes ou favoris de l'utilisateur, les notes des autres ou le
+            # catalogue ont changé depuis le précalcul
+            self.stale += 1
+            return None
+        self.hits += 1
+        return [(mid, score) for mid, score in json.loads(row[1])[:top_n]]
+
+    def stats(self) -> Dict[str, Any]:
+        meta = self.meta()
+        return {
+            "path": self.path,
+            "built_at": float(meta["built_at"]) if "built_at" in meta else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+        }
@@ -0,0 +1,326 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+# Marqueur de polling (expression d'agrégation) : nombre de notes, somme, date
+# max (Node remet `date` à jour à chaque note)
+RATES_SYNC_MARKER = {
+    "n": {"$size": {"$ifNull": ["$ratings", []]}},
+    "sum": {"$sum": "$ratings.note"},
+    "last": {"$max": "$ratings.date"},
+}
+
+
+class RatingsMatrix(NamedTuple):
+    """
+    Matrice utilisateurs × titres en CSR (float32), équivalente au
+    pivot_table(index="userId", columns="title", values="rating", fill_value=0)
+    utilisé par ubcf.py / ibcf.py : lignes et colonnes triées, doublons moyennés,
+    une note à 0 vaut "non noté".
+    """
+    matrix: csr_matrix
+    user_ids: np.ndarray
+    titles: np.ndarray
+    user_to_row: Dict[str, int]
+    title_to_col: Dict[str, int]
+
+    @classmethod
+    def from_arrays(cls, user_ids, titles, ratings) -> "RatingsMatrix":
+        ratings = np.asarray(ratings, dtype=np.float64)
+        keep = ~np.isnan(ratings)
+        rows, users = pd.factorize(np.asarray(user_ids, dtype=object)[keep], sort=True)
+        cols, items = pd.factorize(np.asarray(titles, dtype=object)[keep], sort=True)
+        ratings = ratings[keep]
+
+        # moyenne des doublons (userId, title), comme l'aggfunc par défaut du pivot
+        n_cols = max(len(items), 1)
+        keys, inverse = np.unique(rows.astype(np.int64) * n_cols + cols, return_inverse=True)
+        sums = np.bincount(inverse, weights=ratings, minlength=len(keys))
+        counts = np.bincount(inverse, minlength=len(keys))
+        matrix = csr_matrix(
+            ((sums / counts).astype(np.float32), (keys // n_cols, keys % n_cols)),
+            shape=(len(users), len(items)),
+        )
+        matrix.eliminate_zeros()
+
+        users = np.asarray(users, dtype=object)
+        items = np.asarray(items, dtype=object)
+        return cls(
+            matrix, users, items,
+            {u: i for i, u in enumerate(users)},
+            {t: i for i, t in enumerate(items)},
+        )
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "RatingsMatrix":
+        return cls.from_arrays(df["userId"].values, df["title"].values, df["rating"].values)
+
+
+class RatingsStore:
+    """
+    Stockage en mémoire des notes (collection `rates`), chargé une seule fois au
+    démarrage puis mis à jour document par document.
+
+    Chaque note est codée par des entiers : index utilisateur (int32), index film
+    (int32) et note (float32). Les endpoints lisent ces tableaux au lieu de
+    re-parcourir toute la collection à chaque requête.
+    """
+
+    def __init__(self):
+        # userId (str) <-> index
+        self.user_to_index: Dict[str, int] = {}
+        self.user_ids: List[str] = []
+        # movieId (int) <-> index
+        self.movie_to_index: Dict[int, int] = {}
+        self.movie_ids: List[int] = []
+
+        # index utilisateur -> (index films int32, notes float32)
+        self._rows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        # _id Mongo du document rates -> index utilisateur
+        self._doc_to_user: Dict[Any, int] = {}
+
+        # incrémenté à chaque modification, sert de clé aux caches dérivés
+        self.version = 0
+        # par utilisateur (index -> version du store à sa dernière modification)
+        # et par rechargement complet : sert de clé aux réponses mises en cache
+        # pour un utilisateur
+        self._user_versions: Dict[int, int] = {}
+        self._reloads = 0
+        self._reload_version = 0
+        self._coo_cache: Optional[Tuple[int, np.ndarray, np.ndarray, np.ndarray]] = None
+        self._frame_cache: Optional[Tuple[Any, pd.DataFrame]] = None
+        self._matrix_cache: Optional[Tuple[Any, RatingsMatrix]] = None
+
+    @classmethod
+    async def create(cls, rates_collection):
+        """
+        Méthode async pour charger toutes les notes depuis MongoDB avec Motor.
+        """
+        store = cls()
+        await store.reload(rates_collection)
+        return store
+
+    async def reload(self, rates_collection):
+        """
+        Recharge entièrement les notes depuis MongoDB (les index sont conservés).
+        """
+        self.load(await rates_collection.find({}, {"userId": 1, "ratings": 1}).to_list(None))
+
+    def load(self, docs):
+        """
+        Remplace toutes les notes par celles des documents rates fournis.
+        """
+        rows, doc_to_user = {}, {}
+        for doc in docs:
+            uidx, row = self._parse_doc(doc)
+            if doc.get("_id") is not None:
+                doc_to_user[doc["_id"]] = uidx
+            if row is not None:
+                rows[uidx] = row
+        # remplacement en une fois : les lecteurs ne voient jamais un état partiel
+        self._rows, self._doc_to_user = rows, doc_to_user
+        self.version += 1
+        self._reloads += 1
+        self._reload_version = self.version
+        print(f"📊 Notes chargées: {self.n_ratings} notes, {len(self._rows)} utilisateurs")
+
+    # --- Index ---------------------------------------------------------------
+
+    def _user_index(self, user_id) -> int:
+        uid = str(user_id)
+        idx = self.user_to_index.get(uid)
+        if idx is None:
+            idx = len(self.user_ids)
+            self.user_to_index[uid] = idx
+            self.user_ids.append(uid)
+        return idx
+
+    def _movie_index(self, movie_id: int) -> int:
+        idx = self.movie_to_index.get(movie_id)
+        if idx is None:
+            idx = len(self.movie_ids)
+            self.movie_to_index[movie_id] = idx
+            self.movie_ids.append(movie_id)
+        return idx
+
+    # --- Mises à jour incrémentales ------------------------------------------
+
+    def _parse_doc(self, doc: Dict[str, Any]) -> Tuple[int, Optional[Tuple[np.ndarray, np.ndarray]]]:
+        uidx = self._user_index(doc.get("userId"))
+        movie_idx, values = [], []
+        for r in doc.get("ratings", []) or []:
+            film_id = r.get("filmId")
+            rating = r.get("note", r.get("rating"))
+            if film_id is None or rating is None:
+                continue
+            try:
+                mid = int(film_id)
+                value = float(rating)
+            except Exception:
+                # filmId ou note non convertible, on ignore l'entrée
+                continue
+            movie_idx.append(self._movie_index(mid))
+            values.append(value)
+
+        if not movie_idx:
+            return uidx, None
+        return uidx, (np.asarray(movie_idx, dtype=np.int32), np.asarray(values, dtype=np.float32))
+
+    def upsert_doc(self, doc: Dict[str, Any]):
+        """
+        Remplace toutes les notes d'un utilisateur à partir de son document rates.
+        """
+        uidx, row = self._parse_doc(doc)
+        if doc.get("_id") is not None:
+            self._doc_to_user[doc["_id"]] = uidx
+        if row is not None:
+            self._rows[uidx] = row
+        else:
+            self._rows.pop(uidx, None)
+        self.version += 1
+        self._bump_user(uidx)
+
+    def remove_user(self, user_id):
+        """
+        Supprime toutes les notes d'un utilisateur.
+        """
+        uidx = self.user_to_index.get(str(user_id))
+        if uidx is not None and self._rows.pop(uidx, None) is not None:
+            self.version += 1
+            self._bump_user(uidx)
+
+    def remove_doc(self, doc_id) -> Optional[str]:
+        """
+        Supprime les notes associées à un document rates (par son _id).
+        Renvoie le userId concerné.
+        """
+        uidx = self._doc_to_user.pop(doc_id, None)
+        if uidx is None:
+            return None
+        if self._rows.pop(uidx, None) is not None:
+            self.version += 1
+            self._bump_user(uidx)
+        return self.user_ids[uidx]
+
+    def _bump_user(self, uidx: int):
+        self._user_versions[uidx] = self.version
+
+    def user_version(self, user_id) -> Tuple[int, int]:
+        """
+        Version des notes d'un utilisateur : change dès qu'elles sont modifiées
+        (ou que tout le store est rechargé).
+        """
+        uidx = self.user_to_index.get(str(user_id))
+        return self._reloads, (0 if uidx is None else self._user_versions.get(uidx, 0))
+
+    def changed_since(self, user_id, version: int) -> bool:
+        """
+        Vrai si les notes de l'utilisateur ont changé (ou le store a été
+        rechargé) après la version `version` du store.
+        """
+        uidx = self.user_to_index.get(str(user_id))
+        last = self._reload_version
+        if uidx is not None:
+            last = max(last, self._user_versions.get(uidx, 0))
+        return last > version
+
+    # --- Lecture -------------------------------------------------------------
+
+    @property
+    def n_ratings(self) -> int:
+        return int(sum(len(m) for m, _ in self._rows.values()))
+
+    def coo(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Renvoie (index utilisateurs, index films, notes) concaténés.
+        Le résultat est mis en cache tant que le store n'est pas modifié.
+        """
+        if self._coo_cache is not None and self._coo_cache[0] == self.version:
+            return self._coo_cache[1:]
+
+        # copie du dict : les calculs du pool lisent pendant que la synchro écrit
+        rows = dict(self._rows)
+        users, movies, values = [], [], []
+        for uidx in sorted(rows):
+            m, v = rows[uidx]
+            users.append(np.full(len(m), uidx, dtype=np.int32))
+            movies.append(m)
+            values.append(v)
+
+        if users:
+            coo = (np.concatenate(users), np.concatenate(movies), np.concatenate(values))
+        else:
+            coo = (np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32))
+        self._coo_cache = (self.version,) + coo
+        return coo
+
+    def _movie_titles(self, movies_map: Dict[int, Dict[str, Any]]) -> np.ndarray:
+        """
+        Titre de chaque index film (None si le film n'est plus dans movies_map).
+        """
+        titles = np.empty(len(self.movie_ids), dtype=object)
+        for i, mid in enumerate(self.movie_ids):
+            movie = movies_map.get(mid)
+            titles[i] = movie.get("title") if movie else None
+        return titles
+
+    def _known_triples(self, movies_map: Dict[int, Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (userId, titre, note) de chaque note dont le film est dans movies_map.
+        """
+        users, movies, values = self.coo()
+        titles = self._movie_titles(movies_map)[movies]
+        known = np.array([t is not None for t in titles], dtype=bool)
+        return np.asarray(self.user_ids, dtype=object)[users[known]], titles[known], values[known]
+
+    def to_dataframe(self, movies_map: Dict[int, Dict[str, Any]], movies_version: Any = None) -> pd.DataFrame:
+        """
+        DataFrame [userId, title, rating] attendu par ubcf.py / ibcf.py.
+        Les notes sur des films absents de movies_map sont ignorées.
+        Mis en cache par (version du store, movies_version).
+        """
+        key = (self.version, movies_version)
+        if movies_version is not None and self._frame_cache is not None and self._frame_cache[0] == key:
+            return self._frame_cache[1]
+
+        user_keys, titles, values = self._known_triples(movies_map)
+        df = pd.DataFrame({"userId": user_keys, "title": titles, "rating": values.astype(np.float64)})
+        if movies_version is not None:
+            self._frame_cache = (key, df)
+        return df
+
+    def matrix(self, movies_map: Dict[int, Dict[str, Any]], movies_version: Any = None) -> RatingsMatrix:
+        """
+        RatingsMatrix utilisateurs × titres, construite directement depuis les
+        tableaux du store (sans DataFrame). Mise en cache par (version, movies_version).
+        """
+        key = (self.version, movies_version)
+        if movies_version is not None and self._matrix_cache is not None and self._matrix_cache[0] == key:
+            return self._matrix_cache[1]
+
+        matrix = RatingsMatrix.from_arrays(*self._known_triples(movies_map))
+        if movies_version is not None:
+            self._matrix_cache = (key, matrix)
+        return matrix
+
+    def user_ratings(self, user_id) -> List[Tuple[int, float]]:
+        """
+        Liste [(movieId, note)] d'un utilisateur.
+        """
+        row = self._rows.get(self.user_to_index.get(str(user_id)))
+        if row is None:
+            return []
+        m, v = row
+        return [(self.movie_ids[i], float(r)) for i, r in zip(m.tolist(), v.tolist())]
+
+    def user_title_ratings(self, user_id, movies_map: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Liste [{"title", "rating"}] d'un utilisateur, limitée aux films connus.
+        """
+        out = []
+        for mid, rating in self.user_ratings(user_id):
+            movie = movies_map.get(mid)
+            if movie:
+                out.append({"userId": str(user_id), "title": movie.get("title"), "rating": rating})
+        return out
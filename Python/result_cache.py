@@ -0,0 +1,115 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+def request_key(endpoint: str, payload: Dict[str, Any], *versions) -> Tuple:
+    """
+    Clé de cache : endpoint + payload normalisé (clés triées, listes de
+    favoris / exclusions triées) + versions des snapshots utilisés.
+    """
+    normalized = {}
+    for key, value in payload.items():
+        if key in ("favorites", "exclude_seen") and isinstance(value, list):
+            value = sorted(set(value))
+        elif key == "userRatings" and isinstance(value, list):
+            value = sorted((r.get("title"), r.get("rating")) for r in value)
+        normalized[key] = value
+    return (endpoint, json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)) + versions
+
+
+class ResultCache:
+    """
+    Cache LRU + TTL des réponses des endpoints de recommandation.
+
+    - taille bornée (maxsize) : l'entrée la moins récemment lue est évincée ;
+    - durée de vie (ttl, en secondes) : une entrée expirée est recalculée ;
+    - invalidation par utilisateur quand ses notes changent, et complète
+      quand un modèle est reconstruit.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # clé -> (expiration, userId, valeur)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Optional[str], Any]]" = OrderedDict()
+        # userId -> clés de ses entrées
+        self._by_user: Dict[str, Set[Hashable]] = {}
+
+        # compteurs pour le monitoring
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key: Hashable, value: Any, user_id: Optional[str] = None):
+        if self.maxsize <= 0:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, user_id, value)
+        if user_id is not None:
+            self._by_user.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: Hashable):
+        _, user_id, _ = self._entries.pop(key)
+        if user_id is not None:
+            keys = self._by_user.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[user_id]
+
+    # --- Invalidation --------------------------------------------------------
+
+    def invalidate_user(self, user_id: str):
+        """
+        Supprime les réponses d'un utilisateur (ses notes ont changé).
+        """
+        for key in list(self._by_user.get(user_id, ())):
+            self._drop(key)
+            self.invalidations += 1
+
+    def clear(self):
+        """
+        Vide le cache (modèle reconstruit ou notes rechargées).
+        """
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+
+# erreurs où le jeton de reprise n'est plus utilisable (sorti de l'oplog...) :
+# ChangeStreamHistoryLost, ChangeStreamFatalError, CappedPositionLost
+HISTORY_LOST_CODES = {286, 280, 136}
+
+
+def _history_lost(e: OperationFailure) -> bool:
+    labels = (e.details or {}).get("errorLabels", [])
+    return e.code in HISTORY_LOST_CODES or "NonResumableChangeStreamError" in labels
+
+
+async def _fetch(cursor) -> List[Dict[str, Any]]:
+    """
+    Liste les documents d'un curseur Motor (async) ou PyMongo / mongomock (sync).
+    """
+    to_list = getattr(cursor, "to_list", None)
+    if to_list is None:
+        return list(cursor)
+    result = to_list(None)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class CollectionSync:
+    """
+    Tâche de fond qui maintient un cache en mémoire aligné sur une collection MongoDB.
+
+    - mode "watch" : suit le change stream de la collection (replica set / Atlas)
+      et applique chaque insert / update / replace / delete en place ;
+    - mode "poll" : repli pour un mongod standalone (ou mongomock), compare
+      périodiquement les documents par _id. Avec `timestamp_field`, seuls les
+      documents modifiés depuis le dernier tour sont relus ; avec `marker`
+      (expression d'agrégation, ex. taille et date max d'un tableau), chaque tour
+      ne lit que _id + marqueur et relit les documents dont le marqueur a changé.
+      Sans l'un ni l'autre, chaque tour relit toute la collection. Avec
+      `full_scan_every`, un tour sur N relit quand même tout (filet de sécurité
+      pour un marqueur qui ne voit pas toutes les modifications).
+
+    Le chargement complet (load) passe par la même lecture que l'état de
+    référence du polling : un changement survenu juste après est vu au premier
+    tour. on_load reçoit les documents, on_reload (optionnel) est appelé après
+    chaque resynchronisation complète (perte du flux).
+
+    En mode "auto", le change stream est tenté d'abord, puis on bascule sur le
+    polling si le serveur ne le supporte pas.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        collection,
+        on_upsert: Callable[[Dict[str, Any]], Any],
+        on_delete: Callable[[Any], Any],
+        on_load: Callable[[List[Dict[str, Any]]], Any],
+        on_reload: Optional[Callable[[], Awaitable[Any]]] = None,
+        projection: Optional[Dict[str, int]] = None,
+        mode: str = "auto",
+        poll_interval: float = 30.0,
+        timestamp_field: Optional[str] = None,
+        marker: Optional[Dict[str, Any]] = None,
+        full_scan_every: int = 0,
+        start_at_operation_time=None,
+    ):
+        self.name = name
+        self.collection = collection
+        self.on_upsert = on_upsert
+        self.on_delete = on_delete
+        self.on_load = on_load
+        self.on_reload = on_reload
+        self.projection = projection
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.timestamp_field = timestamp_field
+        self.marker = marker
+        self.full_scan_every = full_scan_every
+        self._start_at = start_at_operation_time
+        self._resume_token = None
+        self._needs_reload = False
+        self._task: Optional[asyncio.Task] = None
+
+        # état du polling, pris sur la lecture du chargement complet :
+        # _id -> empreinte du document, marqueurs, dernier timestamp vu
+        self._loaded = False
+        self._fingerprints: Dict[Any, str] = {}
+        self._markers: Dict[Any, Any] = {}
+        self._last_ts = None
+        self._polls = 0
+
+        # compteurs pour le monitoring
+        self.applied = 0
+        self.reloads = 0
+
+    # --- Cycle de vie --------------------------------------------------------
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "applied": self.applied, "reloads": self.reloads}
+
+    async def _run(self):
+        while True:
+            try:
+                if self.mode in ("auto", "watch"):
+                    await self._watch()
+                else:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if self.mode == "auto":
+                    # change streams non supportés (mongod standalone) -> polling
+                    print(f"⚠️ Sync {self.name}: change stream indisponible ({e}), bascule en polling")
+                    self.mode = "poll"
+                    continue
+                print(f"❌ Sync {self.name}: erreur change stream:", e)
+                if _history_lost(e):
+                    # reprendre au même jeton bouclerait indéfiniment :
+                    # rechargement complet puis nouveau flux
+                    self._resume_token = None
+                    self._start_at = None
+                    self._needs_reload = True
+                await asyncio.sleep(self.poll_interval)
+            except PyMongoError as e:
+                print(f"❌ Sync {self.name}: erreur MongoDB, nouvelle tentative:", e)
+                if self._resume_token is None:
+                    self._needs_reload = True
+                await asyncio.sleep(self.poll_interval)
+
+    # --- Change stream -------------------------------------------------------
+
+    async def _watch(self):
+        kwargs: Dict[str, Any] = {"full_document": "updateLookup"}
+        if self._resume_token is not None:
+            kwargs["resume_after"] = self._resume_token
+        elif self._needs_reload:
+            # reconnexion sans jeton : on resynchronise tout avant de suivre le flux
+            await self._reload()
+            self._needs_reload = False
+        elif self._start_at is not None:
+            # reprend juste avant le chargement initial : aucun changement perdu
+            kwargs["start_at_operation_time"] = self._start_at
+
+        async with self.collection.watch(**kwargs) as stream:
+            self.mode = "watch"
+            print(f"👀 Sync {self.name}: change stream ouvert")
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                self._apply_change(change)
+
+    def _apply_change(self, change: Dict[str, Any]):
+        op = change.get("operationType")
+        if op in ("insert", "update", "replace"):
+            doc = change.get("fullDocument")
+            if doc is None:
+                # document supprimé entre l'événement et le lookup
+                return
+            if self.projection:
+                doc = {k: v for k, v in doc.items() if k == "_id" or k in self.projection}
+            self.on_upsert(doc)
+            self.applied += 1
+        elif op == "delete":
+            self.on_delete(change["documentKey"]["_id"])
+            self.applied += 1
+        elif op in ("drop", "rename", "dropDatabase", "invalidate"):
+            # le flux n'est plus exploitable : resynchronisation complète au prochain tour
+            self._resume_token = None
+            self._needs_reload = True
+            raise PyMongoError(f"change stream invalidé ({op})")
+
+    async def load(self):
+        """
+        Chargement complet : lit la collection, passe les documents à on_load et
+        en fait l'état de référence du polling (même lecture, rien n'est perdu
+        entre les deux).
+        """
+        # marqueurs lus avant les documents : au pire un document est relu
+        markers = await self._fetch_markers() if self.marker else {}
+        docs = await _fetch(self.collection.find({}, self.projection))
+        result = self.on_load(docs)
+        if inspect.isawaitable(result):
+            await result
+        self._markers = markers
+        self._fingerprints = {}
+        self._last_ts = None
+        if self.mode != "watch":
+            # empreintes inutiles si l'on ne bascule jamais en polling
+            self._remember(docs)
+        self._loaded = True
+
+    async def _reload(self):
+        await self.load()
+        if self.on_reload is not None:
+            await self.on_reload()
+        self.reloads += 1
+
+    # --- Polling -------------------------------------------------------------
+
+    @staticmethod
+    def _fingerprint(doc: Dict[str, Any]) -> str:
+        return hashlib.sha1(repr(sorted(doc.items(), key=lambda kv: kv[0])).encode("utf-8")).hexdigest()
+
+    async def _poll(self):
+        if not self._loaded:
+            # pas de chargement complet préalable : sans lui, l'état de référence
+            # ne correspondrait pas au cache
+            await self._reload()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.poll_once()
+
+    def _remember(self, docs: List[Dict[str, Any]]):
+        for doc in docs:
+            self._fingerprints[doc["_id"]] = self._fingerprint(doc)
+            ts = doc.get(self.timestamp_field) if self.timestamp_field else None
+            if ts is not None and (self._last_ts is None or ts > self._last_ts):
+                self._last_ts = ts
+
+    async def _fetch_markers(self) -> Dict[Any, Any]:
+        rows = await _fetch(self.collection.aggregate([{"$project": {"_m": self.marker}}]))
+        return {row["_id"]: row.get("_m") for row in rows}
+
+    async def poll_once(self) -> int:
+        """
+        Un tour de polling. Renvoie le nombre de changements appliqués.
+        """
+        changes = 0
+        self._polls += 1
+        full_scan = bool(self.full_scan_every) and self._polls % self.full_scan_every == 0
+        if full_scan:
+            if self.marker:
+                self._markers = await self._fetch_markers()
+            docs = await _fetch(self.collection.find({}, self.projection))
+            ids = {d["_id"] for d in docs}
+        elif self.timestamp_field and self._last_ts is not None:
+            # seuls les documents modifiés depuis le dernier tour sont relus,
+            # les suppressions sont détectées sur la liste des _id
+            query = {self.timestamp_field: {"$gt": self._last_ts}}
+            docs = await _fetch(self.collection.find(query, self.projection))
+            ids = {d["_id"] for d in await _fetch(self.collection.find({}, {"_id": 1}))}
+        elif self.marker:
+            # _id + marqueur seulement ; documents relus si nouveaux ou marqueur changé
+            markers = await self._fetch_markers()
+            changed = [i for i, m in markers.items() if i not in self._markers or self._markers[i] != m]
+            docs = []
+            if changed:
+                docs = await _fetch(self.collection.find({"_id": {"$in": changed}}, self.projection))
+            self._markers = markers
+            ids = set(markers)
+        else:
+            docs = await _fetch(self.collection.find({}, self.projection))
+            ids = {d["_id"] for d in docs}
+
+        for doc in docs:
+            fp = self._fingerprint(doc)
+            if self._fingerprints.get(doc["_id"]) != fp:
+                self.on_upsert(doc)
+                changes += 1
+        self._remember(docs)
+
+        for doc_id in [i for i in self._fingerprints if i not in ids]:
+            del self._fingerprints[doc_id]
+            self.on_delete(doc_id)
+            changes += 1
+
+        self.applied += changes
+        return changes
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# les modules de l'API sont à la racine de Python/ (pas de package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
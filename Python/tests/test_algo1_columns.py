@@ -0,0 +1,114 @@
+import ast
+import random
+import re
+
+import numpy as np
+import pandas as pd
+
+from algo1 import clean_description_series, clean_year_series, normalize_actors_series, normalize_genres_series
+
+
+# --- Anciennes versions par ligne, gardées comme référence -----------------------
+
+def _clean_year(year):
+    if pd.isna(year):
+        return ""
+    y = str(year).strip()
+    if re.match(r"^\d+(\.0+)?$", y):
+        y = str(int(float(y)))
+    m = re.search(r"\b(19|20)\d{2}\b", y)
+    return m.group(0) if m else y
+
+
+def _normalize_genre_token(token):
+    t = str(token).lower().strip()
+    t = re.sub(r"[^a-z\s-]", " ", t)
+    t = re.sub(r"\s+", " ", t).strip()
+    t = t.replace("sci fi", "scifi").replace("science fiction", "scifi")
+    t = t.replace("romantic comedy", "romcom")
+    return t.replace("-", "")
+
+
+def _normalize_genres_sorted(genres_list):
+    if not genres_list:
+        return "", "", []
+    parts = sorted({p for p in (_normalize_genre_token(g) for g in genres_list if g.strip()) if p})
+    if not parts:
+        return "", "", []
+    return " ".join(parts), "".join(parts), parts
+
+
+COMBOS = [
+    ("drama", "romance"), ("comedy", "romance"), ("action", "scifi"), ("animation", "comedy"),
+    ("action", "comedy"), ("thriller", "horror"), ("crime", "thriller"), ("fantasy", "adventure"),
+    ("war", "drama"), ("western", "crime"), ("mystery", "thriller"), ("action", "adventure"),
+    ("comedy", "drama"), ("scifi", "thriller"), ("fantasy", "romance"),
+]
+
+
+def _add_special_combinations(genres_list):
+    gset = set(genres_list)
+    return " ".join(a + b for a, b in COMBOS if a in gset and b in gset)
+
+
+def _parse_actors(actors_str):
+    if not actors_str:
+        return []
+    s = str(actors_str).strip()
+    try:
+        parsed = ast.literal_eval(s)
+        actors = [str(a) for a in parsed] if isinstance(parsed, (list, tuple)) else [s]
+    except Exception:
+        actors = [a for a in s.split(",") if a.strip()]
+    out = []
+    for a in actors:
+        a = re.sub(r"[^a-z0-9]", "", a.strip().lower())
+        if a and a not in out:
+            out.append(a)
+    return out
+
+
+def _clean_description(desc):
+    desc = re.sub(r"[^a-zàâäéèêëîïôöùûüç\s-]", " ", str(desc).lower())
+    return re.sub(r"\s+", " ", desc).strip()
+
+
+# --- Jeu de données fixe ---------------------------------------------------------
+
+YEARS = [2016, 2016.0, "2016", "2016.0", " 1999 ", "sortie en 1987", "0042", "12345678901234567890",
+         "3000", "", None, np.nan, "n/a", "1999.5"]
+GENRES = ["Drama|Romance", "Science Fiction|Action", "sci-fi|Thriller|Horror", "Romantic Comedy|Comedy",
+          "War|Drama|drama", "", "  |  ", "Animation|Comedy|Action|Adventure", "Crime|Western|Mystery|Thriller",
+          "Fantasy|Romance|Adventure", "Comédie|Drame"]
+ACTORS = ["['Tom Hanks', 'Meg Ryan']", "['Tom Hanks', 'tom hanks', \"O'Neil\"]", "Jean Dujardin, Omar Sy",
+          "[]", "", "['Élodie Bouchez']", "['A\\'B', 'C']", "('x', 'y')", "[1, 2]", "['Robin Williams',]"]
+DESCRIPTIONS = ["Un film d'ACTION, 2h30 !", "  Élan   vers l'été ", "", "sci-fi & co.", "ÇA marche ?"]
+
+
+def _column(values, n=300, seed=0):
+    rng = random.Random(seed)
+    return pd.Series([rng.choice(values) for _ in range(n)], dtype=object)
+
+
+def test_clean_year_series_matches_per_row():
+    years = _column(YEARS)
+    assert clean_year_series(years).tolist() == [_clean_year(y) for y in years]
+
+
+def test_normalize_genres_series_matches_per_row():
+    genres = _column(GENRES, seed=1)
+    expected = []
+    for g in genres:
+        separated, combined, parts = _normalize_genres_sorted(g.split("|"))
+        expected.append([separated, combined, _add_special_combinations(parts)])
+    assert normalize_genres_series(genres).values.tolist() == expected
+
+
+def test_normalize_actors_series_matches_per_row():
+    actors = _column(ACTORS, seed=2)
+    assert normalize_actors_series(actors).tolist() == [" ".join(_parse_actors(a)) for a in actors]
+
+
+def test_clean_description_series_matches_per_row():
+    descriptions = _column(DESCRIPTIONS, seed=3)
+    assert clean_description_series(descriptions).tolist() == [_clean_description(d) for d in descriptions]
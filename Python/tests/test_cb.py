@@ -0,0 +1,125 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cb import DEFAULT_PER_FAV, ContentBasedRecommender
+
+WORDS = "space robot war love story pirate ship sea king queen city night dream ghost".split()
+
+
+def _text(rng):
+    return " ".join(rng.choices(WORDS, k=5))
+
+
+def _movies(n, rng):
+    return pd.DataFrame({
+        "movieId": range(n),
+        "title": [f"T{i}" for i in range(n)],
+        "description_clean": [_text(rng) for _ in range(n)],
+    })
+
+
+def _changes(n, rng):
+    changes = []
+    for _ in range(n):
+        mid = rng.randrange(0, 300)
+        if rng.random() < 0.2:
+            changes.append(("remove", mid, None, None))
+        else:
+            changes.append(("upsert", mid, f"T{rng.randrange(0, 350)}", _text(rng)))
+    return changes
+
+
+def _scores(reco, favorites):
+    return {r["movieId"]: r["score"] for r in reco.recommend_with_details(favorites, top_n=20)}
+
+
+@pytest.mark.parametrize("kwargs", [{"neighbors_k": 60}, {"neighbors_k": 60, "svd_components": 8}, {}])
+def test_apply_changes_matches_one_by_one_updates(kwargs):
+    rng = random.Random(0)
+    df = _movies(200, rng)
+    changes = _changes(300, rng)
+    one_by_one = ContentBasedRecommender(df, **kwargs)
+    batched = ContentBasedRecommender(df, **kwargs)
+    for op, mid, title, text in changes:
+        if op == "remove":
+            one_by_one.remove_movie(mid)
+        else:
+            one_by_one.update_movie(mid, title, text)
+    batched.apply_changes(changes)
+
+    active = lambda reco: reco.movies_df[reco.active].reset_index(drop=True)
+    assert active(one_by_one).equals(active(batched))
+    for favorites in (["T1", "T3"], ["T50"], ["T7", "T120"]):
+        expected, got = _scores(one_by_one, favorites), _scores(batched, favorites)
+        # mêmes scores ; seul l'ordre des ex aequo en fin de liste peut changer
+        assert np.allclose(sorted(expected.values()), sorted(got.values()), atol=1e-5)
+        assert all(abs(expected[m] - got[m]) < 1e-5 for m in expected.keys() & got.keys())
+
+
+def test_neighbors_k_is_raised_to_per_fav():
+    reco = ContentBasedRecommender(_movies(120, random.Random(1)), neighbors_k=10)
+    assert reco.neighbor_idx.shape[1] == DEFAULT_PER_FAV
+
+
+def test_ann_is_skipped_below_min_rows():
+    df = _movies(200, random.Random(2))
+    assert ContentBasedRecommender(df, ann="lsh").ann_index is None
+    reco = ContentBasedRecommender(df, ann="lsh", ann_min_rows=100)
+    assert reco.ann_index is not None
+    assert reco.recommend_from_titles(["T1"], top_n=5)
+
+
+def _reference_details(reco, favorites, top_n, per_fav, exclude_seen, aggregate_by):
+    # ancienne version (tri Python complet de chaque ligne de similarité), gardée comme référence
+    cosine_sim = (reco.tfidf_matrix @ reco.tfidf_matrix.T).toarray()
+    exclude_seen_set = set(exclude_seen or [])
+    candidates, sources, titles_map = {}, {}, {}
+    for fav in favorites:
+        if fav not in reco.title_to_index:
+            continue
+        idx = reco.title_to_index[fav]
+        count = 0
+        for i, score in sorted(enumerate(cosine_sim[idx]), key=lambda x: x[1], reverse=True):
+            if i == idx:
+                continue
+            movie_id = int(reco.movies_df.iloc[i]["movieId"])
+            if movie_id in exclude_seen_set:
+                continue
+            if aggregate_by == "sum":
+                candidates[movie_id] = candidates.get(movie_id, 0.0) + float(score)
+            else:
+                candidates[movie_id] = max(candidates.get(movie_id, 0.0), float(score))
+            sources.setdefault(movie_id, []).append(fav)
+            titles_map[movie_id] = reco.movies_df.iloc[i]["title"]
+            count += 1
+            if count >= per_fav:
+                break
+    ranked = sorted(candidates.items(), key=lambda x: x[1], reverse=True)[:top_n]
+    return [{"movieId": m, "title": titles_map[m], "score": s, "sources": sources[m]} for m, s in ranked]
+
+
+@pytest.mark.parametrize("aggregate_by", ["sum", "max"])
+def test_vectorized_scoring_matches_the_loop_implementation(aggregate_by):
+    rng = random.Random(3)
+    df = _movies(150, rng)
+    df.loc[10, "description_clean"] = df.loc[11, "description_clean"]  # descriptions identiques
+    reco = ContentBasedRecommender(df)
+    for favorites, exclude_seen in ((["T1", "T2", "T3"], None), (["T10", "T40"], [11, 12, 13]), (["T5"], [])):
+        expected = _reference_details(reco, favorites, 30, 20, exclude_seen, aggregate_by)
+        got = reco.recommend_with_details(
+            favorites, top_n=30, per_fav=20, exclude_seen=exclude_seen, aggregate_by=aggregate_by
+        )
+        assert np.allclose([r["score"] for r in got], [r["score"] for r in expected])
+        # mêmes films, titres et sources ; seul l'ordre des ex aequo peut changer
+        by_id = {r["movieId"]: r for r in got}
+        assert by_id.keys() == {r["movieId"] for r in expected}
+        for r in expected:
+            assert by_id[r["movieId"]]["title"] == r["title"]
+            assert by_id[r["movieId"]]["sources"] == r["sources"]
+            assert abs(by_id[r["movieId"]]["score"] - r["score"]) < 1e-9
+        assert reco.recommend_from_titles(
+            favorites, top_n=30, per_fav=20, exclude_seen=exclude_seen, aggregate_by=aggregate_by
+        ) == [r["movieId"] for r in got]
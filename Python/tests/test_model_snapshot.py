@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cb import ContentBasedRecommender
+from ibcf import ItemNeighborModel
+from model_snapshot import ModelSnapshot, load_models, save_models
+from ratings_store import RatingsMatrix
+from ubcf import UBCFEngine
+
+RATINGS = pd.DataFrame({
+    "userId": ["u1", "u1", "u1", "u2", "u2", "u3", "u3", "u3", "u4", "u4"],
+    "title": ["A", "B", "C", "A", "C", "B", "C", "D", "A", "D"],
+    "rating": [5.0, 3.0, 4.0, 4.0, 5.0, 2.0, 4.0, 5.0, 3.0, 4.0],
+})
+
+
+def _cb_state(movie_ids):
+    df = pd.DataFrame({
+        "movieId": movie_ids,
+        "title": ["A", "B", "C", "D"],
+        "description_clean": ["space robot", "space war", "love story", "robot love"],
+    })
+    reco = ContentBasedRecommender(df)
+    return {
+        "movies_df": reco.movies_df,
+        "tfidf_vect": reco.tfidf_vect,
+        "tfidf_matrix": reco.tfidf_matrix,
+        "active": reco.active,
+        "neighbor_idx": None,
+        "neighbor_sim": None,
+        "svd": None,
+        "embeddings": None,
+        "movieid_col": reco.movieid_col,
+        "title_col": reco.title_col,
+        "text_col": reco.text_col,
+    }
+
+
+def _is_mapped(array) -> bool:
+    # vue (éventuellement indirecte) sur un tableau memmap du snapshot
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def _save_and_load(tmp_path, movie_ids):
+    ratings = RatingsMatrix.from_dataframe(RATINGS)
+    save_models(str(tmp_path), ratings, ItemNeighborModel(ratings, k=2), _cb_state(movie_ids))
+    return ratings, load_models(ModelSnapshot(str(tmp_path)))
+
+
+def test_snapshot_ubcf_engine_maps_without_copying(tmp_path):
+    ratings, (engine, _, _) = _save_and_load(tmp_path, [1, 2, 3, 4])
+    # indicatrice et normes lues dans le snapshot, structure partagée avec la matrice
+    for array in (engine.matrix.data, engine.rated.data, engine.norms):
+        assert _is_mapped(array)
+    assert np.shares_memory(engine.rated.indices, engine.matrix.indices)
+    assert np.shares_memory(engine.rated.indptr, engine.matrix.indptr)
+
+    local = UBCFEngine(ratings)
+    for uid in ("u1", "u2", "u3", "u4"):
+        assert engine.recommend(uid, top_n=5, k=2) == local.recommend(uid, top_n=5, k=2)
+
+
+@pytest.mark.parametrize("movie_ids", [[1, 2, 3, 4], ["10", "20", "30", "40"], [1, "tt02", 3, "x4"]])
+def test_snapshot_keeps_movie_ids(tmp_path, movie_ids):
+    _, (_, _, reco) = _save_and_load(tmp_path, movie_ids)
+    recs = reco.recommend_from_titles(["A"], top_n=3)
+    assert len(recs) == 3
+    expected = {int(m) if str(m).isdigit() else m for m in movie_ids}
+    assert set(recs) <= expected
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pandas as pd
+
+from precomputed import PrecomputedStore, model_version
+from ratings_store import RatingsMatrix
+
+MOVIES = {
+    1: {"title": "A", "description_clean": "space robot"},
+    2: {"title": "B", "description_clean": "love story"},
+}
+RATINGS = pd.DataFrame({"userId": ["u1", "u1", "u2"], "title": ["A", "B", "A"], "rating": [5.0, 3.0, 4.0]})
+RECS = [(2, 0.9), (1, 0.5)]
+
+
+def _version(ratings=RATINGS, movies=MOVIES):
+    return model_version(RatingsMatrix.from_dataframe(ratings), movies)
+
+
+def test_model_version_ignores_load_order_and_tracks_data():
+    assert _version() == _version(RATINGS.iloc[::-1])
+    # un autre utilisateur note, un film change : nouvelle version
+    other = pd.concat([RATINGS, pd.DataFrame({"userId": ["u3"], "title": ["B"], "rating": [2.0]})])
+    assert _version(other) != _version()
+    assert _version(movies={**MOVIES, 2: {"title": "B", "description_clean": "war"}}) != _version()
+
+
+def test_lookup_rejects_rows_built_on_other_data(tmp_path):
+    path = str(tmp_path / "reco.db")
+    store = PrecomputedStore(path)
+    store.write(41, 2, [("u1", "fp", RECS)], _version())
+    store.close()
+
+    reader = PrecomputedStore(path, readonly=True)
+    assert reader.lookup("u1", 41, "fp", 2, _version()) == RECS
+    assert reader.lookup("u1", 41, "fp", 2, "autre") is None
+    assert reader.lookup("u1", 41, "autre", 2, _version()) is None
+    assert reader.stale == 2
+
+
+def test_table_without_model_version_is_stale(tmp_path):
+    path = str(tmp_path / "reco.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE recommendations (user_id TEXT NOT NULL, k INTEGER NOT NULL,"
+        " fingerprint TEXT NOT NULL, recs TEXT NOT NULL, PRIMARY KEY (user_id, k))"
+    )
+    conn.execute("INSERT INTO recommendations VALUES ('u1', 41, 'fp', '[[2, 0.9]]')")
+    conn.commit()
+    conn.close()
+
+    assert PrecomputedStore(path, readonly=True).lookup("u1", 41, "fp", 1, _version()) is None
+    # le job migre la table avant de la réécrire
+    writer = PrecomputedStore(path)
+    writer.write(41, 1, [("u1", "fp", RECS[:1])], _version())
+    assert writer.lookup("u1", 41, "fp", 1, _version()) == RECS[:1]
@@ -0,0 +1,294 @@
+import asyncio
+import datetime
+
+import mongomock
+import pytest
+from pymongo.errors import OperationFailure
+
+from movies_store import MOVIE_FIELDS, MOVIES_SYNC_MARKER, MoviesStore
+from ratings_store import RATES_SYNC_MARKER
+from sync import CollectionSync
+
+
+def _date(second):
+    return datetime.datetime(2024, 1, 1, 0, 0, second)
+
+
+def _rate_doc(i, note=3, second=1):
+    return {"_id": i, "userId": str(i), "ratings": [{"filmId": "1", "note": note, "date": _date(second)}]}
+
+
+class Cache:
+    """
+    Cache en mémoire alimenté par les callbacks de CollectionSync.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.loads = 0
+
+    def load(self, docs):
+        self.docs = {d["_id"]: d for d in docs}
+        self.loads += 1
+
+    def upsert(self, doc):
+        self.docs[doc["_id"]] = doc
+
+    def delete(self, doc_id):
+        self.docs.pop(doc_id, None)
+
+
+class CountingCollection:
+    """
+    Collection mongomock qui enregistre les filtres de find().
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.finds = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def find(self, *args, **kwargs):
+        self.finds.append(args[0] if args else {})
+        return self.collection.find(*args, **kwargs)
+
+
+def _rates_sync(collection, cache, **kwargs):
+    kwargs.setdefault("poll_interval", 0)
+    return CollectionSync(
+        "rates", collection, cache.upsert, cache.delete, cache.load,
+        projection={"userId": 1, "ratings": 1}, mode="poll", **kwargs
+    )
+
+
+# --- Polling ------------------------------------------------------------------
+
+@pytest.mark.parametrize("marker", [None, RATES_SYNC_MARKER])
+def test_poll_sees_writes_between_load_and_first_poll(marker):
+    collection = mongomock.MongoClient().db.rates
+    collection.insert_many([_rate_doc(i) for i in range(5)])
+    cache = Cache()
+    sync = _rates_sync(collection, cache, marker=marker)
+
+    async def scenario():
+        await sync.load()
+        collection.update_one({"_id": 2}, {"$set": {"ratings.0.note": 5, "ratings.0.date": _date(2)}})
+        collection.insert_one(_rate_doc(9))
+        collection.delete_one({"_id": 4})
+        return await sync.poll_once()
+
+    assert asyncio.run(scenario()) == 3
+    assert cache.docs[2]["ratings"][0]["note"] == 5
+    assert 9 in cache.docs and 4 not in cache.docs
+    assert cache.docs == {d["_id"]: d for d in collection.find({}, {"userId": 1, "ratings": 1})}
+
+
+def test_poll_marker_reads_only_changed_documents():
+    collection = CountingCollection(mongomock.MongoClient().db.rates)
+    collection.insert_many([_rate_doc(i) for i in range(5)])
+    cache = Cache()
+    sync = _rates_sync(collection, cache, marker=RATES_SYNC_MARKER)
+
+    async def scenario():
+        await sync.load()
+        collection.finds.clear()
+        idle = await sync.poll_once()
+        idle_finds = list(collection.finds)
+        collection.update_one({"_id": 1}, {"$push": {"ratings": {"filmId": "2", "note": 4, "date": _date(3)}}})
+        collection.finds.clear()
+        changed = await sync.poll_once()
+        return idle, idle_finds, changed, list(collection.finds)
+
+    idle, idle_finds, changed, finds = asyncio.run(scenario())
+    assert (idle, idle_finds) == (0, [])
+    assert changed == 1
+    assert finds == [{"_id": {"$in": [1]}}]
+
+
+def test_poll_movies_marker_updates_the_store():
+    collection = CountingCollection(mongomock.MongoClient().db.movies)
+    collection.insert_many([
+        {"_id": i, "movieId": i, "title": f"M{i}", "description": "un film", "description_clean": "film"}
+        for i in range(4)
+    ])
+    store = MoviesStore()
+    sync = CollectionSync(
+        "movies", collection, store.upsert_doc, store.remove_doc, store.load,
+        projection={f: 1 for f in MOVIE_FIELDS}, mode="poll", poll_interval=0, marker=MOVIES_SYNC_MARKER,
+    )
+
+    async def scenario():
+        await sync.load()
+        collection.update_one({"_id": 2}, {"$set": {"description_clean": "film pirate"}})
+        collection.delete_one({"_id": 3})
+        collection.finds.clear()
+        return await sync.poll_once()
+
+    assert asyncio.run(scenario()) == 2
+    assert collection.finds == [{"_id": {"$in": [2]}}]
+    snap = store.snapshot()
+    assert snap.movies_map[2]["description_clean"] == "film pirate"
+    assert set(snap.movies_map) == {0, 1, 2}
+
+
+def test_poll_full_scan_catches_changes_the_marker_misses():
+    collection = mongomock.MongoClient().db.rates
+    collection.insert_many([_rate_doc(i) for i in range(3)])
+    cache = Cache()
+    sync = _rates_sync(collection, cache, marker=RATES_SYNC_MARKER, full_scan_every=2)
+
+    async def scenario():
+        await sync.load()
+        # même nombre de notes, même somme, même date : marqueur inchangé
+        collection.update_one({"_id": 0}, {"$set": {"ratings.0.filmId": "7"}})
+        return await sync.poll_once(), await sync.poll_once()
+
+    assert asyncio.run(scenario()) == (0, 1)
+    assert cache.docs[0]["ratings"][0]["filmId"] == "7"
+
+
+def test_poll_restart_keeps_the_loaded_baseline():
+    collection = mongomock.MongoClient().db.rates
+    cache = Cache()
+    sync = _rates_sync(collection, cache, poll_interval=0.01)
+
+    async def scenario():
+        await sync.load()  # collection vide
+        collection.insert_one(_rate_doc(1))
+        sync.start()
+        await asyncio.sleep(0.1)
+        await sync.stop()
+
+    asyncio.run(scenario())
+    assert 1 in cache.docs
+    assert cache.loads == 1
+
+
+def test_poll_without_load_loads_first():
+    collection = mongomock.MongoClient().db.rates
+    collection.insert_many([_rate_doc(i) for i in range(2)])
+    cache = Cache()
+    sync = _rates_sync(collection, cache, poll_interval=0.01)
+
+    async def scenario():
+        sync.start()
+        await asyncio.sleep(0.05)
+        await sync.stop()
+
+    asyncio.run(scenario())
+    assert set(cache.docs) == {0, 1}
+    assert sync.reloads == 1
+
+
+# --- Change stream --------------------------------------------------------------
+
+class FakeStream:
+    """
+    Change stream scripté : rejoue les événements prévus pour cette ouverture,
+    puis lève l'erreur prévue (ou attend indéfiniment).
+    """
+
+    def __init__(self, opening, kwargs):
+        self.events = list(opening.get("events", []))
+        self.error = opening.get("error")
+        self.open_error = opening.get("open_error")
+        self.kwargs = kwargs
+        self.resume_token = None
+
+    async def __aenter__(self):
+        if self.open_error is not None:
+            raise self.open_error
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.events:
+            event = self.events.pop(0)
+            self.resume_token = {"_data": id(event)}
+            return event
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        await asyncio.sleep(3600)
+
+
+class FakeWatchCollection:
+    def __init__(self, docs, openings):
+        self.docs = docs
+        self.openings = list(openings)
+        self.watch_calls = []
+
+    def find(self, *args, **kwargs):
+        return [dict(d) for d in self.docs]
+
+    def watch(self, **kwargs):
+        self.watch_calls.append(kwargs)
+        opening = self.openings.pop(0) if self.openings else {}
+        return FakeStream(opening, kwargs)
+
+
+def _watch_sync(collection, cache, reloads):
+    async def on_reload():
+        reloads.append(1)
+
+    return CollectionSync(
+        "movies", collection, cache.upsert, cache.delete, cache.load, on_reload,
+        mode="watch", poll_interval=0.01, start_at_operation_time="t0",
+    )
+
+
+def test_watch_applies_insert_update_delete():
+    collection = FakeWatchCollection([{"_id": 1, "title": "A"}, {"_id": 2, "title": "B"}], [{"events": [
+        {"operationType": "insert", "fullDocument": {"_id": 3, "title": "C"}},
+        {"operationType": "update", "fullDocument": {"_id": 1, "title": "A2"}},
+        {"operationType": "delete", "documentKey": {"_id": 2}},
+    ]}])
+    cache, reloads = Cache(), []
+    sync = _watch_sync(collection, cache, reloads)
+
+    async def scenario():
+        await sync.load()
+        sync.start()
+        await asyncio.sleep(0.05)
+        await sync.stop()
+
+    asyncio.run(scenario())
+    assert cache.docs == {1: {"_id": 1, "title": "A2"}, 3: {"_id": 3, "title": "C"}}
+    assert collection.watch_calls[0]["start_at_operation_time"] == "t0"
+    assert sync.applied == 3 and reloads == []
+
+
+def test_watch_history_lost_reloads_and_opens_a_fresh_stream():
+    docs = [{"_id": 1, "title": "A"}]
+    collection = FakeWatchCollection(docs, [
+        # premier flux : un événement, puis coupure (reprise au jeton)
+        {"events": [{"operationType": "insert", "fullDocument": {"_id": 2, "title": "B"}}],
+         "error": OperationFailure("interrupted", code=1)},
+        # reprise impossible : l'oplog ne contient plus le jeton
+        {"open_error": OperationFailure("history lost", code=286)},
+    ])
+    cache, reloads = Cache(), []
+    sync = _watch_sync(collection, cache, reloads)
+
+    async def scenario():
+        await sync.load()
+        # écrit pendant la coupure, absent de tout flux : seul le rechargement le voit
+        docs.append({"_id": 3, "title": "C"})
+        sync.start()
+        await asyncio.sleep(0.2)
+        await sync.stop()
+
+    asyncio.run(scenario())
+    assert set(cache.docs) == {1, 3}
+    assert "resume_after" in collection.watch_calls[1]
+    assert len(collection.watch_calls) == 3
+    assert "resume_after" not in collection.watch_calls[2]
+    assert "start_at_operation_time" not in collection.watch_calls[2]
+    assert reloads == [1] and cache.loads == 2
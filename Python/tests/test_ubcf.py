@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from ratings_store import RatingsMatrix
+from ubcf import UBCFEngine
+
+
+def _ratings(seed=0, n_users=40, n_titles=60, density=0.25):
+    rng = np.random.default_rng(seed)
+    rows = [
+        {"userId": f"u{u}", "title": f"T{t}", "rating": float(rng.integers(1, 11)) / 2}
+        for u in range(n_users) for t in range(n_titles) if rng.random() < density
+    ]
+    return pd.DataFrame(rows)
+
+
+def _reference_ubcf(df, user_id, top_n=10, k=20):
+    # ancienne version (boucles sur les films et les voisins), gardée comme référence
+    ratings_matrix = df.pivot_table(index="userId", columns="title", values="rating", fill_value=0)
+    user_sim = pd.DataFrame(
+        cosine_similarity(ratings_matrix.values.astype("float32")),
+        index=ratings_matrix.index, columns=ratings_matrix.index,
+    )
+    user_ratings = ratings_matrix.loc[user_id]
+    neighbors = user_sim.loc[user_id].sort_values(ascending=False).drop(user_id).head(k)
+    scores = {}
+    for film in ratings_matrix.columns:
+        if user_ratings[film] == 0:
+            num, den = 0.0, 0.0
+            for neighbor_id, sim in neighbors.items():
+                r = ratings_matrix.loc[neighbor_id, film]
+                if r > 0:
+                    num += sim * r
+                    den += abs(sim)
+            if den > 0:
+                scores[film] = num / den
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+
+def test_engine_matches_the_loop_implementation():
+    df = _ratings()
+    engine = UBCFEngine(RatingsMatrix.from_dataframe(df))
+    for user_id in ("u0", "u7", "u19", "u33"):
+        for k in (5, 20):
+            expected = dict(_reference_ubcf(df, user_id, top_n=100, k=k))
+            got = dict(engine.recommend(user_id, top_n=100, k=k))
+            # mêmes films et mêmes scores ; seul l'ordre des ex aequo peut changer
+            assert expected.keys() == got.keys()
+            assert all(abs(expected[t] - got[t]) < 1e-5 for t in expected)
+            top = [score for _, score in engine.recommend(user_id, top_n=10, k=k)]
+            assert np.allclose(top, [score for _, score in _reference_ubcf(df, user_id, top_n=10, k=k)], atol=1e-5)
@@ -0,0 +1,29 @@
+import numpy as np
+
+
+def top_k_rows(sims: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices des k plus grandes valeurs de chaque ligne, triés par score
+    décroissant puis par indice croissant (même ordre qu'un tri stable).
+    """
+    n_rows, n_cols = sims.shape
+    kth = np.partition(sims, n_cols - k, axis=1)[:, n_cols - k][:, None]
+    greater = sims > kth
+    ties = sims == kth
+    need = k - greater.sum(axis=1, keepdims=True)
+    # à égalité avec le k-ième score, on garde les plus petits indices
+    keep = greater | (ties & (np.cumsum(ties, axis=1) <= need))
+    cols = np.nonzero(keep)[1].reshape(n_rows, k)
+    vals = np.take_along_axis(sims, cols, axis=1)
+    order = np.argsort(-vals, axis=1, kind="stable")
+    return np.take_along_axis(cols, order, axis=1)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Version 1-D de top_k_rows (k est borné à la taille du vecteur).
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    return top_k_rows(scores[None, :], k)[0]
@@ -1,7 +1,106 @@
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 from scipy.sparse import csr_matrix
 
+from ratings_store import RatingsMatrix
+from topk import top_k_rows
+
+
+class UBCFEngine:
+    """
+    UBCF sur matrice creuse : seules les lignes de similarité des utilisateurs
+    cibles sont calculées, puis toutes les prédictions en un produit creux.
+    """
+
+    def __init__(self, ratings: RatingsMatrix, batch_size: int = 256,
+                 rated_data: Optional[np.ndarray] = None, norms: Optional[np.ndarray] = None):
+        """
+        rated_data / norms : indicatrice "a noté" (alignée sur matrix.data) et
+        normes des lignes déjà calculées, lues dans un snapshot partagé ;
+        sinon calculées ici.
+        """
+        self.ratings = ratings
+        self.batch_size = batch_size
+        # pas de copie si la matrice est déjà en float64 (snapshot partagé)
+        self.matrix = ratings.matrix.astype(np.float64, copy=False).tocsr()
+
+        # indicatrice "a noté" (note > 0) pour le dénominateur : même structure
+        # que la matrice (indices / indptr partagés), seules les valeurs diffèrent
+        if rated_data is None:
+            rated_data = (self.matrix.data > 0).astype(np.float64)
+        self.rated = csr_matrix((rated_data, self.matrix.indices, self.matrix.indptr),
+                                shape=self.matrix.shape, copy=False)
+
+        if norms is None:
+            norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        self.norms = norms
+
+    def similarity_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Similarité cosinus entre les utilisateurs `rows` et tous les utilisateurs.
+        """
+        dots = (self.matrix[rows] @ self.matrix.T).toarray()
+        denom = self.norms[rows][:, None] * self.norms[None, :]
+        return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+    def _predict(self, rows: np.ndarray, k: int):
+        """
+        Scores prédits pour un lot d'utilisateurs : (numérateurs, dénominateurs),
+        chacun de forme len(rows) × films.
+        """
+        sims = self.similarity_rows(rows)
+        k = min(k, sims.shape[1] - 1)
+        if k <= 0:
+            empty = np.zeros((len(rows), self.matrix.shape[1]))
+            return empty, empty
+        batch = np.arange(len(rows))
+        sims[batch, rows] = -np.inf  # soi-même exclu
+        neighbors = top_k_rows(sims, k)
+
+        # poids creux : sim sur les k voisins de chaque utilisateur, 0 ailleurs
+        weights = csr_matrix(
+            (np.take_along_axis(sims, neighbors, axis=1).ravel(),
+             (np.repeat(batch, neighbors.shape[1]), neighbors.ravel())),
+            shape=sims.shape,
+        )
+        # Σ sim·r / Σ |sim| sur les voisins ayant noté le film
+        num = (weights @ self.matrix).toarray()
+        den = (abs(weights) @ self.rated).toarray()
+        return num, den
+
+    def recommend_many(self, user_object_ids: List[Any], top_n=10, k=20) -> Dict[Any, List[Tuple[str, float]]]:
+        """
+        Recommandations pour plusieurs utilisateurs, par lots de batch_size :
+        similarités et prédictions en produits matrice × matrice creux.
+        """
+        results: Dict[Any, List[Tuple[str, float]]] = {}
+        known = []
+        for uid in user_object_ids:
+            row = self.ratings.user_to_row.get(uid)
+            if row is None:
+                print(f"❌ UBCF: userId {uid} introuvable dans le CSV")
+                results[uid] = []
+            else:
+                known.append((uid, row))
+
+        titles = self.ratings.titles
+        for start in range(0, len(known), self.batch_size):
+            chunk = known[start:start + self.batch_size]
+            rows = np.asarray([row for _, row in chunk], dtype=np.int64)
+            num, den = self._predict(rows, k)
+            user_rows = self.matrix[rows].toarray()
+            for i, (uid, _) in enumerate(chunk):
+                # films non notés par l'utilisateur et notés par au moins un voisin
+                candidates = np.flatnonzero((user_rows[i] == 0) & (den[i] > 0))
+                scores = num[i, candidates] / den[i, candidates]
+                order = np.lexsort((candidates, -scores))[:top_n]
+                results[uid] = [(titles[candidates[j]], float(scores[j])) for j in order]
+        return results
+
+    def recommend(self, user_object_id, top_n=10, k=20):
+        return self.recommend_many([user_object_id], top_n=top_n, k=k)[user_object_id]
+
+
 def recommender_ubcf_direct(df, user_object_id, top_n=10, k=20):
     """
     UBCF – User-Based Collaborative Filtering optimisé
@@ -10,61 +109,8 @@ def recommender_ubcf_direct(df, user_object_id, top_n=10, k=20):
     if df.empty:
         return []
 
-    # Matrice utilisateurs × films
-    ratings_matrix = df.pivot_table(
-        index="userId",
-        columns="title",
-        values="rating",
-        fill_value=0
-    )
-
-    if ratings_matrix.empty:
-        return []
-
-    # Vérifier que l'userId existe
-    if user_object_id not in ratings_matrix.index:
-        print(f"❌ UBCF: userId {user_object_id} introuvable dans le CSV")
+    ratings = RatingsMatrix.from_dataframe(df)
+    if ratings.matrix.shape[0] == 0 or ratings.matrix.shape[1] == 0:
         return []
 
-    # Convertir en float32 pour réduire la mémoire
-    ratings_matrix = ratings_matrix.astype("float32")
-
-    # Transformer en matrice creuse
-    sparse_matrix = csr_matrix(ratings_matrix.values)
-
-    # Similarité utilisateur-utilisateur (matrice creuse)
-    user_sim_sparse = cosine_similarity(sparse_matrix, dense_output=False)
-
-    # Convertir en DataFrame
-    user_sim_df = pd.DataFrame(
-        user_sim_sparse.toarray(),  # ⚠️ tu peux éviter toarray() si tu veux rester en sparse
-        index=ratings_matrix.index,
-        columns=ratings_matrix.index
-    )
-
-    # Récupérer les notes de l'utilisateur
-    user_ratings = ratings_matrix.loc[user_object_id]
-
-    # k voisins les plus proches
-    neighbors = (
-        user_sim_df.loc[user_object_id]
-        .sort_values(ascending=False)
-        .drop(user_object_id)
-        .head(k)
-    )
-
-    scores = {}
-
-    # Prédiction des films non notés
-    for film in ratings_matrix.columns:
-        if user_ratings[film] == 0:
-            num, den = 0.0, 0.0
-            for neighbor_id, sim in neighbors.items():
-                r = ratings_matrix.loc[neighbor_id, film]
-                if r > 0:
-                    num += sim * r
-                    den += abs(sim)
-            if den > 0:
-                scores[film] = num / den
-
-    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
+    return UBCFEngine(ratings).recommend(user_object_id, top_n=top_n, k=k)
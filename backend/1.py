@@ -1,6 +1,7 @@
 import os
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
+from algorithms.enriched_store import load_enriched
 
 def recommender_ibcf_direct(df, user_id, top_n=10, k=5):
     ratings_matrix = df.pivot_table(index="userId", columns="title", values="rating", fill_value=0)
@@ -27,8 +28,10 @@ def recommender_ibcf_direct(df, user_id, top_n=10, k=5):
 BASE_DIR = os.path.dirname(__file__)   # dossier où se trouve ce script
 CSV_PATH = os.path.join(BASE_DIR, "movies_enriched.csv")
 
-# Charger le CSV
-df_full = pd.read_csv(CSV_PATH, encoding="utf-8", sep=",", on_bad_lines="skip")
+# Charger les notes et les seuls titres des films (movies_enriched.columns/, sinon
+# movies_enriched.ratings.csv + movies_enriched.movies.csv, sinon le CSV large)
+df_full = load_enriched(CSV_PATH)
+df_full["rating"] = df_full["rating"].astype("float64")  # float32 dans le format colonnaire
 
 # Exemple d’appel
 recs = recommender_ibcf_direct(df_full, user_id="6924d13a738e233a54b07eb7", top_n=20, k=41)
@@ -1,49 +1,322 @@
+import asyncio
+import functools
+import json
 import os
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+
+from algorithms.enriched_store import dataset_paths, save_dataset, split_enriched
 
 # ⚠️ Mets ta clé API TMDB ici
-TMDB_API_KEY = "b49fefb44a18788dbe8187f4521791ea"
-BASE_URL = "https://api.themoviedb.org/3"
-
-def search_movie(title, year=None):
-    """Recherche un film par titre et année optionnelle"""
-    params = {
-        "api_key": TMDB_API_KEY,
-        "query": title,
-    }
-    if year and not pd.isna(year):
+TMDB_API_KEY = os.getenv("TMDB_API_KEY", "b49fefb44a18788dbe8187f4521791ea")
+# surchargeable pour pointer sur un serveur de test local à la place de TMDB
+BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+
+# Statuts à réessayer : limite de débit et erreurs serveur
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Cache disque des réponses TMDB (vide = pas de cache) et durée de validité
+TMDB_CACHE_DB = os.getenv("TMDB_CACHE_DB", "tmdb_cache.sqlite")
+TMDB_CACHE_TTL = float(os.getenv("TMDB_CACHE_TTL_DAYS", "30")) * 86400
+
+
+class ResponseCache:
+    """
+    Réponses TMDB sur disque (SQLite), clé = (endpoint, paramètres sans la clé
+    d'API). Une réponse plus vieille que ttl secondes est redemandée.
+    """
+
+    def __init__(self, path: str, ttl: float = TMDB_CACHE_TTL):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        # compteurs pour le rapport
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def key(path: str, params: dict) -> str:
+        return json.dumps([path, sorted((k, v) for k, v in params.items() if k != "api_key")], ensure_ascii=False, default=str)
+
+    def get(self, key: str):
+        row = self._conn.execute("SELECT body, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        if time.time() - row[1] > self.ttl:
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, data):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def close(self):
+        self._conn.close()
+
+
+class Checkpoint:
+    """
+    Films déjà enrichis, ajoutés en JSON-lines au fil du traitement (écrits
+    tous les `every` films) : une exécution interrompue reprend là où elle
+    s'est arrêtée. Une ligne tronquée par un arrêt brutal est ignorée.
+    """
+
+    def __init__(self, path: str, every: int = 25):
+        self.path = path
+        self.every = every
+        self._pending = []
+
+    def load(self):
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                done[entry.pop("movieId")] = entry
+        return done
+
+    def add(self, movie_id, details):
+        movie_id = movie_id.item() if hasattr(movie_id, "item") else movie_id
+        self._pending.append({"movieId": movie_id, **details})
+        if len(self._pending) >= self.every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for entry in self._pending:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending = []
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class TokenBucket:
+    """
+    Limiteur de débit : rate jetons par seconde, au plus burst d'avance.
+    Chaque requête consomme un jeton ; sans jeton disponible, elle attend.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TMDBClient:
+    """
+    Client TMDB asynchrone : une session requests partagée (connexions
+    réutilisées), au plus `concurrency` requêtes en vol, débit limité par un
+    TokenBucket, et réessais avec backoff exponentiel (Retry-After respecté).
+    Avec un ResponseCache, une réponse encore valide n'est pas redemandée.
+
+    Les appels requests (bloquants) tournent volontairement dans un pool de
+    `concurrency` threads dédié : le script garde requests comme seule
+    dépendance HTTP, et le goulot est la limite de débit de TMDB, pas le
+    coût d'un thread par requête en vol.
+    """
+
+    def __init__(self, api_key: str = TMDB_API_KEY, base_url: str = BASE_URL, concurrency: int = 8,
+                 rate: float = 20.0, burst: int = 20, retries: int = 4, backoff: float = 0.5,
+                 timeout: float = 10.0, cache: ResponseCache = None):
+        self.api_key = api_key
+        self.cache = cache
+        self.concurrency = concurrency
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # un thread par requête en vol (l'exécuteur par défaut d'asyncio est plus petit)
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="tmdb")
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst)
+
+        # compteurs pour le rapport
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    async def get(self, path: str, **params):
+        """
+        GET {base_url}{path} -> JSON ; lève la dernière erreur une fois les réessais épuisés.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(path, params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        params = {"api_key": self.api_key, **params}
+        for attempt in range(self.retries + 1):
+            delay = None
+            async with self._semaphore:
+                await self._bucket.acquire()
+                self.requests += 1
+                try:
+                    response = await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(
+                        self.session.get, f"{self.base_url}{path}", params=params, timeout=self.timeout
+                    ))
+                    if response.status_code not in RETRY_STATUSES:
+                        try:
+                            response.raise_for_status()
+                        except requests.HTTPError:
+                            # 4xx hors 429 : inutile de réessayer
+                            self.failures += 1
+                            raise
+                        data = response.json()
+                        if key is not None:
+                            self.cache.put(key, data)
+                        return data
+                    error = requests.HTTPError(f"{response.status_code} pour {path}", response=response)
+                    retry_after = response.headers.get("Retry-After")
+                    if retry_after and retry_after.isdigit():
+                        delay = float(retry_after)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+            if attempt == self.retries:
+                break
+            self.retried += 1
+            # backoff exponentiel avec gigue, hors du sémaphore
+            await asyncio.sleep(delay if delay is not None else self.backoff * 2 ** attempt * (1 + random.random()))
+        self.failures += 1
+        raise error
+
+    async def search_movie(self, title, year=None):
+        """Recherche un film par titre et année optionnelle"""
+        params = {"query": title}
+        if year and not pd.isna(year):
+            try:
+                params["year"] = int(float(year))
+            except ValueError:
+                pass
+        data = await self.get("/search/movie", **params)
+        if data.get("results"):
+            return data["results"][0]
+        return None
+
+    async def get_movie_details(self, movie_id):
+        """Récupère la description, les acteurs principaux et le backdrop"""
+        details, credits = await asyncio.gather(
+            self.get(f"/movie/{movie_id}", language="fr-FR"),
+            self.get(f"/movie/{movie_id}/credits"),
+        )
+
+        actors = [cast["name"] for cast in credits.get("cast", [])[:5]]
+
+        return {
+            "description": details.get("overview", "Description indisponible"),
+            "actors": actors,
+            "backdrop": f"https://image.tmdb.org/t/p/w780{details.get('backdrop_path')}" if details.get("backdrop_path") else None
+        }
+
+    async def enrich_movie(self, title, year):
+        """
+        Détails TMDB d'un film ; None s'il est introuvable.
+        """
+        movie = await self.search_movie(title, year)
+        if movie:
+            return await self.get_movie_details(movie["id"])
+        return None
+
+
+NOT_FOUND = {"description": "Film introuvable sur TMDB", "actors": [], "backdrop": None}
+
+
+async def fetch_movies(movies: pd.DataFrame, client: TMDBClient, checkpoint: Checkpoint = None):
+    """
+    Enrichit chaque film (une ligne par movieId) en parallèle : {movieId: détails}.
+    Un film en échec après les réessais est traité comme introuvable, sans
+    être mis dans le checkpoint (il sera retenté à la prochaine exécution).
+    """
+    results = {}
+    done = 0
+    start = time.perf_counter()
+
+    async def one(movie_id, title, year):
+        nonlocal done
         try:
-            params["year"] = int(float(year))
-        except ValueError:
-            pass
-    response = requests.get(f"{BASE_URL}/search/movie", params=params)
-    data = response.json()
-    if data.get("results"):
-        return data["results"][0]
-    return None
-
-def get_movie_details(movie_id):
-    """Récupère la description, les acteurs principaux et le backdrop"""
-    details = requests.get(
-        f"{BASE_URL}/movie/{movie_id}",
-        params={"api_key": TMDB_API_KEY, "language": "fr-FR"}
-    ).json()
-
-    credits = requests.get(
-        f"{BASE_URL}/movie/{movie_id}/credits",
-        params={"api_key": TMDB_API_KEY}
-    ).json()
-
-    actors = [cast["name"] for cast in credits.get("cast", [])[:5]]
-
-    return {
-        "description": details.get("overview", "Description indisponible"),
-        "actors": actors,
-        "backdrop": f"https://image.tmdb.org/t/p/w780{details.get('backdrop_path')}" if details.get("backdrop_path") else None
-    }
-
-def enrich_movies(csv_path):
+            results[movie_id] = await client.enrich_movie(title, year) or NOT_FOUND
+            if checkpoint is not None:
+                checkpoint.add(movie_id, results[movie_id])
+        except Exception as e:
+            print(f"❌ {title}: {e}")
+            results[movie_id] = NOT_FOUND
+        done += 1
+        if done % 50 == 0:
+            print(f"🎬 {done}/{len(movies)} films ({done / (time.perf_counter() - start):.1f} films/s)")
+
+    year_col = movies["year"] if "year" in movies.columns else pd.Series(None, index=movies.index)
+    pending = zip(movies["movieId"], movies["title"], year_col)
+
+    # chaque worker traite un film de bout en bout avant de prendre le suivant :
+    # les films se terminent (et partent au checkpoint) au fil de l'eau
+    async def worker():
+        for movie_id, title, year in pending:
+            await one(movie_id, title, year)
+
+    await asyncio.gather(*(worker() for _ in range(client.concurrency)))
+    return results
+
+
+def checkpoint_path_for(csv_path):
+    return f"{csv_path}.checkpoint.jsonl"
+
+
+def enrich_movies(csv_path, concurrency=8, rate=20.0, cache_path=TMDB_CACHE_DB, cache_ttl=TMDB_CACHE_TTL):
     """Lit le CSV et enrichit chaque film avec TMDB"""
     # Vérifie que le fichier existe
     if not os.path.exists(csv_path):
@@ -51,50 +324,74 @@ def enrich_movies(csv_path):
 
     df = pd.read_csv(csv_path)
 
-    enriched_data = []
-    for _, row in df.iterrows():
-        title = row["title"]
-        year = row.get("year", None)
+    # Une ligne par note : chaque film n'est demandé qu'une fois à TMDB
+    movies = df.drop_duplicates(subset="movieId")
 
-        movie = search_movie(title, year)
-        if movie:
-            details = get_movie_details(movie["id"])
-            enriched_data.append({
-                "movieId": row["movieId"],
-                "title": title,
-                "genres": row["genres"],
-                "year": row["year"],
-                "description": details["description"],
-                "actors": details["actors"],
-                "backdrop": details["backdrop"],
-                "userId": row["userId"],
-                "rating": row["rating"]
-            })
-        else:
-            enriched_data.append({
-                "movieId": row["movieId"],
-                "title": title,
-                "genres": row["genres"],
-                "year": row["year"],
-                "description": "Film introuvable sur TMDB",
-                "actors": [],
-                "backdrop": None,
-                "userId": row["userId"],
-                "rating": row["rating"]
-            })
-
-    return pd.DataFrame(enriched_data)
+    # Reprise : les films du checkpoint ne sont pas redemandés
+    checkpoint = Checkpoint(checkpoint_path_for(csv_path))
+    details = checkpoint.load()
+    todo = movies[~movies["movieId"].isin(list(details))]
+    print(f"📊 {len(df)} lignes, {len(movies)} films distincts, {len(movies) - len(todo)} repris du checkpoint")
+
+    cache = ResponseCache(cache_path, cache_ttl) if cache_path else None
+
+    async def run():
+        client = TMDBClient(concurrency=concurrency, rate=rate, burst=max(int(rate), 1), cache=cache)
+        try:
+            return await fetch_movies(todo, client, checkpoint), client
+        finally:
+            checkpoint.flush()
+            client.close()
+
+    start = time.perf_counter()
+    try:
+        fetched, client = asyncio.run(run())
+    finally:
+        if cache is not None:
+            cache.close()
+    details.update(fetched)
+    elapsed = time.perf_counter() - start
+    rows = int(df["movieId"].isin(list(fetched)).sum())
+    print(
+        f"✅ {len(todo)} films en {elapsed:.1f}s ({len(todo) / max(elapsed, 1e-9):.1f} films/s, "
+        f"{rows / max(elapsed, 1e-9):.0f} lignes/s) : {client.requests} requêtes, "
+        f"{client.retried} réessais, {client.failures} échecs"
+    )
+    if cache is not None:
+        print(f"🗄️ Cache TMDB: {cache.hit_rate():.1%} de hits ({cache.hits} hits, {cache.misses} misses, {cache.expired} expirés)")
+
+    per_row = df["movieId"].map(details)
+    return pd.DataFrame({
+        "movieId": df["movieId"],
+        "title": df["title"],
+        "genres": df["genres"],
+        "year": df["year"],
+        "description": [d["description"] for d in per_row],
+        "actors": [d["actors"] for d in per_row],
+        "backdrop": [d["backdrop"] for d in per_row],
+        "userId": df["userId"],
+        "rating": df["rating"],
+    })
 
 if __name__ == "__main__":
     # Force le dossier courant = backend
-    os.chdir(os.path.dirname(__file__))
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-    # Ton fichier CSV est dans backend/
-    csv_file = "movies_Moundir_Sami.csv"
+    # Ton fichier CSV est dans backend/ ; concurrence et débit (requêtes/s) en option
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else "movies_Moundir_Sami.csv"
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
 
-    enriched_df = enrich_movies(csv_file)
+    enriched_df = enrich_movies(csv_file, concurrency, rate)
     print(enriched_df.head())
 
-    # Sauvegarde un nouveau CSV enrichi
+    # Sauvegarde le CSV enrichi (lu par les routes Node) puis les tables normalisées :
+    # films (une ligne par movieId) et notes (userId, movieId, rating) ;
+    # le checkpoint n'est plus utile
     enriched_df.to_csv("movies_enriched.csv", index=False)
+    movies, ratings = split_enriched(enriched_df)
+    save_dataset(movies, ratings, "movies_enriched.csv")
+    Checkpoint(checkpoint_path_for(csv_file)).remove()
     print("✅ Fichier enrichi sauvegardé dans backend/movies_enriched.csv")
+    print(f"✅ Tables normalisées : {', '.join(dataset_paths('movies_enriched.csv'))} "
+          f"({len(movies)} films, {len(ratings)} notes)")
@@ -0,0 +1,142 @@
+# backend/algorithms/columnar_store.py
+"""
+Format colonnaire binaire des tables movies / ratings (<base>.columns/) :
+un fichier .npy par colonne, relu en memmap (np.load(mmap_mode="r")), avec
+des types compacts :
+- userId, title : catégoriels (codes int32 + table de chaînes) ;
+- movieId : int32 ; rating, year : float32 ;
+- autres colonnes texte : octets UTF-8 + offsets (comme model_snapshot.py).
+
+Seules les colonnes demandées sont lues. Pas de dépendance à pyarrow : NumPy
+suffit, et un .npy se mappe directement (contrairement à un .npz).
+"""
+import json
+import os
+import shutil
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+SCHEMA = {
+    "userId": "category",
+    "title": "category",
+    "movieId": "int32",
+    "rating": "float32",
+    "year": "float32",
+}
+
+
+def columnar_dir(csv_path) -> str:
+    root, _ = os.path.splitext(str(csv_path))
+    return f"{root}.columns"
+
+
+# --- Écriture --------------------------------------------------------------------
+
+def _save(path, name, array):
+    np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+
+
+def _save_strings(path, name, values):
+    encoded = [str(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    _save(path, f"{name}.bytes", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    _save(path, f"{name}.offsets", offsets)
+
+
+def _write_table(path, df: pd.DataFrame) -> dict:
+    os.makedirs(path)
+    columns = {}
+    for col in df.columns:
+        kind = SCHEMA.get(col, "string")
+        values = df[col]
+        if kind == "category":
+            codes, uniques = pd.factorize(values.astype("string"), sort=True)
+            _save(path, f"{col}.codes", codes.astype(np.int32))
+            _save_strings(path, f"{col}.categories", uniques)
+        elif kind == "int32":
+            _save(path, col, pd.to_numeric(values).astype(np.int32).values)
+        elif kind == "float32":
+            _save(path, col, pd.to_numeric(values, errors="coerce").astype(np.float32).values)
+        else:
+            missing = values.isna().values
+            _save_strings(path, col, values.where(~missing, "").values)
+            if missing.any():
+                _save(path, f"{col}.missing", missing)
+        columns[col] = kind
+    return {"n_rows": len(df), "columns": columns}
+
+
+def save_columnar(movies: pd.DataFrame, ratings: pd.DataFrame, csv_path) -> str:
+    """
+    Écrit <base>.columns/ (dossier temporaire puis renommage) et renvoie son chemin.
+    """
+    final = columnar_dir(csv_path)
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    meta = {
+        "version": FORMAT_VERSION,
+        "movies": _write_table(os.path.join(tmp, "movies"), movies),
+        "ratings": _write_table(os.path.join(tmp, "ratings"), ratings),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    shutil.rmtree(final, ignore_errors=True)
+    os.rename(tmp, final)
+    return final
+
+
+# --- Lecture ---------------------------------------------------------------------
+
+def read_meta(csv_path) -> Optional[dict]:
+    try:
+        with open(os.path.join(columnar_dir(csv_path), "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == FORMAT_VERSION else None
+
+
+def _load(path, name) -> np.ndarray:
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+
+def _load_strings(path, name) -> np.ndarray:
+    raw = _load(path, f"{name}.bytes").tobytes()
+    offsets = _load(path, f"{name}.offsets")
+    return np.array(
+        [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)],
+        dtype=object,
+    )
+
+
+def _load_column(path, col, kind):
+    if kind == "category":
+        # les codes restent mappés : Categorical ne les recopie pas
+        return pd.Categorical.from_codes(_load(path, f"{col}.codes"), _load_strings(path, f"{col}.categories"))
+    if kind in ("int32", "float32"):
+        return _load(path, col)
+    values = _load_strings(path, col)
+    if os.path.exists(os.path.join(path, f"{col}.missing.npy")):
+        values[np.asarray(_load(path, f"{col}.missing"))] = None
+    return values
+
+
+def load_table(csv_path, table: str, columns: Optional[Iterable[str]] = None,
+               meta: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Table "movies" ou "ratings", réduite aux colonnes demandées (projection :
+    les autres fichiers ne sont pas ouverts).
+    """
+    meta = meta or read_meta(csv_path)
+    if meta is None:
+        raise FileNotFoundError(f"aucun format colonnaire pour {csv_path}")
+    path = os.path.join(columnar_dir(csv_path), table)
+    kinds = meta[table]["columns"]
+    wanted = list(kinds) if columns is None else [c for c in kinds if c in set(columns)]
+    return pd.DataFrame({col: _load_column(path, col, kinds[col]) for col in wanted}, copy=False)
@@ -1,6 +1,7 @@
 # backend/algorithms/convert_userid_to_string.py
 import pandas as pd
 from pathlib import Path
+from enriched_store import dataset_paths, save_dataset, split_enriched
 
 SRC = Path("backend/movies_enriched.csv")
 BACKUP = Path("backend/movies_enriched.backup.csv")
@@ -27,3 +28,8 @@ print(f"Lignes totales: {len(df)}, doublons userId: {dups}")
 import csv
 df.to_csv(OUT, index=False, quoting=csv.QUOTE_MINIMAL, encoding="utf-8")
 print(f"Fichier réécrit avec userId en string: {OUT}")
+
+# tables normalisées : films (une ligne par movieId) + notes (userId, movieId, rating)
+movies, ratings = split_enriched(df)
+save_dataset(movies, ratings, OUT)
+print(f"Tables écrites: {', '.join(dataset_paths(OUT))} ({len(movies)} films, {len(ratings)} notes)")
@@ -0,0 +1,204 @@
+# backend/algorithms/enriched_store.py
+"""
+Jeu de données enrichi en deux tables :
+- <base>.movies.csv  : une ligne par film (movieId, title, genres, year,
+  description, actors, backdrop, description_clean...) ;
+- <base>.ratings.csv : une ligne par note, étroite (userId, movieId, rating).
+
+L'ancien CSV "large" répète la description, les acteurs et le backdrop sur
+chaque note ; les chargeurs lisent ici les notes seules et ne joignent que
+les colonnes de films demandées.
+
+Les deux tables sont aussi écrites au format colonnaire binaire
+(<base>.columns/, voir columnar_store.py), lu en priorité : le CSV ne sert
+plus que si ce format est absent ou plus ancien que les CSV.
+
+Usage (conversion d'un CSV large existant) :
+    python algorithms/enriched_store.py movies_enriched.csv
+"""
+import csv
+import os
+import sys
+from typing import Iterable, Optional, Tuple
+
+import pandas as pd
+
+try:
+    from columnar_store import columnar_dir, load_table, read_meta, save_columnar
+except ImportError:  # importé comme algorithms.enriched_store depuis backend/
+    from algorithms.columnar_store import columnar_dir, load_table, read_meta, save_columnar
+
+RATING_COLUMNS = ["userId", "movieId", "rating"]
+
+
+def dataset_paths(csv_path) -> Tuple[str, str]:
+    """
+    (movies, ratings) associés à un CSV large : movies_enriched.csv ->
+    movies_enriched.movies.csv, movies_enriched.ratings.csv.
+    """
+    root, _ = os.path.splitext(str(csv_path))
+    return f"{root}.movies.csv", f"{root}.ratings.csv"
+
+
+def _mtime(path) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def has_dataset(csv_path) -> bool:
+    """
+    Vrai si les deux tables existent et ne sont pas plus anciennes que le CSV
+    large (que les routes Node continuent d'écrire).
+    """
+    movies_path, ratings_path = dataset_paths(csv_path)
+    if not (os.path.exists(movies_path) and os.path.exists(ratings_path)):
+        return False
+    return min(_mtime(movies_path), _mtime(ratings_path)) >= _mtime(csv_path)
+
+
+def has_columnar(csv_path) -> Optional[dict]:
+    """
+    Métadonnées du format colonnaire s'il existe et n'est pas plus ancien que
+    le CSV large ni que la paire de CSV, sinon None.
+    """
+    meta = read_meta(csv_path)
+    if meta is None:
+        return None
+    written = _mtime(os.path.join(columnar_dir(csv_path), "meta.json"))
+    sources = (csv_path,) + dataset_paths(csv_path)
+    return meta if all(written >= _mtime(p) for p in sources) else None
+
+
+def dataset_signature(csv_path) -> Tuple[float, ...]:
+    """
+    mtimes de toutes les sources (CSV large, paire, format colonnaire) : change
+    dès que l'une d'elles est réécrite.
+    """
+    meta_path = os.path.join(columnar_dir(csv_path), "meta.json")
+    return tuple(_mtime(p) for p in (str(csv_path),) + dataset_paths(csv_path) + (meta_path,))
+
+
+def clean_user_ids(user_ids: pd.Series) -> pd.Series:
+    # "111.0" -> "111" : même nettoyage que convert_userid_to_string.py
+    return user_ids.astype(str).str.strip().replace(r"\.0$", "", regex=True)
+
+
+def read_wide_csv(csv_path, usecols=None, **kwargs) -> pd.DataFrame:
+    df = pd.read_csv(csv_path, encoding="utf-8", on_bad_lines="skip", usecols=usecols,
+                     dtype={"userId": str}, **kwargs)
+    df.columns = df.columns.str.strip().str.replace("\ufeff", "", regex=False)
+    return df
+
+
+# --- Découpage -------------------------------------------------------------------
+
+def movies_table(df: pd.DataFrame) -> pd.DataFrame:
+    movie_cols = [c for c in df.columns if c not in ("userId", "rating")]
+    return (
+        df[movie_cols]
+        .replace(r"^\s*$", None, regex=True)
+        .groupby("movieId", sort=False)
+        .first()
+        .reset_index()
+    )
+
+
+def split_enriched(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Découpe un DataFrame large en (movies, ratings). Pour chaque film, chaque
+    colonne prend sa première valeur non vide (une description_clean présente
+    sur une seule ligne suffit, comme le recopiait final2.py).
+    """
+    movies = movies_table(df)
+    ratings = df[RATING_COLUMNS]
+    ratings = ratings[ratings["userId"].notna() & ratings["movieId"].notna() & ratings["rating"].notna()].copy()
+    ratings["userId"] = clean_user_ids(ratings["userId"])
+    return movies, ratings
+
+
+def save_dataset(movies: pd.DataFrame, ratings: pd.DataFrame, csv_path):
+    """
+    Écrit les deux tables (fichier temporaire puis os.replace, notes en
+    dernier : un lecteur ne voit jamais une paire à moitié écrite), puis leur
+    version colonnaire.
+    """
+    for df, path in zip((movies, ratings), dataset_paths(csv_path)):
+        tmp = path + ".tmp"
+        df.to_csv(tmp, index=False, quoting=csv.QUOTE_MINIMAL, encoding="utf-8")
+        os.replace(tmp, path)
+    save_columnar(movies, ratings, csv_path)
+
+
+def split_csv(csv_path) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    movies, ratings = split_enriched(read_wide_csv(csv_path))
+    save_dataset(movies, ratings, csv_path)
+    return movies, ratings
+
+
+# --- Chargement ------------------------------------------------------------------
+
+def load_ratings(csv_path, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Notes (userId, movieId, rating), sans texte de films : format colonnaire
+    (userId catégoriel, movieId int32, rating float32), sinon la paire de CSV,
+    sinon le CSV large (colonnes utiles seulement).
+    """
+    columns = RATING_COLUMNS if columns is None else [c for c in RATING_COLUMNS if c in set(columns)]
+    meta = has_columnar(csv_path)
+    if meta is not None:
+        return load_table(csv_path, "ratings", columns, meta)
+    if has_dataset(csv_path):
+        ratings = pd.read_csv(dataset_paths(csv_path)[1], usecols=columns, dtype={"userId": str})
+    else:
+        ratings = read_wide_csv(csv_path, usecols=RATING_COLUMNS)
+        ratings = ratings[ratings["userId"].notna() & ratings["rating"].notna()][columns].copy()
+    if "userId" in ratings.columns:
+        ratings["userId"] = clean_user_ids(ratings["userId"])
+    return ratings
+
+
+def load_movies(csv_path, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Table des films (une ligne par movieId), réduite aux colonnes demandées.
+    """
+    wanted = None
+    if columns is not None:
+        wanted = ["movieId"] + [c for c in columns if c != "movieId"]
+    meta = has_columnar(csv_path)
+    if meta is not None:
+        return load_table(csv_path, "movies", wanted, meta)
+    usecols = None if wanted is None else (lambda c: c in wanted)
+    if has_dataset(csv_path):
+        return pd.read_csv(dataset_paths(csv_path)[0], encoding="utf-8", usecols=usecols)
+    return movies_table(read_wide_csv(csv_path, usecols=usecols))
+
+
+def load_enriched(csv_path, movie_columns: Iterable[str] = ("title",),
+                  rating_columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Notes jointes aux seules colonnes de films demandées (par défaut le titre,
+    tout ce qu'il faut pour le pivot userId × title).
+    """
+    rating_columns = None if rating_columns is None else ["movieId"] + list(rating_columns)
+    movies = load_movies(csv_path, movie_columns)
+    return load_ratings(csv_path, rating_columns).merge(movies, on="movieId", how="inner")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python enriched_store.py <movies_enriched.csv>")
+        sys.exit(1)
+    src = sys.argv[1]
+    if not os.path.exists(src):
+        raise SystemExit(f"CSV introuvable: {src}")
+    movies, ratings = split_csv(src)
+    movies_path, ratings_path = dataset_paths(src)
+    before = os.path.getsize(src)
+    after = os.path.getsize(movies_path) + os.path.getsize(ratings_path)
+    print(f"✅ {len(ratings)} notes, {len(movies)} films")
+    columns_path = columnar_dir(src)
+    binary = sum(e.stat().st_size for d in os.scandir(columns_path) if d.is_dir() for e in os.scandir(d.path))
+    print(f"💾 {movies_path} + {ratings_path} : {after / 1e6:.1f} Mo au lieu de {before / 1e6:.1f} Mo")
+    print(f"💾 {columns_path} : {binary / 1e6:.1f} Mo (colonnaire, lu en priorité)")
@@ -1,16 +1,15 @@
 # backend/algorithms/inspect_csv_users.py
-import pandas as pd
 from pathlib import Path
 import sys
+from enriched_store import has_dataset, load_enriched, load_ratings
 
 CSV_PATH = Path("backend/movies_enriched.backup.csv")
 
 def summary():
-    if not CSV_PATH.exists():
+    if not CSV_PATH.exists() and not has_dataset(CSV_PATH):
         print("CSV introuvable:", CSV_PATH)
         return
-    df = pd.read_csv(CSV_PATH, usecols=["userId", "movieId", "title", "rating"], on_bad_lines="skip", dtype={"userId": str})
-    df["userId"] = df["userId"].astype(str)
+    df = load_ratings(CSV_PATH)
     total_rows = len(df)
     valid = df[df["rating"].notna()]
     counts = valid.groupby("userId").agg(rating_count=("rating", "count"), unique_movies=("movieId", "nunique")).reset_index()
@@ -23,11 +22,10 @@ def summary():
     print("\nRésumé écrit dans backend/user_rating_counts.csv")
 
 def inspect_user(uid):
-    if not CSV_PATH.exists():
+    if not CSV_PATH.exists() and not has_dataset(CSV_PATH):
         print("CSV introuvable:", CSV_PATH)
         return
-    df = pd.read_csv(CSV_PATH, usecols=["userId", "movieId", "title", "rating"], on_bad_lines="skip", dtype={"userId": str})
-    df["userId"] = df["userId"].astype(str)
+    df = load_enriched(CSV_PATH)
     uid = str(uid)
     user_rows = df[df["userId"] == uid]
     if user_rows.empty:
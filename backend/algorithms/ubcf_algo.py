@@ -1,126 +1,177 @@
 # backend/algorithms/ubcf_algo.py
+"""
+UBCF recommendations for Node, as JSON.
+
+One-shot (thin client): python ubcf_algo.py user_id [top_n] [k] [csv_path] [debug]
+  -> asks the resident daemon if one is listening (UBCF_DAEMON address, default
+     ubcf_algo.sock next to this script), otherwise computes locally.
+
+Resident modes, the dataset and the user-user similarity stay loaded between requests:
+  python ubcf_algo.py --serve [csv_path]             JSON-lines over stdin/stdout
+  python ubcf_algo.py --listen [address] [csv_path]  JSON-lines over a local socket
+     (address: unix socket path, or host:port)
+
+Request line:  {"user_id": "...", "top_n": 10, "k": 20, "csv_path": null, "debug": false, "id": ...}
+Response line: {"recommendations": [...], "ratingCountInCSV": n, "id": ...}
+               or {"success": false, "error": "...", ...}
+"""
+import os
+import signal
+import socket
+import socketserver
 import sys
 import json
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 from pathlib import Path
 import traceback
 
-def recommender_ubcf_direct(df, user_id, top_n=10, k=20, debug=False):
+SCRIPT_DIR = Path(__file__).resolve().parent
+DAEMON_ADDRESS = os.getenv("UBCF_DAEMON", str(SCRIPT_DIR / "ubcf_algo.sock"))
+DAEMON_TIMEOUT = float(os.getenv("UBCF_DAEMON_TIMEOUT", "60"))
+
+
+def error_response(e):
+    return {
+        "success": False,
+        "error": "Algo error",
+        "details": str(e),
+        "trace": traceback.format_exc()
+    }
+
+
+def handle_request(req, default_csv=None):
     """
-    UBCF direct:
-    - df must contain columns: userId, title, rating
-    - user_id can be string or int; function will try to match both
-    - returns tuple (list of (title, score), rating_count_in_matrix)
+    One request (dict) -> response dict, as printed by the CLI. Without
+    csv_path, the daemon's own dataset (default_csv) is used.
     """
-    # Build user-item matrix (users x titles)
-    ratings_matrix = df.pivot_table(index="userId", columns="title", values="rating", fill_value=0)
+    try:
+        # pandas / scikit-learn are only imported once a request is computed here
+        from ubcf_model import enrich_recommendations, models, resolve_csv_path
+
+        raw_user_id = req.get("user_id")
+        if not raw_user_id:
+            return {"success": False, "error": "missing user_id"}
+        top_n = int(req.get("top_n") or 10)
+        k = int(req.get("k") or 20)
+        debug_flag = bool(req.get("debug"))
 
-    if debug:
-        print(f"[python][debug] ratings_matrix shape: {ratings_matrix.shape}", file=sys.stderr)
+        model, movies_df = models.get(resolve_csv_path(req.get("csv_path") or default_csv), debug=debug_flag)
+        recs, rating_count = model.recommend(raw_user_id, top_n=top_n, k=k, debug=debug_flag)
+        movies = enrich_recommendations(movies_df, recs) if recs else []
 
-    # Try to match user_id in index (support string/int)
-    matched_user = None
-    # direct match
-    if user_id in ratings_matrix.index:
-        matched_user = user_id
+        # recommendations list + rating count found in CSV
+        return {"recommendations": movies, "ratingCountInCSV": rating_count}
+    except Exception as e:
+        print(f"[python][debug] Exception: {traceback.format_exc()}", file=sys.stderr)
+        return error_response(e)
+
+
+def handle_line(line, default_csv=None):
+    """
+    One JSON-lines request -> one response line (the optional "id" is echoed back).
+    """
+    try:
+        req = json.loads(line)
+    except ValueError as e:
+        return json.dumps({"success": False, "error": "invalid JSON", "details": str(e)})
+    if not isinstance(req, dict):
+        return json.dumps({"success": False, "error": "request must be a JSON object"})
+    resp = handle_request(req, default_csv)
+    if "id" in req:
+        resp["id"] = req["id"]
+    return json.dumps(resp, ensure_ascii=False)
+
+
+# --- Resident modes ---
+
+def warm_up(csv_arg=None):
+    # load the default dataset and build its model before the first request
+    from ubcf_model import models, resolve_csv_path
+    models.get(resolve_csv_path(csv_arg))
+
+
+def serve_stdio(csv_arg=None):
+    warm_up(csv_arg)
+    print("[python] ubcf daemon ready (stdin/stdout)", file=sys.stderr)
+    for line in sys.stdin:
+        if line.strip():
+            sys.stdout.write(handle_line(line, csv_arg) + "\n")
+            sys.stdout.flush()
+
+
+def parse_address(address):
+    # "host:port" -> TCP, anything else -> unix socket path
+    host, sep, port = str(address).rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return str(address)
+
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                resp = handle_line(line.decode("utf-8"), self.server.default_csv)
+                self.wfile.write((resp + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+
+def serve_socket(address=DAEMON_ADDRESS, csv_arg=None):
+    address = parse_address(address)
+    warm_up(csv_arg)
+    if isinstance(address, tuple):
+        server = socketserver.ThreadingTCPServer(address, _LineHandler)
     else:
-        # try int conversion
-        try:
-            uid_int = int(user_id)
-            if uid_int in ratings_matrix.index:
-                matched_user = uid_int
-        except Exception:
-            pass
-        # try stringified match
-        if matched_user is None:
-            str_index = ratings_matrix.index.astype(str)
-            if str(user_id) in str_index.values:
-                matched_user = ratings_matrix.index[str_index == str(user_id)][0]
-
-    if matched_user is None:
-        if debug:
-            print(f"[python][debug] user_id '{user_id}' NOT found in ratings_matrix.index", file=sys.stderr)
-        return [], 0
-
-    # count how many ratings this user has in the matrix (non-zero entries)
-    user_ratings_series = ratings_matrix.loc[matched_user]
-    rating_count = int((user_ratings_series != 0).sum())
-    if debug:
-        print(f"[python][debug] matched_user = {matched_user}, rating_count_in_matrix = {rating_count}", file=sys.stderr)
-
-    # Compute user-user cosine similarity
-    user_sim = cosine_similarity(ratings_matrix)
-    user_sim_df = pd.DataFrame(user_sim, index=ratings_matrix.index, columns=ratings_matrix.index)
-
-    if debug:
-        print(f"[python][debug] user_sim_df shape: {user_sim_df.shape}", file=sys.stderr)
-
-    # Get neighbors for the target user (exclude the user itself)
+        if os.path.exists(address):
+            os.unlink(address)
+        server = socketserver.ThreadingUnixStreamServer(address, _LineHandler)
+    server.daemon_threads = True
+    server.default_csv = csv_arg
+    # SIGTERM stops serve_forever through SystemExit, so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"[python] ubcf daemon listening on {address}", file=sys.stderr)
     try:
-        neighbors = user_sim_df.loc[matched_user].sort_values(ascending=False).drop(matched_user).head(k)
-    except Exception as e:
-        if debug:
-            print(f"[python][debug] Error getting neighbors for user_id={matched_user}: {e}", file=sys.stderr)
-        return [], rating_count
-
-    if debug:
-        print(f"[python][debug] Found neighbors (top {k}): {neighbors.head(10).to_dict()}", file=sys.stderr)
-
-    scores = {}
-    for film in ratings_matrix.columns:
-        if user_ratings_series.get(film, 0) == 0:
-            num, den = 0.0, 0.0
-            for neighbor_id, sim in neighbors.items():
-                r = ratings_matrix.loc[neighbor_id, film]
-                if r > 0:
-                    num += sim * r
-                    den += abs(sim)
-            if den > 0:
-                scores[film] = num / den
-
-    top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
-    if debug:
-        print(f"[python][debug] Number of candidate scored films: {len(scores)}", file=sys.stderr)
-        print(f"[python][debug] Top results (titles and scores): {top[:10]}", file=sys.stderr)
-    return top, rating_count
-
-def enrich_recommendations(df, recs):
-    movies = []
-    for title, score in recs:
-        row = df[df["title"] == title]
-        if row.empty:
-            continue
-        r = row.iloc[0].to_dict()
-
-        # clean actors field if it's a string with brackets/quotes
-        actors_raw = r.get("actors") or ""
-        if isinstance(actors_raw, str):
-            actors_list = [a.strip().strip("'\"[] ") for a in actors_raw.split(",") if a.strip()]
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if not isinstance(address, tuple) and os.path.exists(address):
+            os.unlink(address)
+
+
+def ask_daemon(req, address=DAEMON_ADDRESS):
+    """
+    Sends one request to the resident daemon; None if none is listening.
+    """
+    address = parse_address(address)
+    try:
+        if isinstance(address, tuple):
+            sock = socket.create_connection(address, timeout=DAEMON_TIMEOUT)
         else:
-            actors_list = actors_raw or []
-
-        # normalize year and score
-        year_val = None
-        try:
-            if pd.notna(r.get("year")):
-                year_val = int(float(r.get("year")))
-        except Exception:
-            year_val = r.get("year")
-
-        movies.append({
-            "movieId": r.get("movieId"),
-            "title": r.get("title"),
-            "year": year_val,
-            "genres": (r.get("genres") or "").split("|") if r.get("genres") else [],
-            "actors": actors_list,
-            "backdrop": r.get("backdrop"),
-            "description": r.get("description_clean") or r.get("description"),
-            "score": round(float(score), 2)
-        })
-    return movies
+            if not os.path.exists(address):
+                return None
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(DAEMON_TIMEOUT)
+            sock.connect(address)
+    except OSError:
+        return None
+    try:
+        with sock, sock.makefile("rwb") as f:
+            f.write((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            line = f.readline()
+    except OSError:
+        return None
+    return json.loads(line) if line else None
+
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve_stdio(sys.argv[2] if len(sys.argv) > 2 else None)
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "--listen":
+        address = sys.argv[2] if len(sys.argv) > 2 else DAEMON_ADDRESS
+        serve_socket(address, sys.argv[3] if len(sys.argv) > 3 else None)
+        return
+
     try:
         # args: user_id top_n k csv_path [debug]
         raw_user_id = sys.argv[1] if len(sys.argv) > 1 else None
@@ -133,53 +184,21 @@ def main():
             print(json.dumps({"success": False, "error": "missing user_id"}))
             sys.exit(1)
 
-        # Resolve CSV path robustly (default to movies_enriched.backup.csv)
-        script_dir = Path(__file__).resolve().parent
-        if csv_arg:
-            csv_path = Path(csv_arg)
-        else:
-            csv_path = script_dir.parent / "movies_enriched.backup.csv"
-        if not csv_path.exists():
-            alt = script_dir.parent.parent / "movies_enriched.backup.csv"
-            if alt.exists():
-                csv_path = alt
-
-        if not csv_path.exists():
-            raise FileNotFoundError(f"CSV not found at {csv_path}")
-
-        # Load CSV forcing userId to string to avoid type mismatch
-        if debug_flag:
-            print(f"[python][debug] Loading CSV from: {csv_path}", file=sys.stderr)
-        df = pd.read_csv(csv_path, encoding="utf-8", on_bad_lines="skip", dtype={"userId": str})
-
-        # Ensure userId column is string to avoid type mismatch
-        df["userId"] = df["userId"].astype(str).str.strip().replace(r"\.0$", "", regex=True)
-
-        if debug_flag:
-            # Basic diagnostics
-            print(f"[python][debug] CSV loaded rows={len(df)}, columns={list(df.columns)}", file=sys.stderr)
-            try:
-                sample_ids = df["userId"].dropna().astype(str).unique()[:20].tolist()
-                print(f"[python][debug] sample userId values (first 20): {sample_ids}", file=sys.stderr)
-            except Exception as e:
-                print(f"[python][debug] Could not sample userId column: {e}", file=sys.stderr)
-
-        # Run recommender
-        recs, rating_count = recommender_ubcf_direct(df, raw_user_id, top_n=top_n, k=k, debug=debug_flag)
-        movies = enrich_recommendations(df, recs)
-
-        # Output JSON (recommendations list + rating count found in CSV)
-        out = {"recommendations": movies, "ratingCountInCSV": rating_count}
+        # the daemon resolves paths from its own cwd: send an absolute path
+        req = {
+            "user_id": raw_user_id, "top_n": top_n, "k": k, "debug": debug_flag,
+            "csv_path": str(Path(csv_arg).resolve()) if csv_arg else None,
+        }
+        out = ask_daemon(req)
+        if out is None:
+            # no daemon: compute in this process
+            out = handle_request(req)
         print(json.dumps(out, ensure_ascii=False))
+        if out.get("success") is False:
+            sys.exit(1)
     except Exception as e:
         # Always print JSON on error so Node can parse it
-        err = {
-            "success": False,
-            "error": "Algo error",
-            "details": str(e),
-            "trace": traceback.format_exc()
-        }
-        print(json.dumps(err, ensure_ascii=False))
+        print(json.dumps(error_response(e), ensure_ascii=False))
         print(f"[python][debug] Exception: {traceback.format_exc()}", file=sys.stderr)
         sys.exit(1)
 
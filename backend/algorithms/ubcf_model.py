@@ -0,0 +1,204 @@
+# backend/algorithms/ubcf_model.py
+"""
+UBCF model side of ubcf_algo.py: dataset loading, user-user similarity and
+recommendation enrichment (pandas / scikit-learn), kept out of the thin client.
+"""
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from enriched_store import dataset_signature, has_dataset, load_enriched, load_movies
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+
+class UBCFModel:
+    """
+    User-item matrix (users x titles) and user-user cosine similarity, built once
+    and reused for every request.
+    - df must contain columns: userId, title, rating
+    """
+
+    def __init__(self, df, debug=False):
+        self.ratings_matrix = df.pivot_table(index="userId", columns="title", values="rating", fill_value=0)
+        if debug:
+            print(f"[python][debug] ratings_matrix shape: {self.ratings_matrix.shape}", file=sys.stderr)
+        self.values = self.ratings_matrix.to_numpy(dtype=np.float64)
+        self.user_sim_df = pd.DataFrame(
+            cosine_similarity(self.values), index=self.ratings_matrix.index, columns=self.ratings_matrix.index
+        )
+        if debug:
+            print(f"[python][debug] user_sim_df shape: {self.user_sim_df.shape}", file=sys.stderr)
+        self.row_of = {u: i for i, u in enumerate(self.ratings_matrix.index)}
+        self.str_index = self.ratings_matrix.index.astype(str)
+
+    def match_user(self, user_id):
+        # Try to match user_id in index (support string/int)
+        index = self.ratings_matrix.index
+        if user_id in index:
+            return user_id
+        try:
+            uid_int = int(user_id)
+            if uid_int in index:
+                return uid_int
+        except Exception:
+            pass
+        if str(user_id) in self.str_index.values:
+            return index[self.str_index == str(user_id)][0]
+        return None
+
+    def recommend(self, user_id, top_n=10, k=20, debug=False):
+        """
+        Returns tuple (list of (title, score), rating_count_in_matrix)
+        """
+        matched_user = self.match_user(user_id)
+        if matched_user is None:
+            if debug:
+                print(f"[python][debug] user_id '{user_id}' NOT found in ratings_matrix.index", file=sys.stderr)
+            return [], 0
+
+        # count how many ratings this user has in the matrix (non-zero entries)
+        user_ratings = self.values[self.row_of[matched_user]]
+        rating_count = int((user_ratings != 0).sum())
+        if debug:
+            print(f"[python][debug] matched_user = {matched_user}, rating_count_in_matrix = {rating_count}", file=sys.stderr)
+
+        # Get neighbors for the target user (exclude the user itself)
+        try:
+            neighbors = self.user_sim_df.loc[matched_user].sort_values(ascending=False).drop(matched_user).head(k)
+        except Exception as e:
+            if debug:
+                print(f"[python][debug] Error getting neighbors for user_id={matched_user}: {e}", file=sys.stderr)
+            return [], rating_count
+
+        if debug:
+            print(f"[python][debug] Found neighbors (top {k}): {neighbors.head(10).to_dict()}", file=sys.stderr)
+
+        # Weighted average over the neighbors who rated each film, for the films the
+        # user has not rated; rows are summed in neighbor order, like the former loop
+        sims = neighbors.to_numpy(dtype=np.float64)[:, None]
+        neighbor_ratings = self.values[[self.row_of[n] for n in neighbors.index]]
+        rated = neighbor_ratings > 0
+        num = np.where(rated, sims * neighbor_ratings, 0.0).sum(axis=0)
+        den = np.where(rated, np.abs(sims), 0.0).sum(axis=0)
+        candidates = np.flatnonzero((user_ratings == 0) & (den > 0))
+        titles = self.ratings_matrix.columns
+        scores = {titles[j]: num[j] / den[j] for j in candidates}
+
+        top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
+        if debug:
+            print(f"[python][debug] Number of candidate scored films: {len(scores)}", file=sys.stderr)
+            print(f"[python][debug] Top results (titles and scores): {top[:10]}", file=sys.stderr)
+        return top, rating_count
+
+
+def recommender_ubcf_direct(df, user_id, top_n=10, k=20, debug=False):
+    """
+    UBCF direct:
+    - df must contain columns: userId, title, rating
+    - user_id can be string or int; function will try to match both
+    - returns tuple (list of (title, score), rating_count_in_matrix)
+    """
+    return UBCFModel(df, debug=debug).recommend(user_id, top_n=top_n, k=k, debug=debug)
+
+def enrich_recommendations(df, recs):
+    """
+    df: movies table (one row per movie) or the wide enriched CSV
+    """
+    movies = []
+    for title, score in recs:
+        row = df[df["title"] == title]
+        if row.empty:
+            continue
+        r = row.iloc[0].to_dict()
+
+        # clean actors field if it's a string with brackets/quotes
+        actors_raw = r.get("actors") or ""
+        if isinstance(actors_raw, str):
+            actors_list = [a.strip().strip("'\"[] ") for a in actors_raw.split(",") if a.strip()]
+        else:
+            actors_list = actors_raw or []
+
+        # normalize year and score
+        year_val = None
+        try:
+            if pd.notna(r.get("year")):
+                year_val = int(float(r.get("year")))
+        except Exception:
+            year_val = r.get("year")
+
+        movies.append({
+            "movieId": r.get("movieId"),
+            "title": r.get("title"),
+            "year": year_val,
+            "genres": (r.get("genres") or "").split("|") if r.get("genres") else [],
+            "actors": actors_list,
+            "backdrop": r.get("backdrop"),
+            "description": r.get("description_clean") or r.get("description"),
+            "score": round(float(score), 2)
+        })
+    return movies
+
+def resolve_csv_path(csv_arg=None):
+    # Resolve CSV path robustly (default to movies_enriched.backup.csv)
+    if csv_arg:
+        csv_path = Path(csv_arg)
+    else:
+        csv_path = SCRIPT_DIR.parent / "movies_enriched.backup.csv"
+    if not csv_path.exists():
+        alt = SCRIPT_DIR.parent.parent / "movies_enriched.backup.csv"
+        if alt.exists():
+            csv_path = alt
+
+    if not csv_path.exists() and not has_dataset(csv_path):
+        raise FileNotFoundError(f"CSV not found at {csv_path}")
+    return csv_path
+
+
+class ModelCache:
+    """
+    Loaded models by dataset path; a model is rebuilt when one of its source
+    files (wide CSV, movies/ratings tables, columnar copy) has been rewritten.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, csv_path, debug=False):
+        key = str(Path(csv_path).resolve())
+        signature = dataset_signature(csv_path)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None or entry[0] != signature:
+                entry = (signature, *self._load(csv_path, debug))
+                self._models[key] = entry
+            return entry[1], entry[2]
+
+    @staticmethod
+    def _load(csv_path, debug=False):
+        # Load ratings joined to titles only (userId forced to string to avoid type mismatch)
+        if debug:
+            print(f"[python][debug] Loading CSV from: {csv_path}", file=sys.stderr)
+        df = load_enriched(csv_path)
+        # ratings may be stored as float32 (columnar format): compute similarities in float64
+        df["rating"] = df["rating"].astype("float64")
+
+        if debug:
+            # Basic diagnostics
+            print(f"[python][debug] CSV loaded rows={len(df)}, columns={list(df.columns)}", file=sys.stderr)
+            try:
+                sample_ids = df["userId"].dropna().astype(str).unique()[:20].tolist()
+                print(f"[python][debug] sample userId values (first 20): {sample_ids}", file=sys.stderr)
+            except Exception as e:
+                print(f"[python][debug] Could not sample userId column: {e}", file=sys.stderr)
+
+        # movie details (one row per movie) are only used to enrich the recommendations
+        return UBCFModel(df, debug=debug), load_movies(csv_path)
+
+
+models = ModelCache()
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from algorithms.enriched_store import dataset_paths, save_dataset, split_enriched
 
 # Chemin vers ton CSV (dans le même dossier que ce script)
 BASE_DIR = os.path.dirname(__file__) 
@@ -24,25 +25,20 @@ df.columns = df.columns.str.replace("\ufeff", "", regex=False)
 if "description_clean" not in df.columns:
     df["description_clean"] = ""
 
-# 🔥 Copier description_clean des lignes où il existe déjà pour le même movieId
-updated_count = 0
-for movie_id in df["movieId"].unique():
-    # toutes les lignes pour ce movieId
-    group = df[df["movieId"] == movie_id]
-
-    # chercher une valeur description_clean non vide
-    existing_desc = group["description_clean"].dropna().astype(str).str.strip()
-    existing_desc = existing_desc[existing_desc != ""]
-
-    if not existing_desc.empty:
-        desc_value = existing_desc.iloc[0]  # prendre la première valeur existante
-        # remplir les lignes vides
-        mask = (df["movieId"] == movie_id) & (df["description_clean"].astype(str).str.strip() == "")
-        df.loc[mask, "description_clean"] = desc_value
-        updated_count += mask.sum()
+# 🔥 Table des films : une ligne par movieId, description_clean = première valeur
+# non vide parmi ses lignes ; puis recopie sur les lignes vides du CSV large
+movies, ratings = split_enriched(df)
+desc_by_movie = movies.set_index("movieId")["description_clean"]
+empty = df["description_clean"].fillna("").astype(str).str.strip() == ""
+filled = df.loc[empty, "movieId"].map(desc_by_movie)
+updated = filled.notna()
+df.loc[filled.index[updated], "description_clean"] = filled[updated]
+updated_count = int(updated.sum())
 
 print(f"✅ {updated_count} lignes mises à jour avec description_clean copiée")
 
-# Sauvegarder le CSV corrigé
+# Sauvegarder le CSV corrigé et les tables normalisées (films + notes)
 df.to_csv(CSV_PATH, index=False, encoding="utf-8")
+save_dataset(movies, ratings, CSV_PATH)
 print("💾 Fichier sauvegardé :", CSV_PATH)
+print("💾 Tables :", ", ".join(dataset_paths(CSV_PATH)))
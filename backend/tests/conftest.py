@@ -0,0 +1,5 @@
+import os
+import sys
+
+# les scripts sont à la racine de backend/ (pas de package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from ajouter import ResponseCache, TMDBClient
+
+
+class StubTMDB(BaseHTTPRequestHandler):
+    """
+    Faux TMDB : /flaky échoue (500 puis 429) avant de répondre, /missing
+    renvoie 404, /down échoue toujours ; les autres chemins renvoient le
+    chemin et la requête.
+    """
+    protocol_version = "HTTP/1.1"
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        hit = self.hits[url.path] = self.hits.get(url.path, 0) + 1
+        if url.path == "/flaky" and hit <= 2:
+            self._send(500 if hit == 1 else 429, {}, {"Retry-After": "0"})
+        elif url.path == "/missing":
+            self._send(404, {"status_message": "not found"})
+        elif url.path == "/down":
+            self._send(503, {})
+        else:
+            self._send(200, {"path": url.path, "query": parse_qs(url.query).get("query")})
+
+
+@pytest.fixture
+def stub_url():
+    StubTMDB.hits = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTMDB)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _run(stub_url, scenario, **kwargs):
+    async def main():
+        client = TMDBClient("key", base_url=stub_url, rate=1000, burst=100, backoff=0.001, **kwargs)
+        try:
+            return await scenario(client), client
+        finally:
+            client.close()
+
+    return asyncio.run(main())
+
+
+def test_get_retries_transient_errors(stub_url):
+    data, client = _run(stub_url, lambda c: c.get("/flaky"))
+    assert data["path"] == "/flaky"
+    assert (client.requests, client.retried, client.failures) == (3, 2, 0)
+
+
+def test_get_counts_non_retryable_and_exhausted_failures(stub_url):
+    async def scenario(client):
+        results = await asyncio.gather(client.get("/missing"), client.get("/down"), return_exceptions=True)
+        return [type(r) for r in results]
+
+    errors, client = _run(stub_url, scenario, retries=2)
+    assert errors == [requests.HTTPError, requests.HTTPError]
+    assert StubTMDB.hits == {"/missing": 1, "/down": 3}
+    assert client.failures == 2
+
+
+def test_get_serves_cached_responses(stub_url, tmp_path):
+    cache = ResponseCache(str(tmp_path / "tmdb.sqlite"))
+
+    async def scenario(client):
+        first = await asyncio.gather(*(client.get("/search/movie", query=f"film {i}") for i in range(20)))
+        again = await client.get("/search/movie", query="film 3")
+        return first, again
+
+    (first, again), client = _run(stub_url, scenario, cache=cache)
+    assert [d["query"] for d in first] == [[f"film {i}"] for i in range(20)]
+    assert again == first[3]
+    assert client.requests == 20 and cache.hits == 1